@@ -1,21 +1,25 @@
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from database import get_async_db
 from models import User, APIToken
+from identity_cache import identity_cache, token_digest, CachedIdentity, CachedUser
+from token_usage import token_usage
+from password_hashing import password_hasher, pwd_context
 import os
 
 SECRET_KEY = os.getenv("SECRET_KEY", "azplan-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
+# Synchronous helpers for scripts; the API uses password_hasher
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
@@ -32,17 +36,22 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def authenticate_user(db: Session, username: str, password: str):
-    user = db.query(User).filter(User.username == username).first()
+async def authenticate_user(db: AsyncSession, username: str, password: str):
+    user = await db.scalar(select(User).where(User.username == username))
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    verified, new_hash = await password_hasher.verify(password, user.hashed_password)
+    if not verified:
         return False
+    if new_hash is not None:
+        # Stored with another bcrypt cost than BCRYPT_ROUNDS; upgrade it while we know the password
+        user.hashed_password = new_hash
+        await db.commit()
     return user
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -60,30 +69,46 @@ async def get_current_user(
             raise credentials_exception
     except JWTError:
         # Try API token
-        api_token = db.query(APIToken).filter(
-            APIToken.token == token,
-            APIToken.is_active == True
-        ).first()
-        
-        if not api_token:
-            raise credentials_exception
+        cache_key = ("token", token_digest(token))
+        identity = identity_cache.get(cache_key)
+        if identity is None:
+            api_token = await db.scalar(
+                select(APIToken).options(joinedload(APIToken.user)).where(
+                    APIToken.token == token,
+                    APIToken.is_active == True
+                )
+            )
+            
+            if not api_token:
+                raise credentials_exception
             
-        # Update last used time
-        api_token.last_used_at = datetime.utcnow()
-        db.commit()
+            user = api_token.user
+            if user is None or not user.is_active:
+                raise credentials_exception
+            identity = CachedIdentity(user=CachedUser.from_model(user), api_token_id=api_token.id)
+            identity_cache.set(cache_key, identity)
         
-        user = api_token.user
-        if user is None or not user.is_active:
-            raise credentials_exception
-        return user
+        # Buffer the last used time; it is written back in bulk
+        token_usage.record(identity.api_token_id)
+        return identity.user
     
     # JWT token validation
-    user = db.query(User).filter(User.username == username).first()
-    if user is None or not user.is_active:
-        raise credentials_exception
-    return user
+    cache_key = ("jwt", username)
+    identity = identity_cache.get(cache_key)
+    if identity is None:
+        user = await db.scalar(select(User).where(User.username == username))
+        if user is None or not user.is_active:
+            raise credentials_exception
+        identity = CachedIdentity(user=CachedUser.from_model(user))
+        identity_cache.set(cache_key, identity)
+    return identity.user
 
-def get_current_active_user(current_user: User = Depends(get_current_user)):
+async def get_current_active_user(current_user: User = Depends(get_current_user)):
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
+    return current_user
+
+async def get_current_admin_user(current_user: User = Depends(get_current_active_user)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
     return current_user
\ No newline at end of file
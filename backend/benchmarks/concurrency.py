@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Before/after concurrency benchmark for the database layer.
+
+Runs the same query under three handler styles, in-process through httpx:
+  sync-on-loop  async def handler using a sync Session (old generate-from-z)
+  threadpool    def handler using a sync Session (old CRUD handlers)
+  async         async def handler using AsyncSession (current handlers)
+
+On PostgreSQL each request runs SELECT pg_sleep(--delay) to stand in for a
+slow query; on other databases it runs SELECT 1.
+
+Usage: python benchmarks/concurrency.py --requests 400 --concurrency 100 --delay 0.05
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from database import SessionLocal, engine, get_async_db, get_db
+
+def build_query(delay: float):
+    if engine.dialect.name == "postgresql":
+        return text("SELECT pg_sleep(:delay)").bindparams(delay=delay)
+    return text("SELECT 1")
+
+def build_app(delay: float) -> FastAPI:
+    app = FastAPI()
+    query = build_query(delay)
+
+    @app.get("/sync-on-loop")
+    async def sync_on_loop():
+        db = SessionLocal()
+        try:
+            db.execute(query)
+        finally:
+            db.close()
+        return {"ok": True}
+
+    @app.get("/threadpool")
+    def threadpool(db: Session = Depends(get_db)):
+        db.execute(query)
+        return {"ok": True}
+
+    @app.get("/async")
+    async def async_session(db: AsyncSession = Depends(get_async_db)):
+        await db.execute(query)
+        return {"ok": True}
+
+    return app
+
+async def run_mode(app: FastAPI, path: str, requests: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def one():
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(path)
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "mode": path.strip("/"),
+        "elapsed": elapsed,
+        "rps": requests / elapsed,
+        "p50": statistics.median(latencies) * 1000,
+        "p95": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "max": latencies[-1] * 1000,
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--delay", type=float, default=0.05, help="seconds of pg_sleep per request (PostgreSQL only)")
+    parser.add_argument("--modes", default="sync-on-loop,threadpool,async")
+    args = parser.parse_args()
+
+    app = build_app(args.delay)
+    print(f"Database: {engine.dialect.name}, requests: {args.requests}, concurrency: {args.concurrency}, delay: {args.delay}s")
+    print(f"{'mode':<14}{'elapsed s':>11}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for mode in args.modes.split(","):
+        result = await run_mode(app, f"/{mode}", args.requests, args.concurrency)
+        print(
+            f"{result['mode']:<14}{result['elapsed']:>11.2f}{result['rps']:>10.1f}"
+            f"{result['p50']:>10.1f}{result['p95']:>10.1f}{result['max']:>10.1f}"
+        )
+
+if __name__ == "__main__":
+    asyncio.run(main())
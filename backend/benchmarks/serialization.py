@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Serialization and compression benchmark for large plan listings.
+
+Serves an in-memory project of --plans plans and --tasks tasks through the
+List[PlanWithStats] response model, in-process through httpx, and compares:
+  json    FastAPI's default JSONResponse
+  orjson  ORJSONResponse (FAST_JSON_RESPONSES=true)
+each with identity, gzip and, when brotli is installed, br encoding.
+
+It also times the renderers alone on the already-validated payload, which
+is the only step the response class changes.
+
+Usage: python benchmarks/serialization.py --plans 26 --tasks 2000 --requests 50
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from datetime import date, datetime, timezone
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import TypeAdapter
+from responses import CompressionMiddleware, brotli, orjson
+from schemas import PlanWithStats
+
+LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+def build_plans(plan_count: int, task_count: int) -> List[dict]:
+    now = datetime.now(timezone.utc)
+    plans = []
+    for plan_id in range(1, plan_count + 1):
+        tasks = [
+            {
+                "id": task_id,
+                "plan_id": plan_id,
+                "title": f"Task {task_id} of plan {LETTERS[(plan_id - 1) % 26]}",
+                "description": "Call suppliers, compare quotes and book the cheapest one that fits the schedule.",
+                "is_completed": task_id % 3 == 0,
+                "order": task_id,
+                "cost": task_id * 12.5,
+                "revenue": task_id * 20.0,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for task_id in range(plan_id, task_count + 1, plan_count)
+        ]
+        plans.append({
+            "id": plan_id,
+            "project_id": 1,
+            "plan_letter": LETTERS[(plan_id - 1) % 26],
+            "title": f"Plan {LETTERS[(plan_id - 1) % 26]}",
+            "description": "An alternative way to reach the project goal, with its own budget and timeline.",
+            "start_date": date(2026, 1, 1),
+            "end_date": date(2026, 12, 31),
+            "created_at": now,
+            "updated_at": now,
+            "tasks": tasks,
+            "total_cost": sum(task["cost"] for task in tasks),
+            "total_revenue": sum(task["revenue"] for task in tasks),
+            "task_count": len(tasks),
+            "completed_task_count": sum(task["is_completed"] for task in tasks),
+        })
+    return plans
+
+def build_app(plans: List[dict]) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware)
+
+    @app.get("/json", response_model=List[PlanWithStats], response_class=JSONResponse)
+    async def json_plans():
+        return plans
+
+    if orjson is not None:
+        @app.get("/orjson", response_model=List[PlanWithStats], response_class=ORJSONResponse)
+        async def orjson_plans():
+            return plans
+
+    return app
+
+async def run_mode(app: FastAPI, renderer: str, encoding: str, requests: int) -> dict:
+    latencies = []
+    wire_bytes = 0
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for _ in range(requests):
+            start = time.perf_counter()
+            response = await client.get(f"/{renderer}", headers={"Accept-Encoding": encoding})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+            wire_bytes = response.num_bytes_downloaded
+
+    latencies.sort()
+    return {
+        "mode": f"{renderer}/{encoding}",
+        "bytes": wire_bytes,
+        "p50": statistics.median(latencies) * 1000,
+        "p95": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+def time_render(response_class, content, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        response_class(content)
+    return (time.perf_counter() - start) / rounds * 1000
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--plans", type=int, default=26)
+    parser.add_argument("--tasks", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    plans = build_plans(args.plans, args.tasks)
+    app = build_app(plans)
+    renderers = ["json"] + (["orjson"] if orjson is not None else [])
+    encodings = ["identity", "gzip"] + (["br"] if brotli is not None else [])
+
+    print(f"Plans: {args.plans}, tasks: {args.tasks}, requests per mode: {args.requests}")
+    print(f"{'mode':<18}{'bytes':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for renderer in renderers:
+        for encoding in encodings:
+            result = await run_mode(app, renderer, encoding, args.requests)
+            print(f"{result['mode']:<18}{result['bytes']:>10}{result['p50']:>10.1f}{result['p95']:>10.1f}")
+
+    content = TypeAdapter(List[PlanWithStats]).dump_python(
+        TypeAdapter(List[PlanWithStats]).validate_python(plans), mode="json"
+    )
+    print()
+    print(f"{'renderer':<18}{'render ms':>10}")
+    print(f"{'json':<18}{time_render(JSONResponse, content, args.requests):>10.2f}")
+    if orjson is not None:
+        print(f"{'orjson':<18}{time_render(ORJSONResponse, content, args.requests):>10.2f}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
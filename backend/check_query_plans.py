@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Script to check that the hot queries are served by an index.
+Runs EXPLAIN for each query and fails if its plan does not use the expected index.
+Usage: python check_query_plans.py
+"""
+
+import sys
+from datetime import datetime
+from sqlalchemy import select, text
+from database import engine
+from models import Plan, Task, Comment, Project, SharedLink
+from pagination import PageParams, keyset_page, encode_cursor
+
+# (description, query, index expected in the plan)
+HOT_QUERIES = [
+    ("tasks of a plan", select(Task).where(Task.plan_id == 1), "ix_tasks_plan_id"),
+    ("comments of a plan", select(Comment).where(Comment.plan_id == 1), "ix_comments_plan_id_created_at_id"),
+    (
+        "comments page",
+        keyset_page(
+            select(Comment).where(Comment.plan_id == 1), Comment.created_at, Comment.id,
+            PageParams(limit=50, cursor=encode_cursor(datetime(2024, 1, 1), 100)), descending=True
+        ),
+        "ix_comments_plan_id_created_at_id"
+    ),
+    ("plans of a project", select(Plan).where(Plan.project_id == 1), "uq_plans_project_id_plan_letter"),
+    (
+        "plan by letter",
+        select(Plan.id).where(Plan.project_id == 1, Plan.plan_letter == "Z"),
+        "uq_plans_project_id_plan_letter"
+    ),
+    ("projects of a user", select(Project).where(Project.owner_id == 1), "ix_projects_owner_id_created_at_id"),
+    (
+        "projects page",
+        keyset_page(
+            select(Project).where(Project.owner_id == 1), Project.created_at, Project.id,
+            PageParams(limit=50, cursor=encode_cursor(datetime(2024, 1, 1), 100))
+        ),
+        "ix_projects_owner_id_created_at_id"
+    ),
+    ("share links of a plan", select(SharedLink).where(SharedLink.plan_id == 1), "ix_shared_links_plan_id"),
+]
+
+def explain(conn, query) -> str:
+    compiled = query.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True})
+    if conn.dialect.name == "postgresql":
+        return "\n".join(conn.execute(text(f"EXPLAIN {compiled}")).scalars())
+    if conn.dialect.name == "sqlite":
+        return "\n".join(row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {compiled}")))
+    raise NotImplementedError(f"EXPLAIN check is not supported on {conn.dialect.name}")
+
+def uses_index(conn, plan: str, query, index_name: str) -> bool:
+    if index_name in plan:
+        return True
+    # SQLite backs unique constraints with unnamed sqlite_autoindex_<table>_N indexes
+    table = query.get_final_froms()[0].name
+    return conn.dialect.name == "sqlite" and index_name.startswith("uq_") and f"INDEX sqlite_autoindex_{table}_" in plan
+
+def check_query_plans() -> bool:
+    failures = 0
+    with engine.connect() as conn:
+        if conn.dialect.name == "postgresql":
+            # Small tables are cheaper to scan; make the planner show whether an index is usable at all
+            conn.execute(text("SET enable_seqscan = off"))
+
+        for description, query, index_name in HOT_QUERIES:
+            plan = explain(conn, query)
+            if uses_index(conn, plan, query, index_name):
+                print(f"✅ {description}: {index_name}")
+            else:
+                failures += 1
+                print(f"❌ {description}: expected {index_name}")
+                for line in plan.splitlines():
+                    print(f"    {line}")
+
+    return failures == 0
+
+if __name__ == "__main__":
+    sys.exit(0 if check_query_plans() else 1)
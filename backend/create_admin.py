@@ -1,17 +1,16 @@
 #!/usr/bin/env python3
 """
 Script to create admin user with specified credentials.
+Run `alembic upgrade head` first to create the tables. Only users created
+or updated here have is_admin set and may use the /admin endpoints.
 Usage: python create_admin.py
 """
 
-from database import SessionLocal, engine
-from models import Base, User as UserModel
+from database import SessionLocal
+from models import User as UserModel
 from auth import get_password_hash
 
 def create_admin_user():
-    # Create tables if they don't exist
-    Base.metadata.create_all(bind=engine)
-    
     # Create database session
     db = SessionLocal()
     
@@ -34,11 +33,13 @@ def create_admin_user():
                 existing_user.username = admin_username
                 existing_user.email = admin_email
                 existing_user.hashed_password = get_password_hash("admin123")
+                existing_user.is_admin = True
                 db.commit()
                 print("Updated existing admin user credentials")
             else:
                 # Just update password
                 existing_user.hashed_password = get_password_hash("admin123")
+                existing_user.is_admin = True
                 db.commit()
                 print("Updated admin user password")
         else:
@@ -48,7 +49,8 @@ def create_admin_user():
                 username=admin_username,
                 email=admin_email,
                 hashed_password=hashed_password,
-                is_active=True
+                is_active=True,
+                is_admin=True
             )
             
             db.add(admin_user)
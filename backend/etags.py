@@ -0,0 +1,65 @@
+import hashlib
+import json
+from typing import List, Optional
+from fastapi import Request, Response, status
+from sqlalchemy import Select, func, select, true
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Private: bodies depend on the caller's credentials; no-cache: revalidate with If-None-Match every time
+CACHE_CONTROL = "private, no-cache"
+
+def version_of(query: Select) -> Select:
+    """Aggregate a query selecting (id, updated_at, version) rows into
+    (count, sum of ids, newest updated_at, sum of versions)
+
+    Inserts and deletes change the count or id sum, edits bump updated_at
+    and the version counter, so the aggregate changes whenever the rows
+    behind a response do. The counter covers edits within the same second,
+    which SQLite's CURRENT_TIMESTAMP cannot tell apart.
+    """
+    rows = query.subquery()
+    row_id, updated_at, version = list(rows.c)[:3]
+    return select(
+        func.count(),
+        func.coalesce(func.sum(row_id), 0),
+        func.max(updated_at),
+        func.coalesce(func.sum(version), 0)
+    ).select_from(rows)
+
+async def fetch_versions(db: AsyncSession, *queries: Select) -> List[tuple]:
+    """Version aggregates of several (id, updated_at, version) queries, read in one round trip"""
+    versions = [version_of(query).subquery() for query in queries]
+    from_clause = versions[0]
+    for version in versions[1:]:
+        # Each version is a single row, so the cross join is too
+        from_clause = from_clause.join(version, true())
+    row = (await db.execute(
+        select(*[column for version in versions for column in version.c]).select_from(from_clause)
+    )).one()
+    return [tuple(row[i:i + 4]) for i in range(0, len(row), 4)]
+
+def make_etag(*versions) -> str:
+    """Weak ETag over version aggregates"""
+    # Weak: the tag is derived from row versions, not from the serialized bytes
+    digest = hashlib.sha1(json.dumps(versions, default=str).encode()).hexdigest()
+    return f'W/"{digest}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == opaque
+        for candidate in if_none_match.split(",")
+    )
+
+def not_modified(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """Set the ETag on the response; return a 304 to send instead if the client's copy is current"""
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,324 @@
+import asyncio
+import json
+import logging
+import os
+from collections import defaultdict
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Set
+from sqlalchemy import event, inspect, select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.util import identity_key
+from database import async_engine
+from models import Comment, Plan, Task
+
+logger = logging.getLogger(__name__)
+
+EVENT_BROKER = os.getenv("EVENT_BROKER", "memory")
+EVENT_SUBSCRIBER_QUEUE_SIZE = int(os.getenv("EVENT_SUBSCRIBER_QUEUE_SIZE", "100"))
+EVENT_SEND_TIMEOUT_SECONDS = float(os.getenv("EVENT_SEND_TIMEOUT_SECONDS", "10"))
+EVENT_HEARTBEAT_SECONDS = float(os.getenv("EVENT_HEARTBEAT_SECONDS", "30"))
+EVENT_ACCESS_RECHECK_SECONDS = float(os.getenv("EVENT_ACCESS_RECHECK_SECONDS", "60"))
+
+# Single NOTIFY channel shared by every process when EVENT_BROKER=postgres
+POSTGRES_CHANNEL = "azplan_events"
+
+# Events are thin notifications; clients refetch what changed (cheaply, with ETags).
+# Each one carries the project and plan it belongs to:
+#   plan.created / plan.updated / plan.deleted
+#   tasks.changed     any task of the plan was created, updated or deleted
+#   comment.created   with comment_id
+
+class Subscription:
+    """Bounded queue of events for one client
+
+    A client that falls EVENT_SUBSCRIBER_QUEUE_SIZE events behind loses its
+    backlog and gets a single resync event instead, so a slow reader never
+    slows down publishers or holds memory without bound.
+    """
+
+    def __init__(self, project_id: int, plan_id: Optional[int] = None, queue_size: int = EVENT_SUBSCRIBER_QUEUE_SIZE):
+        self.project_id = project_id
+        self.plan_id = plan_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.loop = asyncio.get_running_loop()
+        self.dropped = 0
+
+    def wants(self, event: dict) -> bool:
+        return self.plan_id is None or event.get("plan_id") == self.plan_id
+
+    def put(self, event: dict):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+                self.dropped += 1
+            self.queue.put_nowait({"type": "resync", "project_id": self.project_id, "plan_id": self.plan_id})
+
+    async def get(self, timeout: float) -> Optional[dict]:
+        """Next event, or None if nothing arrived within timeout"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+class EventHub:
+    """In-process fan-out of events to the subscriptions of their project"""
+
+    def __init__(self):
+        self._subscriptions: Dict[int, Set[Subscription]] = defaultdict(set)
+        self.delivered = 0
+        self.resyncs = 0
+
+    def subscribe(self, project_id: int, plan_id: Optional[int] = None) -> Subscription:
+        subscription = Subscription(project_id, plan_id)
+        self._subscriptions[project_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscriptions = self._subscriptions.get(subscription.project_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.project_id]
+
+    def has_subscribers(self) -> bool:
+        return bool(self._subscriptions)
+
+    def dispatch(self, event: dict):
+        """Queue an event for its subscribers; safe to call from any thread"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        for subscription in list(self._subscriptions.get(event["project_id"], ())):
+            if subscription.wants(event):
+                if subscription.loop is loop:
+                    self._deliver(subscription, event)
+                else:
+                    # asyncio queues are not thread-safe; hand over to the subscriber's loop
+                    try:
+                        subscription.loop.call_soon_threadsafe(self._deliver, subscription, event)
+                    except RuntimeError:
+                        # Loop closed; the subscription is being torn down
+                        pass
+
+    def _deliver(self, subscription: Subscription, event: dict):
+        dropped = subscription.dropped
+        subscription.put(event)
+        self.delivered += 1
+        if subscription.dropped > dropped:
+            self.resyncs += 1
+
+    def stats(self) -> dict:
+        return {
+            "projects": len(self._subscriptions),
+            "subscriptions": sum(len(subscriptions) for subscriptions in self._subscriptions.values()),
+            "delivered": self.delivered,
+            "resyncs": self.resyncs,
+        }
+
+class EventBroker:
+    """Carries committed events to the hub of every process
+
+    publish() is called from synchronous session hooks, so implementations
+    must not block; start() and stop() run in the application lifespan.
+    Brokers with in_transaction set get publish_in_transaction() on the
+    committing connection just before COMMIT instead of publish() after it.
+    """
+
+    in_transaction = False
+
+    def __init__(self, hub: EventHub):
+        self.hub = hub
+
+    def wants_events(self) -> bool:
+        """Whether anyone may receive events; if not, sessions skip collecting them"""
+        return True
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    def publish(self, events: List[dict]):
+        raise NotImplementedError
+
+    def publish_in_transaction(self, connection, events: List[dict]):
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {"broker": type(self).__name__, **self.hub.stats()}
+
+class InMemoryBroker(EventBroker):
+    """Single-process broker: events reach only this process's subscribers"""
+
+    def wants_events(self) -> bool:
+        return self.hub.has_subscribers()
+
+    def publish(self, events: List[dict]):
+        for event in events:
+            self.hub.dispatch(event)
+
+class PostgresBroker(EventBroker):
+    """Shares events between processes with PostgreSQL LISTEN/NOTIFY
+
+    Every process holds one connection listening on POSTGRES_CHANNEL and
+    dispatches what arrives, including its own events, to its hub. Events
+    are sent with NOTIFY inside the committing transaction, which PostgreSQL
+    delivers only if it commits, and without a connection of their own.
+    Subscribers of other processes are invisible, so events are always collected.
+    """
+
+    in_transaction = True
+
+    def __init__(self, hub: EventHub, reconnect_delay: float = 5.0):
+        super().__init__(hub)
+        self.reconnect_delay = reconnect_delay
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+
+    def publish_in_transaction(self, connection, events: List[dict]):
+        for event in events:
+            connection.execute(select(func.pg_notify(POSTGRES_CHANNEL, json.dumps(event))))
+
+    def _on_notification(self, connection, pid, channel, payload):
+        self.hub.dispatch(json.loads(payload))
+
+    async def _listen(self):
+        while True:
+            try:
+                async with async_engine.connect() as conn:
+                    raw = (await conn.get_raw_connection()).driver_connection
+                    lost = asyncio.Event()
+                    raw.add_termination_listener(lambda connection: lost.set())
+                    try:
+                        await raw.add_listener(POSTGRES_CHANNEL, self._on_notification)
+                        logger.info(f"Listening for events on {POSTGRES_CHANNEL}")
+                        await lost.wait()
+                        logger.warning("Event listener connection lost")
+                    finally:
+                        # Never hand a connection with listeners back to the pool
+                        await conn.invalidate()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Event listener failed: {e}")
+            await asyncio.sleep(self.reconnect_delay)
+
+def create_broker(hub: EventHub, name: str = EVENT_BROKER) -> EventBroker:
+    if name == "memory":
+        return InMemoryBroker(hub)
+    if name == "postgres":
+        return PostgresBroker(hub)
+    raise ValueError(f"Unknown EVENT_BROKER {name!r}, expected memory or postgres")
+
+event_hub = EventHub()
+event_broker = create_broker(event_hub)
+
+async def publish_on_commit(db: AsyncSession, event_type: str, plan_ids: Iterable[int], project_id: Optional[int] = None):
+    """Queue an event per plan for bulk statements that skip flush events
+
+    Pass project_id when all plans belong to a known project to skip looking it up.
+    """
+    if not event_broker.wants_events():
+        return
+    plan_ids = set(plan_ids)
+    plan_projects = db.info.setdefault("plan_projects", {})
+    if project_id is not None:
+        plan_projects.update((plan_id, project_id) for plan_id in plan_ids)
+    unknown = plan_ids - set(plan_projects)
+    if unknown:
+        plan_projects.update((await db.execute(
+            select(Plan.id, Plan.project_id).where(Plan.id.in_(unknown))
+        )).all())
+    db.info.setdefault("pending_plan_events", set()).update((event_type, plan_id, None) for plan_id in plan_ids)
+
+def _known_plan_project(session, plan_id: int) -> Optional[int]:
+    # Only what is already loaded; reading an expired attribute would query anyway
+    plan = session.identity_map.get(identity_key(Plan, plan_id))
+    return None if plan is None else inspect(plan).dict.get("project_id")
+
+# Collect events from flushed changes and publish them once committed
+@event.listens_for(Session, "after_flush")
+def _collect_events(session, flush_context):
+    # Without subscribers nothing is collected, sparing the plan -> project lookup;
+    # a client connecting meanwhile loads the current state after subscribing anyway
+    if not event_broker.wants_events():
+        return
+    pending = session.info.setdefault("pending_plan_events", set())
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Task):
+            pending.add(("tasks.changed", obj.plan_id, None))
+            for plan_id in inspect(obj).attrs.plan_id.history.deleted:
+                pending.add(("tasks.changed", plan_id, None))
+        elif isinstance(obj, Comment) and obj in session.new:
+            pending.add(("comment.created", obj.plan_id, obj.id))
+        elif isinstance(obj, Plan):
+            if obj in session.new:
+                event_type = "plan.created"
+            elif obj in session.deleted:
+                event_type = "plan.deleted"
+            else:
+                event_type = "plan.updated"
+            # Deleted plans cannot be looked up after the commit
+            session.info.setdefault("plan_projects", {})[obj.id] = obj.project_id
+            pending.add((event_type, obj.id, None))
+
+    plan_projects = session.info.setdefault("plan_projects", {})
+    for plan_id in {plan_id for _, plan_id, _ in pending if plan_id is not None and plan_id not in plan_projects}:
+        project_id = _known_plan_project(session, plan_id)
+        if project_id is not None:
+            plan_projects[plan_id] = project_id
+    unknown = {plan_id for _, plan_id, _ in pending if plan_id is not None and plan_id not in plan_projects}
+    if unknown:
+        plan_projects.update(session.connection().execute(
+            select(Plan.id, Plan.project_id).where(Plan.id.in_(unknown))
+        ).all())
+
+def _take_events(session) -> List[dict]:
+    pending = session.info.pop("pending_plan_events", set())
+    plan_projects = session.info.pop("plan_projects", {})
+    events = []
+    for event_type, plan_id, comment_id in sorted(pending, key=lambda item: (item[1] or 0, item[0])):
+        project_id = plan_projects.get(plan_id)
+        if project_id is None:
+            continue
+        event = {"type": event_type, "project_id": project_id, "plan_id": plan_id}
+        if comment_id is not None:
+            event["comment_id"] = comment_id
+        events.append(event)
+    return events
+
+@event.listens_for(Session, "before_commit")
+def _publish_events_in_transaction(session):
+    if not event_broker.in_transaction:
+        return
+    # Flush first so the changes of the final flush are collected too
+    session.flush()
+    events = _take_events(session)
+    if events:
+        event_broker.publish_in_transaction(session.connection(), events)
+
+@event.listens_for(Session, "after_commit")
+def _publish_events(session):
+    if event_broker.in_transaction:
+        return
+    events = _take_events(session)
+    if events:
+        event_broker.publish(events)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_events(session):
+    session.info.pop("pending_plan_events", None)
+    session.info.pop("plan_projects", None)
@@ -0,0 +1,72 @@
+from typing import Optional, Set, Tuple, Type
+from fastapi import HTTPException, Query, Response, status
+from pydantic import BaseModel
+from sqlalchemy.orm import noload, selectinload
+from responses import DefaultJSONResponse
+from schemas import Plan, PlanWithStats, Project
+
+def split_names(value: Optional[str]) -> Set[str]:
+    return {name.strip() for name in (value or "").split(",") if name.strip()}
+
+class FieldSelection:
+    """Fields and embedded relations a client asked for with ?fields= and ?include=
+
+    Relations are left out of the response unless included, and callers
+    skip loading them with loader(). id is always returned.
+    """
+
+    def __init__(self, schema: Type[BaseModel], relations: Tuple[str, ...], fields: Set[str], include: Set[str]):
+        unknown = (fields - set(schema.model_fields)) | (include - set(relations))
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+            )
+
+        self.schema = schema
+        self.relations = relations
+        self.include = include | (fields & set(relations))
+        self.fields = fields | {"id"} | self.include if fields else None
+
+    def includes(self, relation: str) -> bool:
+        return relation in self.include
+
+    def loader(self, relationship):
+        """Loader option that loads a relationship only when it is included"""
+        if self.includes(relationship.key):
+            return selectinload(relationship)
+        return noload(relationship)
+
+    @property
+    def tag(self) -> str:
+        """Distinguishes representations of the same rows in ETags"""
+        return f"{','.join(sorted(self.fields or ()))};{','.join(sorted(self.include))}"
+
+    def dump(self, item) -> dict:
+        exclude = set(self.relations) - self.include
+        return self.schema.model_validate(item).model_dump(mode="json", include=self.fields, exclude=exclude)
+
+    def render(self, content, response: Response) -> Response:
+        """Serialize one item or a list of items, keeping headers already set on response"""
+        if isinstance(content, list):
+            body = [self.dump(item) for item in content]
+        else:
+            body = self.dump(content)
+        rendered = DefaultJSONResponse(body)
+        rendered.headers.update(response.headers)
+        return rendered
+
+def field_selection(schema: Type[BaseModel], relations: Tuple[str, ...] = ()):
+    """Dependency parsing ?fields= and ?include= for responses of the given schema"""
+    def dependency(
+        fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+        include: Optional[str] = Query(
+            None, description=f"Comma-separated relations to embed: {', '.join(relations) or 'none'}"
+        )
+    ) -> FieldSelection:
+        return FieldSelection(schema, relations, split_names(fields), split_names(include))
+    return dependency
+
+plan_fields = field_selection(Plan, relations=("tasks",))
+plan_with_stats_fields = field_selection(PlanWithStats, relations=("tasks",))
+project_fields = field_selection(Project)
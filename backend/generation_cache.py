@@ -0,0 +1,178 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+GENERATION_CACHE_TTL_SECONDS = float(os.getenv("GENERATION_CACHE_TTL_SECONDS", "86400"))
+GENERATION_CACHE_MAX_ENTRIES = int(os.getenv("GENERATION_CACHE_MAX_ENTRIES", "256"))
+GENERATION_CACHE_DIR = os.getenv("GENERATION_CACHE_DIR", "")
+GENERATION_CACHE_MAX_DISK_MB = float(os.getenv("GENERATION_CACHE_MAX_DISK_MB", "50"))
+
+def generation_cache_key(request: dict) -> str:
+    """Hash of everything that determines a generation: model, format, options and prompt"""
+    material = {key: value for key, value in request.items() if key != "stream"}
+    return hashlib.sha256(json.dumps(material, sort_keys=True).encode()).hexdigest()
+
+class GenerationCache:
+    """TTL/LRU cache of parsed generation results, optionally backed by a directory
+
+    Values are lists of plan dicts. Disk entries are one JSON file per key
+    with a wall-clock expiry, so they outlive restarts; the oldest files are
+    pruned once the directory grows past its size limit.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = GENERATION_CACHE_TTL_SECONDS,
+        max_entries: int = GENERATION_CACHE_MAX_ENTRIES,
+        directory: str = GENERATION_CACHE_DIR,
+        max_disk_bytes: int = int(GENERATION_CACHE_MAX_DISK_MB * 1024 * 1024)
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    async def get(self, key: str) -> Optional[List[dict]]:
+        if not self.enabled:
+            return None
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+
+        if self.directory:
+            plans = await asyncio.to_thread(self._read_disk, key)
+            if plans is not None:
+                self._set_memory(key, plans)
+                with self._lock:
+                    self.disk_hits += 1
+                return plans
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    async def set(self, key: str, plans: List[dict]):
+        if not self.enabled:
+            return
+        self._set_memory(key, plans)
+        if self.directory:
+            await asyncio.to_thread(self._write_disk, key, plans)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.directory and os.path.isdir(self.directory):
+            with self._disk_lock:
+                for name in os.listdir(self.directory):
+                    if name.endswith(".json"):
+                        os.remove(os.path.join(self.directory, name))
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": size,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "directory": self.directory or None,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+    def _set_memory(self, key: str, plans: List[dict]):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, plans)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _read_disk(self, key: str) -> Optional[List[dict]]:
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable generation cache entry {path}: {e}")
+            return None
+
+        if entry.get("expires_at", 0) <= time.time():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return entry.get("plans")
+
+    def _write_disk(self, key: str, plans: List[dict]):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(key)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"expires_at": time.time() + self.ttl_seconds, "plans": plans}, f)
+            os.replace(tmp_path, path)
+            self._prune_disk()
+        except OSError as e:
+            logger.warning(f"Failed to write generation cache entry: {e}")
+
+    def _prune_disk(self):
+        """Delete the oldest entries until the directory fits in max_disk_bytes"""
+        with self._disk_lock:
+            files = []
+            for name in os.listdir(self.directory):
+                if name.endswith(".json"):
+                    path = os.path.join(self.directory, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, path))
+
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self.max_disk_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+
+generation_cache = GenerationCache()
@@ -0,0 +1,337 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from fastapi import HTTPException, status
+from sqlalchemy import select, update, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import noload, selectinload
+from database import AsyncSessionLocal, async_engine
+from models import GenerationJob, Plan as PlanModel, Project as ProjectModel, User
+from ollama_service import ollama_service, PLAN_LETTERS
+from plan_stats import refresh_session_stats
+from shared_plan_cache import mark_plans_changed
+from events import publish_on_commit
+from rate_limits import check_generation_slot
+from schemas import PlanCreate
+
+logger = logging.getLogger(__name__)
+
+GENERATION_WORKERS = int(os.getenv("GENERATION_WORKERS", "2"))
+GENERATION_QUEUE_SIZE = int(os.getenv("GENERATION_QUEUE_SIZE", "100"))
+GENERATION_JOB_STALE_SECONDS = float(os.getenv("GENERATION_JOB_STALE_SECONDS", "600"))
+
+FINISHED_STATUSES = ("succeeded", "failed", "cancelled")
+
+async def get_generation_plan_z(db: AsyncSession, current_user: User, project_id: Optional[int]) -> PlanModel:
+    """Find the user's Plan Z to generate from, rejecting it if it has no content"""
+    plan_z_query = select(PlanModel).join(ProjectModel).where(
+        ProjectModel.owner_id == current_user.id,
+        PlanModel.plan_letter == "Z"
+    )
+    if project_id is not None:
+        plan_z_query = plan_z_query.where(PlanModel.project_id == project_id)
+    plan_z = await db.scalar(plan_z_query)
+
+    if not plan_z:
+        raise HTTPException(status_code=404, detail="Plan Z not found")
+
+    if not plan_z.description:
+        raise HTTPException(status_code=400, detail="Plan Z must have content/description")
+
+    return plan_z
+
+async def get_generated_plans(db: AsyncSession, project_id: int) -> List[PlanModel]:
+    """Existing plans B-Y of a project"""
+    return (await db.scalars(select(PlanModel).where(
+        PlanModel.project_id == project_id,
+        PlanModel.plan_letter.in_(list(PLAN_LETTERS))
+    ))).all()
+
+def missing_plan_letters(existing_plans: List[PlanModel]) -> str:
+    """Letters B-Y the project has no plan for yet"""
+    existing_letters = {plan.plan_letter for plan in existing_plans}
+    return "".join(letter for letter in PLAN_LETTERS if letter not in existing_letters)
+
+# Insert constructs supporting ON CONFLICT, by dialect
+PLAN_UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+def upsert_insert(dialect_name: str):
+    try:
+        return PLAN_UPSERT_INSERTS[dialect_name]
+    except KeyError:
+        raise RuntimeError(
+            f"Generated plans are saved with INSERT ... ON CONFLICT, which the {dialect_name} "
+            f"dialect does not provide; use PostgreSQL or SQLite"
+        )
+
+# Resolved at import so an unsupported database stops the app at startup
+plan_insert = upsert_insert(async_engine.dialect.name)
+
+async def upsert_generated_plans(
+    db: AsyncSession,
+    project_id: int,
+    plan_creates: List[PlanCreate],
+    load_tasks: bool = True,
+    refresh_stats: bool = True
+) -> List[PlanModel]:
+    """Insert or update generated plans keyed on (project_id, plan_letter) in one statement
+
+    Returns the saved plans, with their tasks loaded unless load_tasks is
+    False. The statement bypasses the unit of work, so the statistics
+    rollup, shared-plan snapshots and plan events are handled explicitly.
+    Streams saving batch after batch pass refresh_stats=False and call
+    refresh_generated_stats once at the end.
+    """
+    if not plan_creates:
+        return []
+
+    # Later duplicates of a letter win, as they would with one-by-one updates
+    rows = {
+        plan_create.plan_letter: {**plan_create.dict(), "project_id": project_id}
+        for plan_create in plan_creates
+    }
+    stmt = plan_insert(PlanModel).values(list(rows.values()))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[PlanModel.project_id, PlanModel.plan_letter],
+        set_={
+            "title": stmt.excluded.title,
+            "description": stmt.excluded.description,
+            "start_date": stmt.excluded.start_date,
+            "end_date": stmt.excluded.end_date,
+            "updated_at": func.now(),
+            # ON CONFLICT updates skip column onupdate defaults
+            "version": PlanModel.version + 1,
+        }
+    ).returning(PlanModel).options(selectinload(PlanModel.tasks) if load_tasks else noload(PlanModel.tasks))
+
+    plans = (await db.scalars(stmt, execution_options={"populate_existing": True})).all()
+    if refresh_stats:
+        await refresh_session_stats(db, plan_ids=[plan.id for plan in plans])
+    mark_plans_changed(db, [plan.id for plan in plans])
+    await publish_on_commit(db, "plan.updated", [plan.id for plan in plans], project_id=project_id)
+    return sorted(plans, key=lambda plan: plan.plan_letter)
+
+async def refresh_generated_stats(plan_ids: List[int]):
+    """Bring the rollup up to date for plans saved with refresh_stats=False, in a transaction of its own"""
+    if not plan_ids:
+        return
+    async with AsyncSessionLocal() as session:
+        await refresh_session_stats(session, plan_ids=plan_ids)
+        await session.commit()
+
+class JobCancelled(Exception):
+    pass
+
+class GenerationJobQueue:
+    """Bounded worker pool running persisted generation jobs
+
+    Job ids wait in an in-memory queue; the generation_jobs table is the
+    source of truth, so queued jobs and jobs interrupted by a shutdown are
+    picked up again on the next start.
+    """
+
+    def __init__(
+        self,
+        workers: int = GENERATION_WORKERS,
+        queue_size: int = GENERATION_QUEUE_SIZE,
+        stale_after: float = GENERATION_JOB_STALE_SECONDS
+    ):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.stale_after = stale_after
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._running: Dict[int, asyncio.Task] = {}
+        self._stopping = False
+
+    async def start(self):
+        """Requeue unfinished jobs from the database and start the workers"""
+        self._stopping = False
+        self._queue = asyncio.Queue()
+
+        # Running jobs nobody has touched for a while belong to a worker that died
+        stale_before = datetime.now(timezone.utc) - timedelta(seconds=self.stale_after)
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                update(GenerationJob)
+                .where(GenerationJob.status == "running", GenerationJob.updated_at < stale_before)
+                .values(status="queued")
+            )
+            await session.commit()
+            job_ids = (await session.scalars(
+                select(GenerationJob.id).where(GenerationJob.status == "queued").order_by(GenerationJob.id)
+            )).all()
+
+        for job_id in job_ids:
+            self._queue.put_nowait(job_id)
+        if job_ids:
+            logger.info(f"Requeued {len(job_ids)} generation jobs")
+
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Stop the workers; interrupted jobs go back to queued for the next start"""
+        self._stopping = True
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def submit(
+        self,
+        db: AsyncSession,
+        current_user: User,
+        project_id: int,
+        use_cache: bool = True,
+        gaps_only: bool = False
+    ) -> GenerationJob:
+        if self._queue is None or self._queue.qsize() >= self.queue_size:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Generation queue is full, try again later"
+            )
+
+        # Shares the per-user limit with synchronous generations; queued jobs
+        # count too, so one user cannot fill the shared queue
+        await check_generation_slot(db, current_user.id)
+
+        job = GenerationJob(
+            user_id=current_user.id,
+            project_id=project_id,
+            total=len(PLAN_LETTERS),
+            use_cache=use_cache,
+            gaps_only=gaps_only
+        )
+        db.add(job)
+        await db.commit()
+        await db.refresh(job)
+
+        self._queue.put_nowait(job.id)
+        return job
+
+    async def cancel(self, db: AsyncSession, job: GenerationJob) -> GenerationJob:
+        if job.status in FINISHED_STATUSES:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Job already {job.status}")
+
+        if job.status == "queued":
+            # Only a queued job can be cancelled outright; a worker claims it atomically
+            result = await db.execute(
+                update(GenerationJob)
+                .where(GenerationJob.id == job.id, GenerationJob.status == "queued")
+                .values(status="cancelled", cancel_requested=True, finished_at=func.now())
+            )
+            if result.rowcount:
+                await db.commit()
+                await db.refresh(job)
+                return job
+
+        # Running, possibly in another process: the worker checks this flag after every plan
+        job.cancel_requested = True
+        await db.commit()
+
+        task = self._running.get(job.id)
+        if task is not None:
+            task.cancel()
+
+        await db.refresh(job)
+        return job
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "running": len(self._running),
+        }
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            task = asyncio.create_task(self._run_job(job_id))
+            self._running[job_id] = task
+            try:
+                await asyncio.shield(task)
+            except asyncio.CancelledError:
+                # Shutdown: stop the job too and let it record itself as queued
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                raise
+            finally:
+                self._running.pop(job_id, None)
+                self._queue.task_done()
+
+    async def _set_job(self, job_id: int, **values):
+        async with AsyncSessionLocal() as session:
+            await session.execute(update(GenerationJob).where(GenerationJob.id == job_id).values(**values))
+            await session.commit()
+
+    async def _run_job(self, job_id: int):
+        # Their statistics are refreshed once, however the job ends
+        saved_plan_ids: List[int] = []
+        try:
+            async with AsyncSessionLocal() as session:
+                claimed = await session.execute(
+                    update(GenerationJob)
+                    .where(GenerationJob.id == job_id, GenerationJob.status == "queued")
+                    .values(
+                        status="running",
+                        progress=0,
+                        plan_ids=[],
+                        error=None,
+                        started_at=func.now(),
+                        attempts=GenerationJob.attempts + 1
+                    )
+                )
+                await session.commit()
+                if not claimed.rowcount:
+                    # Cancelled while queued, or already claimed by another process
+                    return
+
+                job = await session.get(GenerationJob, job_id)
+                plan_z = await session.scalar(select(PlanModel).where(
+                    PlanModel.project_id == job.project_id,
+                    PlanModel.plan_letter == "Z"
+                ))
+                if not plan_z or not plan_z.description:
+                    raise ValueError("Plan Z must have content/description")
+
+                existing_plans = await get_generated_plans(session, job.project_id)
+                letters = missing_plan_letters(existing_plans) if job.gaps_only else PLAN_LETTERS
+                job.total = len(letters)
+                await session.commit()
+
+                async for plan_batch in ollama_service.stream_plans(
+                    plan_z.description, existing_plans, use_cache=job.use_cache, letters=letters
+                ):
+                    db_plans = await upsert_generated_plans(
+                        session, job.project_id, plan_batch, load_tasks=False, refresh_stats=False
+                    )
+                    batch_ids = [db_plan.id for db_plan in db_plans]
+                    saved_plan_ids.extend(batch_ids)
+                    job.progress += len(batch_ids)
+                    job.plan_ids = job.plan_ids + batch_ids
+                    await session.commit()
+
+                    await session.refresh(job, ["cancel_requested"])
+                    if job.cancel_requested:
+                        raise JobCancelled()
+
+                await refresh_session_stats(session, plan_ids=saved_plan_ids)
+                job.status = "succeeded"
+                job.finished_at = func.now()
+                await session.commit()
+        except (asyncio.CancelledError, JobCancelled):
+            await refresh_generated_stats(saved_plan_ids)
+            if self._stopping:
+                await self._set_job(job_id, status="queued")
+            else:
+                await self._set_job(job_id, status="cancelled", finished_at=func.now())
+        except Exception as e:
+            logger.error(f"Generation job {job_id} failed: {e}")
+            await refresh_generated_stats(saved_plan_ids)
+            await self._set_job(job_id, status="failed", error=str(e), finished_at=func.now())
+
+generation_jobs = GenerationJobQueue()
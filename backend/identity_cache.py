@@ -0,0 +1,140 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Hashable, Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import User
+
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+
+@dataclass(frozen=True)
+class CachedUser:
+    """Detached, read-only snapshot of an authenticated user"""
+    id: int
+    username: str
+    email: str
+    is_active: bool
+    is_admin: bool
+    created_at: Optional[datetime]
+
+    @classmethod
+    def from_model(cls, user: User) -> "CachedUser":
+        return cls(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            is_active=user.is_active,
+            is_admin=user.is_admin,
+            created_at=user.created_at,
+        )
+
+@dataclass(frozen=True)
+class CachedIdentity:
+    user: CachedUser
+    api_token_id: Optional[int] = None
+
+def token_digest(token: str) -> str:
+    """Key API tokens by digest so raw tokens never sit in the cache"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+class IdentityCache:
+    """In-process TTL/LRU cache of authenticated identities"""
+
+    def __init__(self, ttl_seconds: float = AUTH_CACHE_TTL_SECONDS, max_entries: int = AUTH_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    def get(self, key: Hashable) -> Optional[CachedIdentity]:
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, identity: CachedIdentity):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, identity)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_user(self, user_id: int):
+        """Drop every cached identity (JWT or API token) belonging to a user"""
+        with self._lock:
+            keys = [key for key, (_, identity) in self._entries.items() if identity.user.id == user_id]
+            for key in keys:
+                del self._entries[key]
+            self.invalidations += len(keys)
+
+    def invalidate_token(self, token: str):
+        with self._lock:
+            if self._entries.pop(("token", token_digest(token)), None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": size,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+identity_cache = IdentityCache()
+
+# Invalidate cached identities once changes to users are committed
+@event.listens_for(Session, "after_flush")
+def _collect_changed_users(session, flush_context):
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            session.info.setdefault("changed_user_ids", set()).add(obj.id)
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            session.info.setdefault("changed_user_ids", set()).add(obj.id)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session):
+    for user_id in session.info.pop("changed_user_ids", ()):
+        identity_cache.invalidate_user(user_id)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_users(session):
+    session.info.pop("changed_user_ids", None)
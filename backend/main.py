@@ -1,36 +1,91 @@
-from fastapi import FastAPI, Depends, HTTPException, status, BackgroundTasks
+from fastapi import FastAPI, Depends, HTTPException, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, asc
+from fastapi.responses import StreamingResponse
+from contextlib import asynccontextmanager
+from sqlalchemy import select, insert, update, delete, func, desc, asc
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 from datetime import datetime, timedelta
 from typing import List, Optional
+import anyio
+import json
+import logging
+import os
 import secrets
 import uuid
 
-from database import SessionLocal, engine, get_db
-from models import Base, User as UserModel, Project as ProjectModel, Plan as PlanModel, Task as TaskModel, Comment as CommentModel, APIToken as APITokenModel, SharedLink as SharedLinkModel
+from database import async_engine, get_async_db, AsyncSessionLocal
+from models import User as UserModel, Project as ProjectModel, Plan as PlanModel, Task as TaskModel, Comment as CommentModel, APIToken as APITokenModel, SharedLink as SharedLinkModel, PlanStats as PlanStatsModel
 from schemas import (
     User, UserCreate, UserLogin, Project, ProjectCreate, ProjectUpdate, ProjectWithPlans,
     Plan, PlanCreate, PlanUpdate, PlanWithStats,
-    Task, TaskCreate, TaskUpdate, Comment, CommentCreate, APIToken, APITokenCreate,
+    Task, TaskCreate, TaskUpdate, TaskBatchRequest, TaskBatchResult, TaskBatchResponse, Comment, CommentCreate, APIToken, APITokenCreate,
     SharedLink, SharedLinkCreate, Token, TokenData, PlanStatistics,
     LLMGenerationRequest, LLMGenerationResponse
 )
 from auth import (
     authenticate_user, create_access_token, get_current_active_user,
-    get_password_hash, ACCESS_TOKEN_EXPIRE_MINUTES
+    ACCESS_TOKEN_EXPIRE_MINUTES
 )
-from ollama_service import ollama_service
-from routers import projects, plans
+from identity_cache import identity_cache
+from generation_jobs import (
+    generation_jobs, get_generation_plan_z, get_generated_plans, missing_plan_letters,
+    refresh_generated_stats, upsert_generated_plans
+)
+from ollama_service import ollama_service, PLAN_LETTERS
+from pagination import PageParams, keyset_page, finish_page, NEXT_CURSOR_HEADER
+from etags import fetch_versions, make_etag, not_modified, etag_matches
+from fieldsets import FieldSelection, plan_fields, plan_with_stats_fields
+from events import event_broker, publish_on_commit
+from password_hashing import password_hasher
+from rate_limits import generation_slot, limit_by_ip, limit_by_user
+from plan_access import PlanAccess, plan_comment_access, require_comment_access
+from shared_plan_cache import shared_plan_cache, mark_plans_changed, SharedPlanSnapshot
+from responses import DefaultJSONResponse, CompressionMiddleware
+from metrics import METRICS_ENABLED, MetricsMiddleware, metrics_response
+from query_budget import SQL_QUERY_DEBUG, QUERY_COUNT_HEADER, QueryBudgetMiddleware
+from plan_stats import build_plans_with_stats, refresh_session_stats, summarize_plan_stats
+from token_usage import token_usage
+from routers import projects, plans, admin, jobs, realtime
+
+logger = logging.getLogger(__name__)
+
+TASK_BATCH_MAX_OPERATIONS = int(os.getenv("TASK_BATCH_MAX_OPERATIONS", "500"))
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    token_usage.start()
+    await ollama_service.startup()
+    await event_broker.start()
+    await generation_jobs.start()
+    yield
+    await generation_jobs.stop()
+    await event_broker.stop()
+    await ollama_service.shutdown()
+    await token_usage.stop()
+    password_hasher.shutdown()
+    await async_engine.dispose()
 
-app = FastAPI(title="A-Z Plan API", version="1.0.0")
+app = FastAPI(
+    title="A-Z Plan API",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=DefaultJSONResponse
+)
 
 # Include routers
 app.include_router(projects.router)
 app.include_router(plans.router)
+app.include_router(admin.router)
+app.include_router(jobs.router)
+app.include_router(realtime.router)
+
+app.add_middleware(CompressionMiddleware)
+
+if SQL_QUERY_DEBUG:
+    app.add_middleware(QueryBudgetMiddleware)
 
 # CORS middleware
 app.add_middleware(
@@ -39,45 +94,53 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", QUERY_COUNT_HEADER],
 )
 
+# Outermost, so timings include compression and CORS
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 # Auth endpoints
-@app.post("/auth/register", response_model=User)
-def register_user(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(UserModel).filter(
+@app.post("/auth/register", response_model=User, dependencies=[Depends(limit_by_ip("register"))])
+async def register_user(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    db_user = await db.scalar(select(UserModel).where(
         (UserModel.username == user.username) | (UserModel.email == user.email)
-    ).first()
+    ))
     if db_user:
         raise HTTPException(
             status_code=400,
             detail="Username or email already registered"
         )
     
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await password_hasher.hash(user.password)
     db_user = UserModel(
         username=user.username,
         email=user.email,
         hashed_password=hashed_password
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.flush()
     
-    # Create default Plan A
+    # Create default project with Plan A
+    project = ProjectModel(title="My Project", owner_id=db_user.id)
+    db.add(project)
+    await db.flush()
     plan_a = PlanModel(
         plan_letter="A",
         title="Plan A - Starting Point",
         description="This is your starting point. Plan A represents where you are now.",
-        owner_id=db_user.id
+        project_id=project.id
     )
     db.add(plan_a)
-    db.commit()
+    await db.commit()
+    await db.refresh(db_user)
     
     return db_user
 
-@app.post("/auth/login", response_model=Token)
-def login_for_access_token(user_credentials: UserLogin, db: Session = Depends(get_db)):
-    user = authenticate_user(db, user_credentials.username, user_credentials.password)
+@app.post("/auth/login", response_model=Token, dependencies=[Depends(limit_by_ip("login"))])
+async def login_for_access_token(user_credentials: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    user = await authenticate_user(db, user_credentials.username, user_credentials.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -91,15 +154,15 @@ def login_for_access_token(user_credentials: UserLogin, db: Session = Depends(ge
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.get("/auth/me", response_model=User)
-def read_users_me(current_user: User = Depends(get_current_active_user)):
+async def read_users_me(current_user: User = Depends(get_current_active_user)):
     return current_user
 
 # API Token endpoints
 @app.post("/api-tokens", response_model=APIToken)
-def create_api_token(
+async def create_api_token(
     token_data: APITokenCreate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     token = secrets.token_urlsafe(32)
     db_token = APITokenModel(
@@ -108,110 +171,149 @@ def create_api_token(
         name=token_data.name
     )
     db.add(db_token)
-    db.commit()
-    db.refresh(db_token)
+    await db.commit()
+    await db.refresh(db_token)
     return db_token
 
 @app.get("/api-tokens", response_model=List[APIToken])
-def list_api_tokens(
+async def list_api_tokens(
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    return db.query(APITokenModel).filter(APITokenModel.user_id == current_user.id).all()
+    return (await db.scalars(
+        select(APITokenModel).where(APITokenModel.user_id == current_user.id)
+    )).all()
 
 @app.delete("/api-tokens/{token_id}")
-def delete_api_token(
+async def delete_api_token(
     token_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    token = db.query(APITokenModel).filter(
+    token = await db.scalar(select(APITokenModel).where(
         APITokenModel.id == token_id,
         APITokenModel.user_id == current_user.id
-    ).first()
+    ))
     if not token:
         raise HTTPException(status_code=404, detail="API token not found")
     
-    db.delete(token)
-    db.commit()
+    await db.delete(token)
+    await db.commit()
+    identity_cache.invalidate_token(token.token)
     return {"message": "API token deleted"}
 
 # Plan endpoints
 @app.get("/plans", response_model=List[PlanWithStats])
-def read_plans(
+async def read_plans(
+    request: Request,
+    response: Response,
+    selection: FieldSelection = Depends(plan_with_stats_fields),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    plans = db.query(PlanModel).filter(PlanModel.owner_id == current_user.id).order_by(PlanModel.plan_letter).all()
-    
-    plans_with_stats = []
-    for plan in plans:
-        total_cost = sum(task.cost for task in plan.tasks)
-        total_revenue = sum(task.revenue for task in plan.tasks)
-        task_count = len(plan.tasks)
-        completed_task_count = sum(1 for task in plan.tasks if task.is_completed)
-        
-        plan_with_stats = PlanWithStats(
-            **plan.__dict__,
-            total_cost=total_cost,
-            total_revenue=total_revenue,
-            task_count=task_count,
-            completed_task_count=completed_task_count
+    plans_version, tasks_version = await fetch_versions(
+        db,
+        select(PlanModel.id, PlanModel.updated_at, PlanModel.version).join(ProjectModel).where(
+            ProjectModel.owner_id == current_user.id
+        ),
+        select(TaskModel.id, TaskModel.updated_at, TaskModel.version).join(PlanModel).join(ProjectModel).where(
+            ProjectModel.owner_id == current_user.id
         )
-        plans_with_stats.append(plan_with_stats)
-    
-    return plans_with_stats
+    )
+    cached = not_modified(request, response, make_etag(plans_version, tasks_version, selection.tag))
+    if cached:
+        return cached
+    
+    plans = (await db.scalars(
+        select(PlanModel).join(ProjectModel).options(selection.loader(PlanModel.tasks)).where(
+            ProjectModel.owner_id == current_user.id
+        ).order_by(PlanModel.plan_letter)
+    )).all()
+    
+    plans_with_stats = await build_plans_with_stats(db, plans, include_tasks=selection.includes("tasks"))
+    return selection.render(plans_with_stats, response)
 
 @app.post("/plans", response_model=Plan)
-def create_plan(
+async def create_plan(
     plan: PlanCreate,
+    project_id: int,
+    response: Response,
+    selection: FieldSelection = Depends(plan_fields),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    # Check if plan letter already exists for user
-    existing_plan = db.query(PlanModel).filter(
-        PlanModel.owner_id == current_user.id,
-        PlanModel.plan_letter == plan.plan_letter
-    ).first()
-    
-    if existing_plan:
-        raise HTTPException(status_code=400, detail="Plan with this letter already exists")
+    project = await db.scalar(select(ProjectModel).where(
+        ProjectModel.id == project_id,
+        ProjectModel.owner_id == current_user.id
+    ))
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
     
     # Validate plan letter
     if plan.plan_letter not in "ABCDEFGHIJKLMNOPQRSTUVWXYZ":
         raise HTTPException(status_code=400, detail="Invalid plan letter")
     
-    db_plan = PlanModel(**plan.dict(), owner_id=current_user.id)
+    db_plan = PlanModel(**plan.dict(), project_id=project_id)
     db.add(db_plan)
-    db.commit()
-    db.refresh(db_plan)
-    return db_plan
+    try:
+        await db.commit()
+    except IntegrityError:
+        # uq_plans_project_id_plan_letter
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Plan with this letter already exists")
+    await db.refresh(db_plan)
+    # A new plan has no tasks yet
+    set_committed_value(db_plan, "tasks", [])
+    return selection.render(db_plan, response)
 
 @app.get("/plans/{plan_id}", response_model=Plan)
-def read_plan(
+async def read_plan(
     plan_id: int,
+    request: Request,
+    response: Response,
+    selection: FieldSelection = Depends(plan_fields),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    plan = db.query(PlanModel).filter(
-        PlanModel.id == plan_id,
-        PlanModel.owner_id == current_user.id
-    ).first()
+    plan_version, tasks_version = await fetch_versions(
+        db,
+        select(PlanModel.id, PlanModel.updated_at, PlanModel.version).join(ProjectModel).where(
+            PlanModel.id == plan_id,
+            ProjectModel.owner_id == current_user.id
+        ),
+        select(TaskModel.id, TaskModel.updated_at, TaskModel.version).where(TaskModel.plan_id == plan_id)
+    )
+    if not plan_version[0]:
+        raise HTTPException(status_code=404, detail="Plan not found")
+    cached = not_modified(request, response, make_etag(plan_version, tasks_version, selection.tag))
+    if cached:
+        return cached
+    
+    plan = await db.scalar(
+        select(PlanModel).join(ProjectModel).options(selection.loader(PlanModel.tasks)).where(
+            PlanModel.id == plan_id,
+            ProjectModel.owner_id == current_user.id
+        )
+    )
     if not plan:
         raise HTTPException(status_code=404, detail="Plan not found")
-    return plan
+    return selection.render(plan, response)
 
 @app.put("/plans/{plan_id}", response_model=Plan)
-def update_plan(
+async def update_plan(
     plan_id: int,
     plan_update: PlanUpdate,
+    response: Response,
+    selection: FieldSelection = Depends(plan_fields),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    plan = db.query(PlanModel).filter(
-        PlanModel.id == plan_id,
-        PlanModel.owner_id == current_user.id
-    ).first()
+    plan = await db.scalar(
+        select(PlanModel).join(ProjectModel).options(selection.loader(PlanModel.tasks)).where(
+            PlanModel.id == plan_id,
+            ProjectModel.owner_id == current_user.id
+        )
+    )
     if not plan:
         raise HTTPException(status_code=404, detail="Plan not found")
     
@@ -223,20 +325,22 @@ def update_plan(
     for key, value in update_data.items():
         setattr(plan, key, value)
     
-    db.commit()
-    db.refresh(plan)
-    return plan
+    await db.commit()
+    await db.refresh(plan)
+    return selection.render(plan, response)
 
 @app.delete("/plans/{plan_id}")
-def delete_plan(
+async def delete_plan(
     plan_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    plan = db.query(PlanModel).filter(
-        PlanModel.id == plan_id,
-        PlanModel.owner_id == current_user.id
-    ).first()
+    plan = await db.scalar(
+        select(PlanModel).join(ProjectModel).options(selectinload(PlanModel.tasks)).where(
+            PlanModel.id == plan_id,
+            ProjectModel.owner_id == current_user.id
+        )
+    )
     if not plan:
         raise HTTPException(status_code=404, detail="Plan not found")
     
@@ -244,57 +348,68 @@ def delete_plan(
     if plan.plan_letter == "A":
         raise HTTPException(status_code=400, detail="Plan A cannot be deleted")
     
-    db.delete(plan)
-    db.commit()
+    await db.delete(plan)
+    await db.commit()
     return {"message": "Plan deleted"}
 
 # Task endpoints
 @app.post("/plans/{plan_id}/tasks", response_model=Task)
-def create_task(
+async def create_task(
     plan_id: int,
     task: TaskCreate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    plan = db.query(PlanModel).filter(
+    plan = await db.scalar(select(PlanModel.id).join(ProjectModel).where(
         PlanModel.id == plan_id,
-        PlanModel.owner_id == current_user.id
-    ).first()
+        ProjectModel.owner_id == current_user.id
+    ))
     if not plan:
         raise HTTPException(status_code=404, detail="Plan not found")
     
     db_task = TaskModel(**task.dict(), plan_id=plan_id)
     db.add(db_task)
-    db.commit()
-    db.refresh(db_task)
+    await db.commit()
+    await db.refresh(db_task)
     return db_task
 
 @app.get("/plans/{plan_id}/tasks", response_model=List[Task])
-def read_tasks(
+async def read_tasks(
     plan_id: int,
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    plan = db.query(PlanModel).filter(
-        PlanModel.id == plan_id,
-        PlanModel.owner_id == current_user.id
-    ).first()
-    if not plan:
+    plan_version, tasks_version = await fetch_versions(
+        db,
+        select(PlanModel.id, PlanModel.updated_at, PlanModel.version).join(ProjectModel).where(
+            PlanModel.id == plan_id,
+            ProjectModel.owner_id == current_user.id
+        ),
+        select(TaskModel.id, TaskModel.updated_at, TaskModel.version).where(TaskModel.plan_id == plan_id)
+    )
+    if not plan_version[0]:
         raise HTTPException(status_code=404, detail="Plan not found")
+    cached = not_modified(request, response, make_etag(tasks_version))
+    if cached:
+        return cached
     
-    return db.query(TaskModel).filter(TaskModel.plan_id == plan_id).order_by(TaskModel.order).all()
+    return (await db.scalars(
+        select(TaskModel).where(TaskModel.plan_id == plan_id).order_by(TaskModel.order)
+    )).all()
 
 @app.put("/tasks/{task_id}", response_model=Task)
-def update_task(
+async def update_task(
     task_id: int,
     task_update: TaskUpdate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    task = db.query(TaskModel).join(PlanModel).filter(
+    task = await db.scalar(select(TaskModel).join(PlanModel).join(ProjectModel).where(
         TaskModel.id == task_id,
-        PlanModel.owner_id == current_user.id
-    ).first()
+        ProjectModel.owner_id == current_user.id
+    ))
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
@@ -302,189 +417,320 @@ def update_task(
     for key, value in update_data.items():
         setattr(task, key, value)
     
-    db.commit()
-    db.refresh(task)
+    await db.commit()
+    await db.refresh(task)
     return task
 
 @app.delete("/tasks/{task_id}")
-def delete_task(
+async def delete_task(
     task_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    task = db.query(TaskModel).join(PlanModel).filter(
+    task = await db.scalar(select(TaskModel).join(PlanModel).join(ProjectModel).where(
         TaskModel.id == task_id,
-        PlanModel.owner_id == current_user.id
-    ).first()
+        ProjectModel.owner_id == current_user.id
+    ))
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    db.delete(task)
-    db.commit()
+    await db.delete(task)
+    await db.commit()
     return {"message": "Task deleted"}
 
-# LLM Generation endpoints
-@app.post("/plans/generate-from-z", response_model=List[Plan])
-async def generate_plans_from_z(
+@app.post("/plans/{plan_id}/tasks/batch", response_model=TaskBatchResponse)
+async def batch_tasks(
+    plan_id: int,
+    batch: TaskBatchRequest,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    # Get Plan Z
-    plan_z = db.query(PlanModel).filter(
-        PlanModel.owner_id == current_user.id,
-        PlanModel.plan_letter == "Z"
-    ).first()
+    """Apply create/update/delete/reorder operations to a plan's tasks in one transaction
+    
+    Every operation is validated first; if any is invalid nothing is applied
+    and the per-item results are returned with a 400.
+    """
+    if len(batch.operations) > TASK_BATCH_MAX_OPERATIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"A batch can hold at most {TASK_BATCH_MAX_OPERATIONS} operations"
+        )
+    
+    project_id = await db.scalar(select(PlanModel.project_id).join(ProjectModel).where(
+        PlanModel.id == plan_id,
+        ProjectModel.owner_id == current_user.id
+    ))
+    if project_id is None:
+        raise HTTPException(status_code=404, detail="Plan not found")
     
-    if not plan_z:
-        raise HTTPException(status_code=404, detail="Plan Z not found")
+    referenced_ids = set()
+    for operation in batch.operations:
+        if operation.task_id is not None:
+            referenced_ids.add(operation.task_id)
+        referenced_ids.update(operation.task_ids or [])
+    known_ids = set()
+    if referenced_ids:
+        known_ids = set((await db.scalars(select(TaskModel.id).where(
+            TaskModel.plan_id == plan_id,
+            TaskModel.id.in_(referenced_ids)
+        ))).all())
+    
+    # Fold the operations into one row set per statement, validating as we go
+    results = [TaskBatchResult(index=i, op=operation.op, ok=True) for i, operation in enumerate(batch.operations)]
+    creates = []
+    updates = {}
+    deleted_ids = set()
+    
+    def check_task_id(task_id: Optional[int]) -> Optional[str]:
+        if task_id is None:
+            return "task_id is required"
+        if task_id not in known_ids:
+            return f"Task {task_id} not found in this plan"
+        if task_id in deleted_ids:
+            return f"Task {task_id} is deleted earlier in this batch"
+        return None
+    
+    def check_deletable(task_id: Optional[int]) -> Optional[str]:
+        # Its update result would describe a row that no longer exists
+        if task_id in updates:
+            return f"Task {task_id} is changed earlier in this batch"
+        return check_task_id(task_id)
+    
+    for operation, result in zip(batch.operations, results):
+        error = None
+        if operation.op == "create":
+            if operation.task is None:
+                error = "task is required"
+            else:
+                creates.append((result, {**operation.task.dict(), "plan_id": plan_id}))
+        elif operation.op == "update":
+            error = check_task_id(operation.task_id)
+            if not error and operation.changes is None:
+                error = "changes is required"
+            if not error:
+                updates.setdefault(operation.task_id, {}).update(operation.changes.dict(exclude_unset=True))
+        elif operation.op == "delete":
+            error = check_deletable(operation.task_id)
+            if not error:
+                deleted_ids.add(operation.task_id)
+        elif operation.op == "reorder":
+            if not operation.task_ids:
+                error = "task_ids is required"
+            elif len(set(operation.task_ids)) != len(operation.task_ids):
+                error = "task_ids contains duplicates"
+            else:
+                error = next(filter(None, map(check_task_id, operation.task_ids)), None)
+            if not error:
+                for position, task_id in enumerate(operation.task_ids):
+                    updates.setdefault(task_id, {})["order"] = position
+        
+        result.task_id = operation.task_id
+        if error:
+            result.ok = False
+            result.error = error
     
-    if not plan_z.description:
-        raise HTTPException(status_code=400, detail="Plan Z must have content/description")
+    if not all(result.ok for result in results):
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "message": "No operations were applied",
+                "results": [result.model_dump(mode="json") for result in results if not result.ok]
+            }
+        )
+    
+    if deleted_ids:
+        await db.execute(delete(TaskModel).where(TaskModel.id.in_(deleted_ids)))
+    
+    # Updates with no changes are not written, but still report the current row
+    changed = [{"id": task_id, **values} for task_id, values in updates.items() if values]
+    if changed:
+        # ORM bulk UPDATE by primary key; rows with the same columns share one executemany
+        await db.execute(update(TaskModel), changed)
+    
+    if creates:
+        created = (await db.scalars(
+            insert(TaskModel).returning(TaskModel, sort_by_parameter_order=True),
+            [values for _, values in creates]
+        )).all()
+        for (result, _), task in zip(creates, created):
+            result.task_id = task.id
+            result.task = Task.model_validate(task)
+    
+    if updates:
+        updated = {
+            task.id: task for task in (await db.scalars(
+                select(TaskModel).where(TaskModel.id.in_(updates.keys()))
+                .execution_options(populate_existing=True)
+            )).all()
+        }
+        for operation, result in zip(batch.operations, results):
+            if operation.op == "update" and operation.task_id in updated:
+                result.task = Task.model_validate(updated[operation.task_id])
+    
+    # Bulk statements skip the flush events behind the rollup, shared-plan cache and live events
+    await refresh_session_stats(db, plan_ids=[plan_id])
+    mark_plans_changed(db, [plan_id])
+    await publish_on_commit(db, "tasks.changed", [plan_id], project_id=project_id)
+    await db.commit()
+    
+    return TaskBatchResponse(results=results)
+
+# LLM Generation endpoints
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@app.post(
+    "/plans/generate-from-z",
+    response_model=List[Plan],
+    dependencies=[Depends(limit_by_user("generation")), Depends(generation_slot)]
+)
+async def generate_plans_from_z(
+    response: Response,
+    project_id: Optional[int] = None,
+    use_cache: bool = True,
+    gaps_only: bool = False,
+    selection: FieldSelection = Depends(plan_fields),
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    plan_z = await get_generation_plan_z(db, current_user, project_id)
     
     # Get existing plans B-Y
-    existing_plans = db.query(PlanModel).filter(
-        PlanModel.owner_id == current_user.id,
-        PlanModel.plan_letter.in_("BCDEFGHIJKLMNOPQRSTUVWXY")
-    ).all()
+    existing_plans = await get_generated_plans(db, plan_z.project_id)
     
-    # Generate new plans
+    # Generate new plans, or only the letters the project is missing
+    letters = missing_plan_letters(existing_plans) if gaps_only else PLAN_LETTERS
     generated_plan_creates = await ollama_service.generate_plans(
-        plan_z.description, existing_plans
+        plan_z.description, existing_plans, use_cache=use_cache, letters=letters
+    )
+    
+    saved_plans = await upsert_generated_plans(
+        db, plan_z.project_id, generated_plan_creates, load_tasks=selection.includes("tasks")
     )
+    await db.commit()
     
-    created_plans = []
-    for plan_create in generated_plan_creates:
-        # Check if plan already exists
-        existing = db.query(PlanModel).filter(
-            PlanModel.owner_id == current_user.id,
-            PlanModel.plan_letter == plan_create.plan_letter
-        ).first()
+    return selection.render(saved_plans, response)
+
+@app.post("/plans/generate-from-z/stream", dependencies=[Depends(limit_by_user("generation")), Depends(generation_slot)])
+async def stream_plans_from_z(
+    project_id: Optional[int] = None,
+    use_cache: bool = True,
+    gaps_only: bool = False,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Generate plans B-Y as Server-Sent Events, saving and emitting each plan as it is parsed"""
+    plan_z = await get_generation_plan_z(db, current_user, project_id)
+    plan_z_content, target_project_id = plan_z.description, plan_z.project_id
+    existing_plans = await get_generated_plans(db, target_project_id)
+    letters = missing_plan_letters(existing_plans) if gaps_only else PLAN_LETTERS
+    # Hand the request's connection back now; the dependency would only
+    # close this session once the whole stream has been sent
+    await db.close()
+    
+    async def event_stream():
+        generated_letters = []
+        saved_plan_ids = []
+        try:
+            # The stream outlives the request handler, so it writes through its own session
+            async with AsyncSessionLocal() as session:
+                async for plan_batch in ollama_service.stream_plans(
+                    plan_z_content, existing_plans, use_cache=use_cache, letters=letters
+                ):
+                    db_plans = await upsert_generated_plans(session, target_project_id, plan_batch, refresh_stats=False)
+                    await session.commit()
+                    saved_plan_ids.extend(db_plan.id for db_plan in db_plans)
+                    for db_plan in db_plans:
+                        generated_letters.append(db_plan.plan_letter)
+                        yield sse_event("plan", Plan.model_validate(db_plan).model_dump(mode="json"))
+        except Exception as e:
+            logger.error(f"Plan generation stream failed: {e}")
+            yield sse_event("error", {"detail": "Plan generation failed"})
+        finally:
+            # One statistics refresh per stream, also when the client disconnects midway
+            with anyio.CancelScope(shield=True):
+                await refresh_generated_stats(saved_plan_ids)
         
-        if existing:
-            # Update existing plan
-            for key, value in plan_create.dict(exclude_unset=True).items():
-                setattr(existing, key, value)
-            created_plans.append(existing)
-        else:
-            # Create new plan
-            db_plan = PlanModel(**plan_create.dict(), owner_id=current_user.id)
-            db.add(db_plan)
-            created_plans.append(db_plan)
-    
-    db.commit()
-    for plan in created_plans:
-        db.refresh(plan)
-    
-    return created_plans
+        yield sse_event("done", {
+            "generated": len(generated_letters),
+            "missing": [letter for letter in letters if letter not in generated_letters]
+        })
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 # Statistics endpoints
 @app.get("/statistics", response_model=PlanStatistics)
-def get_statistics(
+async def get_statistics(
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    plans = db.query(PlanModel).filter(PlanModel.owner_id == current_user.id).all()
-    
-    if not plans:
-        return PlanStatistics(
-            total_plans=0,
-            completed_tasks=0,
-            total_tasks=0
-        )
-    
-    # Calculate plan costs and durations
-    plan_costs = []
-    plan_durations = []
-    
-    for plan in plans:
-        total_cost = sum(task.cost for task in plan.tasks)
-        if total_cost > 0:
-            plan_costs.append((plan.plan_letter, total_cost))
-        
-        if plan.start_date and plan.end_date:
-            duration = (plan.end_date - plan.start_date).days
-            plan_durations.append((plan.plan_letter, duration))
-    
-    # Find extremes
-    highest_cost_plan = max(plan_costs, key=lambda x: x[1])[0] if plan_costs else None
-    lowest_cost_plan = min(plan_costs, key=lambda x: x[1])[0] if plan_costs else None
-    longest_duration_plan = max(plan_durations, key=lambda x: x[1])[0] if plan_durations else None
-    shortest_duration_plan = min(plan_durations, key=lambda x: x[1])[0] if plan_durations else None
-    
-    # Count tasks
-    total_tasks = sum(len(plan.tasks) for plan in plans)
-    completed_tasks = sum(sum(1 for task in plan.tasks if task.is_completed) for plan in plans)
-    
-    return PlanStatistics(
-        highest_cost_plan=highest_cost_plan,
-        lowest_cost_plan=lowest_cost_plan,
-        longest_duration_plan=longest_duration_plan,
-        shortest_duration_plan=shortest_duration_plan,
-        total_plans=len(plans),
-        completed_tasks=completed_tasks,
-        total_tasks=total_tasks
-    )
+    # Read the precomputed rollup instead of scanning every plan and task
+    plan_stats = (await db.scalars(
+        select(PlanStatsModel).join(
+            ProjectModel, PlanStatsModel.project_id == ProjectModel.id
+        ).where(ProjectModel.owner_id == current_user.id)
+    )).all()
+    
+    return PlanStatistics(**summarize_plan_stats(plan_stats))
 
 # Comment endpoints
 @app.post("/comments", response_model=Comment)
-def create_comment(
+async def create_comment(
     comment: CommentCreate,
+    request: Request,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    # Check if user has access to the plan (owner or shared)
-    plan = db.query(PlanModel).filter(PlanModel.id == comment.plan_id).first()
-    if not plan:
-        raise HTTPException(status_code=404, detail="Plan not found")
-    
-    if plan.owner_id != current_user.id:
-        # Check if plan is shared
-        shared_link = db.query(SharedLinkModel).filter(
-            SharedLinkModel.plan_id == comment.plan_id,
-            SharedLinkModel.is_active == True
-        ).first()
-        if not shared_link:
-            raise HTTPException(status_code=403, detail="Access denied")
+    # Owner, or any user once the plan is shared
+    await require_comment_access(request, db, current_user, comment.plan_id)
     
     db_comment = CommentModel(**comment.dict(), user_id=current_user.id)
     db.add(db_comment)
-    db.commit()
-    db.refresh(db_comment)
-    return db_comment
+    await db.commit()
+    await db.refresh(db_comment)
+    # The author is the caller; no need to load them again
+    return Comment(
+        id=db_comment.id,
+        plan_id=db_comment.plan_id,
+        user_id=db_comment.user_id,
+        content=db_comment.content,
+        created_at=db_comment.created_at,
+        updated_at=db_comment.updated_at,
+        user=User.model_validate(current_user)
+    )
 
 @app.get("/plans/{plan_id}/comments", response_model=List[Comment])
-def read_comments(
+async def read_comments(
     plan_id: int,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    response: Response,
+    page: PageParams = Depends(),
+    access: PlanAccess = Depends(plan_comment_access),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    # Check access
-    plan = db.query(PlanModel).filter(PlanModel.id == plan_id).first()
-    if not plan:
-        raise HTTPException(status_code=404, detail="Plan not found")
-    
-    if plan.owner_id != current_user.id:
-        shared_link = db.query(SharedLinkModel).filter(
-            SharedLinkModel.plan_id == plan_id,
-            SharedLinkModel.is_active == True
-        ).first()
-        if not shared_link:
-            raise HTTPException(status_code=403, detail="Access denied")
-    
-    return db.query(CommentModel).filter(CommentModel.plan_id == plan_id).order_by(desc(CommentModel.created_at)).all()
+    """Newest comments first; further pages via the X-Next-Cursor header"""
+    # Authors are many-to-one, so joining them in adds no rows
+    comments = (await db.scalars(keyset_page(
+        select(CommentModel).options(joinedload(CommentModel.user)).where(CommentModel.plan_id == plan_id),
+        CommentModel.created_at, CommentModel.id, page, descending=True
+    ))).all()
+    return finish_page(comments, page, response)
 
 # Shared Link endpoints
 @app.post("/plans/{plan_id}/share", response_model=SharedLink)
-def create_shared_link(
+async def create_shared_link(
     plan_id: int,
     share_data: SharedLinkCreate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    plan = db.query(PlanModel).filter(
+    plan = await db.scalar(select(PlanModel.id).join(ProjectModel).where(
         PlanModel.id == plan_id,
-        PlanModel.owner_id == current_user.id
-    ).first()
+        ProjectModel.owner_id == current_user.id
+    ))
     if not plan:
         raise HTTPException(status_code=404, detail="Plan not found")
     
@@ -496,25 +742,38 @@ def create_shared_link(
         expires_at=share_data.expires_at
     )
     db.add(db_shared_link)
-    db.commit()
-    db.refresh(db_shared_link)
+    await db.commit()
+    await db.refresh(db_shared_link)
     return db_shared_link
 
-@app.get("/shared/{share_token}")
-def get_shared_plan(share_token: str, db: Session = Depends(get_db)):
-    shared_link = db.query(SharedLinkModel).filter(
-        SharedLinkModel.share_token == share_token,
-        SharedLinkModel.is_active == True
-    ).first()
-    
-    if not shared_link:
-        raise HTTPException(status_code=404, detail="Shared link not found")
+@app.get("/shared/{share_token}", response_model=Plan)
+async def get_shared_plan(share_token: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    # Served from the snapshot cache without touching the database when possible
+    snapshot = shared_plan_cache.get(share_token)
+    if snapshot is None:
+        generation = shared_plan_cache.generation
+        shared_link = await db.scalar(select(SharedLinkModel).where(
+            SharedLinkModel.share_token == share_token,
+            SharedLinkModel.is_active == True
+        ))
+        
+        if not shared_link:
+            raise HTTPException(status_code=404, detail="Shared link not found")
+        
+        plan = await db.scalar(
+            select(PlanModel).options(selectinload(PlanModel.tasks)).where(PlanModel.id == shared_link.plan_id)
+        )
+        body = DefaultJSONResponse(Plan.model_validate(plan).model_dump(mode="json")).body
+        snapshot = SharedPlanSnapshot.build(shared_link, body)
+        shared_plan_cache.set(share_token, snapshot, generation)
     
-    if shared_link.expires_at and shared_link.expires_at < datetime.utcnow():
+    if snapshot.expired():
         raise HTTPException(status_code=410, detail="Shared link has expired")
     
-    plan = db.query(PlanModel).filter(PlanModel.id == shared_link.plan_id).first()
-    return plan
+    headers = {"ETag": snapshot.etag, "Cache-Control": snapshot.cache_control()}
+    if etag_matches(request.headers.get("if-none-match"), snapshot.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
 
 # Health check
 @app.get("/health")
@@ -525,6 +784,13 @@ async def health_check():
         "ollama": "healthy" if ollama_healthy else "unhealthy"
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Request, database and threadpool metrics in the Prometheus text format"""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    return metrics_response()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,162 @@
+import os
+import time
+from contextvars import ContextVar
+from typing import Optional
+import anyio.to_thread
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from database import async_engine, engine, pool_status
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Generations run for up to OLLAMA_TIMEOUT_SECONDS, hence the long tail
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by route and status code",
+    ["method", "route", "status"]
+)
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Time until the response body was sent",
+    ["method", "route"], buckets=LATENCY_BUCKETS
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "HTTP requests being handled",
+    ["method"]
+)
+REQUEST_STATEMENTS = Histogram(
+    "http_request_db_statements", "SQL statements executed per request",
+    ["method", "route"], buckets=STATEMENT_BUCKETS
+)
+REQUEST_DB_DURATION = Histogram(
+    "http_request_db_duration_seconds", "Time spent executing SQL per request",
+    ["method", "route"], buckets=LATENCY_BUCKETS
+)
+DB_STATEMENTS = Counter("db_statements_total", "SQL statements executed", ["engine"])
+DB_DURATION = Counter("db_statement_duration_seconds_total", "Time spent executing SQL", ["engine"])
+
+class RequestDatabaseStats:
+    __slots__ = ("statements", "duration")
+
+    def __init__(self):
+        self.statements = 0
+        self.duration = 0.0
+
+# Set by the middleware for the duration of a request; None for background work
+request_db_stats: ContextVar[Optional[RequestDatabaseStats]] = ContextVar("request_db_stats", default=None)
+
+def instrument_engine(sync_engine, name: str):
+    """Count statements and time them with cursor events"""
+    statements = DB_STATEMENTS.labels(name)
+    duration = DB_DURATION.labels(name)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _finish(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["metrics_started"].pop()
+        statements.inc()
+        duration.inc(elapsed)
+        stats = request_db_stats.get()
+        if stats is not None:
+            stats.statements += 1
+            stats.duration += elapsed
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _failed(exception_context):
+        # after_cursor_execute does not fire for failed statements
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("metrics_started"):
+            connection.info["metrics_started"].pop()
+
+class RuntimeCollector:
+    """Connection pool and threadpool gauges, read when scraped"""
+
+    def collect(self):
+        pools = {
+            "checked_out": GaugeMetricFamily("db_pool_checked_out", "Connections in use", labels=["engine"]),
+            "idle": GaugeMetricFamily("db_pool_idle", "Idle pooled connections", labels=["engine"]),
+            "overflow": GaugeMetricFamily("db_pool_overflow", "Connections open above the pool size", labels=["engine"]),
+        }
+        waits = CounterMetricFamily(
+            "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection", labels=["engine"]
+        )
+        timeouts = CounterMetricFamily(
+            "db_pool_checkout_timeouts", "Checkouts that gave up waiting for a connection", labels=["engine"]
+        )
+        for name, pool in (("api", async_engine.pool), ("sync", engine.pool)):
+            status = pool_status(pool)
+            for key, family in pools.items():
+                family.add_metric([name], status[key])
+            waits.add_metric([name], status["wait"]["total_wait_seconds"])
+            timeouts.add_metric([name], status["wait"]["timeouts"])
+        yield from pools.values()
+        yield waits
+        yield timeouts
+
+        # Sync endpoints, sync dependencies and run_in_threadpool share this limiter
+        try:
+            limiter = anyio.to_thread.current_default_thread_limiter()
+        except RuntimeError:
+            # Scraped outside the event loop
+            return
+        statistics = limiter.statistics()
+        yield GaugeMetricFamily("threadpool_threads", "Threadpool size", value=limiter.total_tokens)
+        yield GaugeMetricFamily("threadpool_threads_busy", "Threadpool threads in use", value=limiter.borrowed_tokens)
+        yield GaugeMetricFamily("threadpool_tasks_waiting", "Calls waiting for a free thread", value=statistics.tasks_waiting)
+
+class MetricsMiddleware:
+    """Record latency, status and SQL usage of every HTTP request
+
+    Requests are labelled with the route template, such as
+    /plans/{plan_id}, so label values stay bounded.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        stats = RequestDatabaseStats()
+        token = request_db_stats.set(stats)
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_progress = REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            in_progress.dec()
+            request_db_stats.reset(token)
+            route = scope.get("route")
+            route_path = route.path if route is not None else "unmatched"
+            REQUESTS.labels(method, route_path, str(status_code)).inc()
+            REQUEST_DURATION.labels(method, route_path).observe(duration)
+            REQUEST_STATEMENTS.labels(method, route_path).observe(stats.statements)
+            REQUEST_DB_DURATION.labels(method, route_path).observe(stats.duration)
+
+def metrics_response() -> Response:
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
+if METRICS_ENABLED:
+    instrument_engine(async_engine.sync_engine, "api")
+    instrument_engine(engine, "sync")
+    REGISTRY.register(RuntimeCollector())
@@ -0,0 +1,95 @@
+"""Indexes on hot foreign keys and unique plan letters per project
+
+Adds indexes for tasks.plan_id, comments.plan_id, projects.owner_id and
+shared_links.plan_id, and a unique (project_id, plan_letter) constraint on
+plans. The unique index leads with project_id, so it also serves lookups
+of a project's plans and no separate plans.project_id index is created.
+
+On PostgreSQL the indexes are built CONCURRENTLY, outside a transaction,
+so writes to the tables are not blocked while they build. Every step is
+skipped if it already exists, for databases created by create_all.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+FOREIGN_KEY_INDEXES = [
+    ('ix_tasks_plan_id', 'tasks', ['plan_id']),
+    ('ix_comments_plan_id', 'comments', ['plan_id']),
+    ('ix_projects_owner_id', 'projects', ['owner_id']),
+    ('ix_shared_links_plan_id', 'shared_links', ['plan_id']),
+]
+
+PLAN_LETTER_CONSTRAINT = 'uq_plans_project_id_plan_letter'
+
+
+def check_duplicate_plan_letters():
+    if op.get_context().as_sql:
+        return
+    duplicates = op.get_bind().execute(sa.text(
+        "SELECT project_id, plan_letter, count(*) FROM plans "
+        "GROUP BY project_id, plan_letter HAVING count(*) > 1"
+    )).all()
+    if duplicates:
+        listed = ", ".join(f"project {project_id} plan {letter} ({count}x)" for project_id, letter, count in duplicates)
+        raise RuntimeError(f"Remove duplicate plans before upgrading: {listed}")
+
+
+def upgrade():
+    bind = op.get_bind()
+    existing_constraints = set()
+    if not op.get_context().as_sql:
+        existing_constraints = {
+            constraint['name'] for constraint in sa.inspect(bind).get_unique_constraints('plans')
+        }
+
+    if bind.dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, table, columns in FOREIGN_KEY_INDEXES:
+                op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+
+            if PLAN_LETTER_CONSTRAINT not in existing_constraints:
+                check_duplicate_plan_letters()
+                op.create_index(
+                    PLAN_LETTER_CONSTRAINT, 'plans', ['project_id', 'plan_letter'],
+                    unique=True, postgresql_concurrently=True, if_not_exists=True
+                )
+                # Promote the prebuilt index; this only takes a brief lock
+                op.execute(
+                    f"ALTER TABLE plans ADD CONSTRAINT {PLAN_LETTER_CONSTRAINT} "
+                    f"UNIQUE USING INDEX {PLAN_LETTER_CONSTRAINT}"
+                )
+        return
+
+    for name, table, columns in FOREIGN_KEY_INDEXES:
+        op.create_index(name, table, columns, if_not_exists=True)
+
+    if PLAN_LETTER_CONSTRAINT not in existing_constraints:
+        check_duplicate_plan_letters()
+        with op.batch_alter_table('plans') as batch_op:
+            batch_op.create_unique_constraint(PLAN_LETTER_CONSTRAINT, ['project_id', 'plan_letter'])
+
+
+def downgrade():
+    bind = op.get_bind()
+
+    if bind.dialect.name == 'postgresql':
+        op.drop_constraint(PLAN_LETTER_CONSTRAINT, 'plans', type_='unique')
+        with op.get_context().autocommit_block():
+            for name, table, _ in FOREIGN_KEY_INDEXES:
+                op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+        return
+
+    with op.batch_alter_table('plans') as batch_op:
+        batch_op.drop_constraint(PLAN_LETTER_CONSTRAINT, type_='unique')
+    for name, table, _ in FOREIGN_KEY_INDEXES:
+        op.drop_index(name, table_name=table, if_exists=True)
@@ -0,0 +1,50 @@
+"""Composite indexes for keyset pagination of comments and projects
+
+Replaces ix_comments_plan_id and ix_projects_owner_id with indexes on
+(plan_id, created_at, id) and (owner_id, created_at, id). They serve the
+same equality lookups and also return each page already in order. Built
+CONCURRENTLY on PostgreSQL.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-16
+"""
+from alembic import op
+
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+# (new index, table, columns, index it replaces)
+KEYSET_INDEXES = [
+    ('ix_comments_plan_id_created_at_id', 'comments', ['plan_id', 'created_at', 'id'], 'ix_comments_plan_id', ['plan_id']),
+    ('ix_projects_owner_id_created_at_id', 'projects', ['owner_id', 'created_at', 'id'], 'ix_projects_owner_id', ['owner_id']),
+]
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, table, columns, replaced, _ in KEYSET_INDEXES:
+                op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+                op.drop_index(replaced, table_name=table, postgresql_concurrently=True, if_exists=True)
+        return
+
+    for name, table, columns, replaced, _ in KEYSET_INDEXES:
+        op.create_index(name, table, columns, if_not_exists=True)
+        op.drop_index(replaced, table_name=table, if_exists=True)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, table, _, replaced, replaced_columns in KEYSET_INDEXES:
+                op.create_index(replaced, table, replaced_columns, postgresql_concurrently=True, if_not_exists=True)
+                op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+        return
+
+    for name, table, _, replaced, replaced_columns in KEYSET_INDEXES:
+        op.create_index(replaced, table, replaced_columns, if_not_exists=True)
+        op.drop_index(name, table_name=table, if_exists=True)
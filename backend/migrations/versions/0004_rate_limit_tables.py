@@ -0,0 +1,44 @@
+"""Tables for the shared rate limiter backend
+
+rate_limit_buckets holds one token bucket per rate-limited key and
+rate_limit_leases the held slots of per-user concurrency limits. They
+are only used with RATE_LIMIT_BACKEND=postgres. Skipped if the tables
+already exist, for databases created by create_all.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not op.get_context().as_sql and sa.inspect(op.get_bind()).has_table('rate_limit_buckets'):
+        return
+
+    op.create_table('rate_limit_buckets',
+    sa.Column('key', sa.String(), nullable=False),
+    sa.Column('tokens', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+    op.create_table('rate_limit_leases',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('key', sa.String(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_rate_limit_leases_key'), 'rate_limit_leases', ['key'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_rate_limit_leases_key'), table_name='rate_limit_leases')
+    op.drop_table('rate_limit_leases')
+    op.drop_table('rate_limit_buckets')
@@ -0,0 +1,124 @@
+"""Plan and project statistics rollup tables
+
+Adds plan_stats and project_stats, which hold per-plan and per-project
+task totals so statistics endpoints never scan tasks, and backfills them
+from the existing plans and tasks. Skipped if the tables already exist,
+for databases created by create_all.
+
+With --sql the backfill cannot run; run python rebuild_statistics.py
+after applying the generated script.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+# Snapshots of the tables as of this revision, independent of models.py
+plans = sa.table('plans',
+    sa.column('id', sa.Integer), sa.column('project_id', sa.Integer), sa.column('plan_letter', sa.String),
+    sa.column('start_date', sa.DateTime), sa.column('end_date', sa.DateTime))
+tasks = sa.table('tasks',
+    sa.column('plan_id', sa.Integer), sa.column('cost', sa.Float), sa.column('revenue', sa.Float),
+    sa.column('is_completed', sa.Boolean))
+projects = sa.table('projects', sa.column('id', sa.Integer))
+plan_stats = sa.table('plan_stats',
+    sa.column('plan_id', sa.Integer), sa.column('project_id', sa.Integer), sa.column('plan_letter', sa.String),
+    sa.column('total_cost', sa.Float), sa.column('total_revenue', sa.Float), sa.column('task_count', sa.Integer),
+    sa.column('completed_task_count', sa.Integer), sa.column('duration_days', sa.Integer))
+project_stats = sa.table('project_stats',
+    sa.column('project_id', sa.Integer), sa.column('plan_count', sa.Integer), sa.column('total_cost', sa.Float),
+    sa.column('total_revenue', sa.Float), sa.column('task_count', sa.Integer), sa.column('completed_task_count', sa.Integer))
+
+
+def backfill():
+    if op.get_context().as_sql:
+        return
+    bind = op.get_bind()
+
+    rows = bind.execute(
+        sa.select(
+            plans.c.id, plans.c.project_id, plans.c.plan_letter, plans.c.start_date, plans.c.end_date,
+            sa.func.coalesce(sa.func.sum(tasks.c.cost), 0.0),
+            sa.func.coalesce(sa.func.sum(tasks.c.revenue), 0.0),
+            sa.func.count(tasks.c.plan_id),
+            sa.func.count(tasks.c.plan_id).filter(tasks.c.is_completed == sa.true()),
+        )
+        .select_from(plans.outerjoin(tasks, tasks.c.plan_id == plans.c.id))
+        .group_by(plans.c.id, plans.c.project_id, plans.c.plan_letter, plans.c.start_date, plans.c.end_date)
+    ).all()
+    if rows:
+        op.bulk_insert(plan_stats, [
+            {
+                'plan_id': plan_id,
+                'project_id': project_id,
+                'plan_letter': plan_letter,
+                'total_cost': total_cost,
+                'total_revenue': total_revenue,
+                'task_count': task_count,
+                'completed_task_count': completed_task_count,
+                'duration_days': (end_date - start_date).days if start_date and end_date else None,
+            }
+            for plan_id, project_id, plan_letter, start_date, end_date, total_cost, total_revenue, task_count, completed_task_count in rows
+        ])
+
+    bind.execute(project_stats.insert().from_select(
+        ['project_id', 'plan_count', 'total_cost', 'total_revenue', 'task_count', 'completed_task_count'],
+        sa.select(
+            projects.c.id,
+            sa.func.count(plan_stats.c.plan_id),
+            sa.func.coalesce(sa.func.sum(plan_stats.c.total_cost), 0.0),
+            sa.func.coalesce(sa.func.sum(plan_stats.c.total_revenue), 0.0),
+            sa.func.coalesce(sa.func.sum(plan_stats.c.task_count), 0),
+            sa.func.coalesce(sa.func.sum(plan_stats.c.completed_task_count), 0),
+        )
+        .select_from(projects.outerjoin(plan_stats, plan_stats.c.project_id == projects.c.id))
+        .group_by(projects.c.id)
+    ))
+
+
+def upgrade():
+    if not op.get_context().as_sql and sa.inspect(op.get_bind()).has_table('plan_stats'):
+        return
+
+    op.create_table('project_stats',
+    sa.Column('project_id', sa.Integer(), nullable=False),
+    sa.Column('plan_count', sa.Integer(), nullable=False),
+    sa.Column('total_cost', sa.Float(), nullable=False),
+    sa.Column('total_revenue', sa.Float(), nullable=False),
+    sa.Column('task_count', sa.Integer(), nullable=False),
+    sa.Column('completed_task_count', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('project_id')
+    )
+    op.create_table('plan_stats',
+    sa.Column('plan_id', sa.Integer(), nullable=False),
+    sa.Column('project_id', sa.Integer(), nullable=False),
+    sa.Column('plan_letter', sa.String(length=1), nullable=False),
+    sa.Column('total_cost', sa.Float(), nullable=False),
+    sa.Column('total_revenue', sa.Float(), nullable=False),
+    sa.Column('task_count', sa.Integer(), nullable=False),
+    sa.Column('completed_task_count', sa.Integer(), nullable=False),
+    sa.Column('duration_days', sa.Integer(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['plan_id'], ['plans.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('plan_id')
+    )
+    op.create_index(op.f('ix_plan_stats_project_id'), 'plan_stats', ['project_id'], unique=False)
+
+    backfill()
+
+
+def downgrade():
+    op.drop_index(op.f('ix_plan_stats_project_id'), table_name='plan_stats')
+    op.drop_table('plan_stats')
+    op.drop_table('project_stats')
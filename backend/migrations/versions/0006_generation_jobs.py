@@ -0,0 +1,55 @@
+"""Generation jobs table
+
+Adds generation_jobs, which persists queued Plan Z -> B-Y generations so
+they survive a worker restart. Skipped if the table already exists, for
+databases created by create_all.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not op.get_context().as_sql and sa.inspect(op.get_bind()).has_table('generation_jobs'):
+        return
+
+    op.create_table('generation_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('project_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('progress', sa.Integer(), nullable=False),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.Column('plan_ids', sa.JSON(), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('cancel_requested', sa.Boolean(), nullable=False),
+    sa.Column('use_cache', sa.Boolean(), nullable=False),
+    sa.Column('gaps_only', sa.Boolean(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_generation_jobs_id'), 'generation_jobs', ['id'], unique=False)
+    op.create_index(op.f('ix_generation_jobs_status'), 'generation_jobs', ['status'], unique=False)
+    op.create_index(op.f('ix_generation_jobs_user_id'), 'generation_jobs', ['user_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_generation_jobs_user_id'), table_name='generation_jobs')
+    op.drop_index(op.f('ix_generation_jobs_status'), table_name='generation_jobs')
+    op.drop_index(op.f('ix_generation_jobs_id'), table_name='generation_jobs')
+    op.drop_table('generation_jobs')
@@ -0,0 +1,33 @@
+"""Admin flag on users
+
+Adds users.is_admin, which gates the /admin endpoints instead of a
+configurable list of usernames. create_admin.py sets it. Skipped if the
+column already exists, for databases created by create_all.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not op.get_context().as_sql:
+        columns = sa.inspect(op.get_bind()).get_columns('users')
+        if any(column['name'] == 'is_admin' for column in columns):
+            return
+
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.add_column(sa.Column('is_admin', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('is_admin')
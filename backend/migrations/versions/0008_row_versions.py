@@ -0,0 +1,41 @@
+"""Row version counters for ETags
+
+Adds a version column to projects, plans and tasks that every UPDATE
+increments. ETags include it, so two edits within the same second, which
+updated_at cannot tell apart on SQLite, still change them. Skipped per
+table if the column already exists, for databases created by create_all.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+TABLES = ('projects', 'plans', 'tasks')
+
+
+def has_version(table):
+    if op.get_context().as_sql:
+        return False
+    return any(column['name'] == 'version' for column in sa.inspect(op.get_bind()).get_columns(table))
+
+
+def upgrade():
+    for table in TABLES:
+        if has_version(table):
+            continue
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    for table in TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('version')
@@ -1,8 +1,12 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean, Text, ForeignKey, JSON, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, expression, literal_column
 from database import Base
 
+def version_column() -> Column:
+    """Counter bumped by every UPDATE, so ETags see edits that updated_at's resolution hides"""
+    return Column(Integer, nullable=False, default=1, server_default="1", onupdate=literal_column("version") + 1)
+
 class User(Base):
     __tablename__ = "users"
     
@@ -11,6 +15,7 @@ class User(Base):
     email = Column(String, unique=True, index=True, nullable=False)
     hashed_password = Column(String, nullable=False)
     is_active = Column(Boolean, default=True)
+    is_admin = Column(Boolean, default=False, server_default=expression.false(), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
@@ -21,6 +26,10 @@ class User(Base):
 
 class Project(Base):
     __tablename__ = "projects"
+    __table_args__ = (
+        # Keyset pagination of a user's projects; also serves lookups by owner_id
+        Index("ix_projects_owner_id_created_at_id", "owner_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
@@ -28,12 +37,18 @@ class Project(Base):
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    version = version_column()
     
     owner = relationship("User", back_populates="projects")
     plans = relationship("Plan", back_populates="project", cascade="all, delete-orphan")
 
 class Plan(Base):
     __tablename__ = "plans"
+    __table_args__ = (
+        # One plan per letter in a project; generated plans are upserted on this key.
+        # Its index also serves lookups by project_id alone.
+        UniqueConstraint("project_id", "plan_letter", name="uq_plans_project_id_plan_letter"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
@@ -44,6 +59,7 @@ class Plan(Base):
     end_date = Column(DateTime(timezone=True))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    version = version_column()
     
     project = relationship("Project", back_populates="plans")
     tasks = relationship("Task", back_populates="plan", cascade="all, delete-orphan")
@@ -53,7 +69,7 @@ class Task(Base):
     __tablename__ = "tasks"
     
     id = Column(Integer, primary_key=True, index=True)
-    plan_id = Column(Integer, ForeignKey("plans.id"), nullable=False)
+    plan_id = Column(Integer, ForeignKey("plans.id"), nullable=False, index=True)
     order = Column(Integer, nullable=False, default=0)
     title = Column(String, nullable=False)
     description = Column(Text)
@@ -63,11 +79,16 @@ class Task(Base):
     is_completed = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    version = version_column()
     
     plan = relationship("Plan", back_populates="tasks")
 
 class Comment(Base):
     __tablename__ = "comments"
+    __table_args__ = (
+        # Keyset pagination of a plan's comments; also serves lookups by plan_id
+        Index("ix_comments_plan_id_created_at_id", "plan_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     plan_id = Column(Integer, ForeignKey("plans.id"), nullable=False)
@@ -96,7 +117,7 @@ class SharedLink(Base):
     __tablename__ = "shared_links"
     
     id = Column(Integer, primary_key=True, index=True)
-    plan_id = Column(Integer, ForeignKey("plans.id"), nullable=False)
+    plan_id = Column(Integer, ForeignKey("plans.id"), nullable=False, index=True)
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     share_token = Column(String, unique=True, index=True, nullable=False)
     is_active = Column(Boolean, default=True)
@@ -104,4 +125,65 @@ class SharedLink(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     plan = relationship("Plan")
-    owner = relationship("User", back_populates="shared_links")
\ No newline at end of file
+    owner = relationship("User", back_populates="shared_links")
+
+class PlanStats(Base):
+    __tablename__ = "plan_stats"
+    
+    plan_id = Column(Integer, ForeignKey("plans.id", ondelete="CASCADE"), primary_key=True)
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False, index=True)
+    plan_letter = Column(String(1), nullable=False)
+    total_cost = Column(Float, nullable=False, default=0.0)
+    total_revenue = Column(Float, nullable=False, default=0.0)
+    task_count = Column(Integer, nullable=False, default=0)
+    completed_task_count = Column(Integer, nullable=False, default=0)
+    duration_days = Column(Integer)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class ProjectStats(Base):
+    __tablename__ = "project_stats"
+    
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True)
+    plan_count = Column(Integer, nullable=False, default=0)
+    total_cost = Column(Float, nullable=False, default=0.0)
+    total_revenue = Column(Float, nullable=False, default=0.0)
+    task_count = Column(Integer, nullable=False, default=0)
+    completed_task_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class GenerationJob(Base):
+    """Queued Plan Z -> B-Y generation, persisted so it survives a worker restart"""
+    __tablename__ = "generation_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False)
+    status = Column(String, nullable=False, default="queued", index=True)  # queued, running, succeeded, failed, cancelled
+    progress = Column(Integer, nullable=False, default=0)
+    total = Column(Integer, nullable=False, default=24)
+    plan_ids = Column(JSON, nullable=False, default=list)
+    error = Column(Text)
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    use_cache = Column(Boolean, nullable=False, default=True)
+    gaps_only = Column(Boolean, nullable=False, default=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class RateLimitBucket(Base):
+    """Token bucket shared by every API process when RATE_LIMIT_BACKEND=postgres"""
+    __tablename__ = "rate_limit_buckets"
+    
+    key = Column(String, primary_key=True)
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+class RateLimitLease(Base):
+    """Held slot of a per-user concurrency limit; expired leases of crashed processes are ignored"""
+    __tablename__ = "rate_limit_leases"
+    
+    id = Column(Integer, primary_key=True)
+    key = Column(String, nullable=False, index=True)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
@@ -1,7 +1,10 @@
+import asyncio
 import httpx
 import json
 import os
-from typing import List, Optional
+from typing import AsyncIterator, Dict, List, Optional
+from pydantic import ValidationError
+from generation_cache import generation_cache, generation_cache_key
 from schemas import Plan, PlanCreate
 import logging
 
@@ -9,14 +12,87 @@ logger = logging.getLogger(__name__)
 
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 MODEL_NAME = "llama3.2:latest"
+OLLAMA_TIMEOUT_SECONDS = float(os.getenv("OLLAMA_TIMEOUT_SECONDS", "120"))
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "10"))
+OLLAMA_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OLLAMA_MAX_KEEPALIVE_CONNECTIONS", "5"))
+OLLAMA_MAX_CONCURRENT_GENERATIONS = int(os.getenv("OLLAMA_MAX_CONCURRENT_GENERATIONS", "2"))
+OLLAMA_RETRY_ROUNDS = int(os.getenv("OLLAMA_RETRY_ROUNDS", "2"))
+
+# Letters generated from Plan Z
+PLAN_LETTERS = "BCDEFGHIJKLMNOPQRSTUVWXY"
+
+class PlanStreamParser:
+    """Incrementally extracts complete plan objects from streamed JSON text"""
+    
+    def __init__(self):
+        self._text = ""
+        self._open_objects: List[int] = []
+        self._in_string = False
+        self._escaped = False
+    
+    def feed(self, chunk: str) -> List[dict]:
+        plans = []
+        start = len(self._text)
+        self._text += chunk
+        
+        for i in range(start, len(self._text)):
+            char = self._text[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._open_objects.append(i)
+            elif char == "}" and self._open_objects:
+                begin = self._open_objects.pop()
+                try:
+                    obj = json.loads(self._text[begin:i + 1])
+                except json.JSONDecodeError:
+                    continue
+                # Plans may be wrapped (e.g. {"plans": [...]}); only the plan objects count
+                if isinstance(obj, dict) and "plan_letter" in obj:
+                    plans.append(obj)
+        
+        return plans
 
 class OllamaService:
     def __init__(self):
         self.base_url = OLLAMA_BASE_URL
         self.model = MODEL_NAME
+        self._client: Optional[httpx.AsyncClient] = None
+        # Never run more generations at once than the Ollama host can serve
+        self._generation_slots = asyncio.Semaphore(OLLAMA_MAX_CONCURRENT_GENERATIONS)
+    
+    async def startup(self):
+        """Open the shared HTTP client (called from the app lifespan)"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=httpx.Limits(
+                    max_connections=OLLAMA_MAX_CONNECTIONS,
+                    max_keepalive_connections=OLLAMA_MAX_KEEPALIVE_CONNECTIONS
+                ),
+                timeout=httpx.Timeout(OLLAMA_TIMEOUT_SECONDS, connect=5.0)
+            )
+    
+    async def shutdown(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
     
-    async def generate_plans(self, plan_z_content: str, existing_plans: List[Plan] = None) -> List[PlanCreate]:
-        """Generate B-Y plans based on Plan Z content using Ollama"""
+    async def _get_client(self) -> httpx.AsyncClient:
+        # Outside the app (scripts) the client is opened on first use
+        if self._client is None:
+            await self.startup()
+        return self._client
+    
+    def _build_prompt(self, plan_z_content: str, existing_plans: List[Plan] = None, letters: str = PLAN_LETTERS) -> str:
+        """Build the generation prompt for the given letters from Plan Z and the existing plans"""
         
         # Build context from existing plans
         existing_context = ""
@@ -28,6 +104,15 @@ class OllamaService:
                     existing_context += f"Description: {plan.description}\n"
                 existing_context += f"Start: {plan.start_date}, End: {plan.end_date}\n\n"
         
+        if letters == PLAN_LETTERS:
+            letters_text = "plans B through Y"
+            count_text = "24 plans total"
+            final_text = "Generate all 24 plans (B through Y) in a single response."
+        else:
+            letters_text = "only plans " + ", ".join(letters)
+            count_text = f"{len(letters)} plans total; the other plans already exist"
+            final_text = f"Generate exactly these {len(letters)} plans ({', '.join(letters)}) in a single response."
+        
         # Create prompt for LLM
         prompt = f"""
 You are an AI assistant helping to generate a comprehensive A-Z planning sequence. 
@@ -37,10 +122,10 @@ Plan Z (the final goal) content:
 
 {existing_context}
 
-Based on Plan Z, generate intermediate plans B through Y that lead logically to achieving Plan Z. 
+Based on Plan Z, generate intermediate {letters_text} that lead logically to achieving Plan Z. 
 
 Requirements:
-1. Generate plans B through Y (24 plans total)
+1. Generate {letters_text} ({count_text})
 2. Each plan should be a logical step toward Plan Z
 3. Plans should build upon each other sequentially
 4. Include realistic timeframes and descriptions
@@ -49,7 +134,7 @@ Requirements:
 Return ONLY a JSON array of plans with this exact structure:
 [
   {{
-    "plan_letter": "B",
+    "plan_letter": "{letters[0]}",
     "title": "Plan Title",
     "description": "Detailed description",
     "start_date": "2024-01-01T00:00:00",
@@ -58,63 +143,204 @@ Return ONLY a JSON array of plans with this exact structure:
   ...
 ]
 
-Generate all 24 plans (B through Y) in a single response.
+{final_text}
 """
+        return prompt
+    
+    def _generation_request(self, prompt: str, stream: bool) -> dict:
+        return {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": stream,
+            "format": "json",
+            "options": {
+                "temperature": 0.7,
+                "top_p": 0.9,
+                "max_tokens": 4000
+            }
+        }
+    
+    def _cache_key(self, plan_z_content: str, existing_plans: Optional[List[Plan]], letters: str) -> str:
+        """Key a generation on its prompt as if the plans it replaces did not exist
 
+        Those plans are overwritten with the result, so keying on them would
+        make every re-run of the same generation miss the cache.
+        """
+        context = [plan for plan in existing_plans or [] if plan.plan_letter not in letters]
+        return generation_cache_key(self._generation_request(
+            self._build_prompt(plan_z_content, context, letters), stream=False
+        ))
+    
+    def _accept_plan(self, plan_data: dict, letters: str, plans: Dict[str, PlanCreate]) -> Optional[PlanCreate]:
+        """Validate a parsed plan, keeping it only if it is a requested letter not seen yet"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/api/generate",
-                    json={
-                        "model": self.model,
-                        "prompt": prompt,
-                        "stream": False,
-                        "format": "json",
-                        "options": {
-                            "temperature": 0.7,
-                            "top_p": 0.9,
-                            "max_tokens": 4000
-                        }
-                    },
-                    timeout=120.0
-                )
-                
-                if response.status_code != 200:
-                    logger.error(f"Ollama API error: {response.status_code} - {response.text}")
-                    return self._generate_fallback_plans()
-                
-                result = response.json()
-                generated_text = result.get("response", "")
-                
-                # Parse the JSON response
-                try:
-                    plans_data = json.loads(generated_text)
-                    plans = []
-                    
-                    for plan_data in plans_data:
-                        if isinstance(plan_data, dict):
-                            plans.append(PlanCreate(**plan_data))
-                    
-                    if len(plans) == 24:  # B through Y
-                        return plans
-                    else:
-                        logger.warning(f"Generated {len(plans)} plans instead of 24, using fallback")
-                        return self._generate_fallback_plans()
-                        
-                except json.JSONDecodeError as e:
-                    logger.error(f"Failed to parse JSON response: {e}")
-                    return self._generate_fallback_plans()
-                    
+            plan = PlanCreate(**plan_data)
+        except ValidationError as e:
+            logger.warning(f"Skipping invalid generated plan: {e}")
+            return None
+        if plan.plan_letter not in letters or plan.plan_letter in plans:
+            return None
+        plans[plan.plan_letter] = plan
+        return plan
+    
+    async def _cached_plans(self, cache_key: str) -> Optional[List[PlanCreate]]:
+        cached = await generation_cache.get(cache_key)
+        if cached is None:
+            return None
+        return [PlanCreate(**plan_data) for plan_data in cached]
+    
+    async def _cache_plans(self, cache_key: str, plans: List[PlanCreate]):
+        await generation_cache.set(cache_key, [plan.model_dump(mode="json") for plan in plans])
+    
+    def _retry_context(self, existing_plans: Optional[List[Plan]], plans: Dict[str, PlanCreate]) -> list:
+        """Existing plans overlaid with the ones generated so far, for re-prompting missing letters"""
+        context = {plan.plan_letter: plan for plan in existing_plans or []}
+        context.update(plans)
+        return [context[letter] for letter in sorted(context)]
+    
+    async def _generate_round(self, prompt: str, letters: str, plans: Dict[str, PlanCreate]) -> bool:
+        """Ask the model for the given letters once; returns False if Ollama could not be reached"""
+        try:
+            client = await self._get_client()
+            async with self._generation_slots:
+                response = await client.post("/api/generate", json=self._generation_request(prompt, stream=False))
         except Exception as e:
             logger.error(f"Error calling Ollama API: {e}")
-            return self._generate_fallback_plans()
+            return False
+        
+        if response.status_code != 200:
+            logger.error(f"Ollama API error: {response.status_code} - {response.text}")
+            return False
+        
+        # Pull out every complete plan object, even from a truncated or wrapped response
+        generated_text = response.json().get("response", "")
+        for plan_data in PlanStreamParser().feed(generated_text):
+            self._accept_plan(plan_data, letters, plans)
+        return True
+    
+    async def generate_plans(
+        self,
+        plan_z_content: str,
+        existing_plans: List[Plan] = None,
+        use_cache: bool = True,
+        letters: str = PLAN_LETTERS
+    ) -> List[PlanCreate]:
+        """Generate the given plan letters (B-Y by default) based on Plan Z content using Ollama
+        
+        Valid plans from a partial response are kept and only the missing
+        letters are re-prompted; placeholders fill whatever is still missing.
+        """
+        letters = "".join(letter for letter in PLAN_LETTERS if letter in letters)
+        if not letters:
+            return []
+        
+        prompt = self._build_prompt(plan_z_content, existing_plans, letters)
+        cache_key = self._cache_key(plan_z_content, existing_plans, letters)
+        
+        if use_cache:
+            cached = await self._cached_plans(cache_key)
+            if cached is not None:
+                return cached
+        
+        plans: Dict[str, PlanCreate] = {}
+        missing = letters
+        for attempt in range(1 + OLLAMA_RETRY_ROUNDS):
+            if attempt:
+                logger.warning(f"Re-prompting for {len(missing)} missing plans: {missing}")
+                prompt = self._build_prompt(plan_z_content, self._retry_context(existing_plans, plans), missing)
+            if not await self._generate_round(prompt, missing, plans):
+                break
+            missing = "".join(letter for letter in letters if letter not in plans)
+            if not missing:
+                break
+        
+        if not missing:
+            generated = [plans[letter] for letter in letters]
+            await self._cache_plans(cache_key, generated)
+            return generated
+        
+        logger.warning(f"Generated {len(plans)} of {len(letters)} plans, using fallback for {missing}")
+        plans.update((plan.plan_letter, plan) for plan in self._generate_fallback_plans(missing))
+        return [plans[letter] for letter in letters]
+    
+    async def _stream_round(self, prompt: str, letters: str, plans: Dict[str, PlanCreate]) -> AsyncIterator[PlanCreate]:
+        """Stream one generation for the given letters, yielding each new plan as its JSON object completes"""
+        try:
+            client = await self._get_client()
+            async with self._generation_slots:
+                async with client.stream("POST", "/api/generate", json=self._generation_request(prompt, stream=True)) as response:
+                    if response.status_code != 200:
+                        await response.aread()
+                        logger.error(f"Ollama API error: {response.status_code} - {response.text}")
+                        return
+                    
+                    parser = PlanStreamParser()
+                    async for line in response.aiter_lines():
+                        if not line:
+                            continue
+                        chunk = json.loads(line)
+                        for plan_data in parser.feed(chunk.get("response", "")):
+                            plan = self._accept_plan(plan_data, letters, plans)
+                            if plan is not None:
+                                yield plan
+                        if chunk.get("done"):
+                            break
+        except Exception as e:
+            logger.error(f"Error streaming from Ollama API: {e}")
+    
+    async def stream_plans(
+        self,
+        plan_z_content: str,
+        existing_plans: List[Plan] = None,
+        use_cache: bool = True,
+        letters: str = PLAN_LETTERS
+    ) -> AsyncIterator[List[PlanCreate]]:
+        """Stream the given plan letters from Ollama, re-prompting for any the model left out
+        
+        Yields batches: each plan on its own as the model completes it, while
+        cached plans and fallback placeholders, known up front, come as one batch.
+        """
+        letters = "".join(letter for letter in PLAN_LETTERS if letter in letters)
+        if not letters:
+            return
+        
+        prompt = self._build_prompt(plan_z_content, existing_plans, letters)
+        cache_key = self._cache_key(plan_z_content, existing_plans, letters)
+        
+        if use_cache:
+            cached = await self._cached_plans(cache_key)
+            if cached is not None:
+                yield cached
+                return
+        
+        plans: Dict[str, PlanCreate] = {}
+        missing = letters
+        for attempt in range(1 + OLLAMA_RETRY_ROUNDS):
+            if attempt:
+                if not plans:
+                    # Nothing came back at all; the model is unavailable rather than sloppy
+                    break
+                logger.warning(f"Re-prompting for {len(missing)} missing plans: {missing}")
+                prompt = self._build_prompt(plan_z_content, self._retry_context(existing_plans, plans), missing)
+            async for plan in self._stream_round(prompt, missing, plans):
+                yield [plan]
+            missing = "".join(letter for letter in letters if letter not in plans)
+            if not missing:
+                break
+        
+        if not missing:
+            await self._cache_plans(cache_key, [plans[letter] for letter in letters])
+            return
+        
+        logger.warning(f"Streamed {len(plans)} of {len(letters)} plans, using fallback for {missing}")
+        yield self._generate_fallback_plans(missing)
     
-    def _generate_fallback_plans(self) -> List[PlanCreate]:
+    def _generate_fallback_plans(self, letters: str = PLAN_LETTERS) -> List[PlanCreate]:
         """Generate basic fallback plans when LLM is not available"""
         plans = []
-        letters = "BCDEFGHIJKLMNOPQRSTUVWXY"
         
-        for i, letter in enumerate(letters):
+        for letter in letters:
+            i = PLAN_LETTERS.index(letter)
             plan = PlanCreate(
                 plan_letter=letter,
                 title=f"Step {i+1}: Foundation Planning",
@@ -129,9 +355,9 @@ Generate all 24 plans (B through Y) in a single response.
     async def health_check(self) -> bool:
         """Check if Ollama service is healthy"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(f"{self.base_url}/api/version", timeout=5.0)
-                return response.status_code == 200
+            client = await self._get_client()
+            response = await client.get("/api/version", timeout=5.0)
+            return response.status_code == 200
         except:
             return False
 
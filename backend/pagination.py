@@ -0,0 +1,89 @@
+import base64
+import json
+import os
+from datetime import datetime
+from typing import Optional, Tuple
+from fastapi import HTTPException, Query, Response, status
+from sqlalchemy import Select, literal, tuple_
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+PAGE_SIZE_DEFAULT = int(os.getenv("PAGE_SIZE_DEFAULT", "50"))
+PAGE_SIZE_MAX = int(os.getenv("PAGE_SIZE_MAX", "100"))
+
+# The next page's cursor travels in this header so list bodies stay plain arrays
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    payload = json.dumps([created_at.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+class comparable_timestamp(FunctionElement):
+    """A timestamp as compared in a cursor condition
+
+    SQLite keeps server-default timestamps as "YYYY-MM-DD HH:MM:SS" text
+    while bound datetimes carry microseconds, so equal instants would
+    compare unequal as strings; there both sides go through julianday().
+    """
+    name = "comparable_timestamp"
+    inherit_cache = True
+
+@compiles(comparable_timestamp)
+def _compile_comparable_timestamp(element, compiler, **kw):
+    return compiler.process(element.clauses, **kw)
+
+@compiles(comparable_timestamp, "sqlite")
+def _compile_comparable_timestamp_sqlite(element, compiler, **kw):
+    return f"julianday({compiler.process(element.clauses, **kw)})"
+
+class PageParams:
+    """Query parameters of a keyset-paginated listing"""
+
+    def __init__(
+        self,
+        limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+        cursor: Optional[str] = Query(None, description="Value of the previous page's X-Next-Cursor header")
+    ):
+        self.limit = limit
+        self.cursor = cursor
+
+def keyset_page(query: Select, created_at_column, id_column, page: PageParams, descending: bool = False) -> Select:
+    """Order a query on (created_at, id) and restrict it to the page after the cursor
+
+    One extra row is fetched so the caller can tell whether another page
+    follows; pass the rows to finish_page.
+    """
+    key = tuple_(comparable_timestamp(created_at_column), id_column)
+    if page.cursor:
+        created_at, row_id = decode_cursor(page.cursor)
+        # Typed binds so the values compare the way the stored columns do
+        after = tuple_(
+            comparable_timestamp(literal(created_at, created_at_column.type)),
+            literal(row_id, id_column.type)
+        )
+        query = query.where(key < after if descending else key > after)
+
+    if descending:
+        query = query.order_by(created_at_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(created_at_column, id_column)
+    return query.limit(page.limit + 1)
+
+def finish_page(rows: list, page: PageParams, response: Response) -> list:
+    """Trim the lookahead row and set the next-page cursor header"""
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.created_at, last.id)
+    return rows
@@ -0,0 +1,135 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
+
+# Work factor of new hashes; hashes with any other cost are replaced at the next login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Processes hashing passwords; 0 hashes in the shared threadpool instead
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(2, os.cpu_count() or 1))))
+# Hashes waiting for a free process before new ones are rejected with 503
+PASSWORD_HASH_QUEUE_SIZE = int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", "64"))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS
+)
+
+# Run in the worker processes: they return how long the work itself took,
+# so the time spent queued can be told apart from the time spent hashing
+
+def _hash(password: str) -> Tuple[str, float]:
+    start = time.perf_counter()
+    hashed = pwd_context.hash(password)
+    return hashed, time.perf_counter() - start
+
+def _verify(password: str, hashed_password: str) -> Tuple[Tuple[bool, Optional[str]], float]:
+    start = time.perf_counter()
+    result = pwd_context.verify_and_update(password, hashed_password)
+    return result, time.perf_counter() - start
+
+class PasswordHasher:
+    """Hashes and verifies passwords in a bounded pool of worker processes
+
+    bcrypt is deliberately slow CPU work; in the shared threadpool a burst
+    of logins would hold up every other endpoint. At most workers +
+    queue_size operations are in flight, the rest are turned away.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, queue_size: int = PASSWORD_HASH_QUEUE_SIZE):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_work = 0.0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Created on first use so scripts importing auth never start processes.
+        # Spawned rather than forked: forking a process that runs an event
+        # loop and threads can deadlock the child.
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    async def _run(self, func, *args):
+        with self._lock:
+            if self.in_flight >= max(self.workers, 1) + self.queue_size:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many sign-in requests, try again shortly",
+                    headers={"Retry-After": "1"}
+                )
+            self.in_flight += 1
+
+        start = time.perf_counter()
+        try:
+            if self.workers > 0:
+                loop = asyncio.get_running_loop()
+                result, work = await loop.run_in_executor(self._get_executor(), func, *args)
+            else:
+                result, work = await run_in_threadpool(func, *args)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+        wait = max(time.perf_counter() - start - work, 0.0)
+        with self._lock:
+            self.completed += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self.total_work += work
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Check a password; also returns a new hash when the stored one uses another cost"""
+        verified, new_hash = await self._run(_verify, password, hashed_password)
+        if new_hash is not None:
+            with self._lock:
+                self.rehashed += 1
+        return verified, new_hash
+
+    def stats(self) -> dict:
+        with self._lock:
+            completed = self.completed
+            return {
+                "bcrypt_rounds": BCRYPT_ROUNDS,
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "in_flight": self.in_flight,
+                "queued": max(self.in_flight - max(self.workers, 1), 0),
+                "completed": completed,
+                "rejected": self.rejected,
+                "rehashed": self.rehashed,
+                "avg_wait_seconds": self.total_wait / completed if completed else 0.0,
+                "max_wait_seconds": self.max_wait,
+                "avg_hash_seconds": self.total_work / completed if completed else 0.0,
+            }
+
+password_hasher = PasswordHasher()
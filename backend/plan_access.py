@@ -0,0 +1,68 @@
+from dataclasses import dataclass
+from fastapi import Depends, HTTPException, Request
+from starlette.requests import HTTPConnection
+from sqlalchemy import exists, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
+from models import Plan as PlanModel, Project as ProjectModel, SharedLink as SharedLinkModel, User
+from auth import get_current_active_user
+
+@dataclass(frozen=True)
+class PlanAccess:
+    """What a user may do with a plan: owners have full access, anyone may comment on shared plans"""
+    plan_id: int
+    project_id: int
+    is_owner: bool
+    is_shared: bool
+
+    @property
+    def can_comment(self) -> bool:
+        return self.is_owner or self.is_shared
+
+async def get_plan_access(request: HTTPConnection, db: AsyncSession, current_user: User, plan_id: int) -> PlanAccess:
+    """Resolve a user's access to a plan in one query, or raise 404 if it does not exist
+
+    The result is kept on the request, so later checks of the same plan are free.
+    """
+    cache = getattr(request.state, "plan_access", None)
+    if cache is None:
+        cache = request.state.plan_access = {}
+    key = (current_user.id, plan_id)
+    if key in cache:
+        return cache[key]
+
+    row = (await db.execute(
+        select(
+            ProjectModel.id,
+            ProjectModel.owner_id,
+            exists().where(
+                SharedLinkModel.plan_id == PlanModel.id,
+                SharedLinkModel.is_active == True
+            ).label("is_shared")
+        ).select_from(PlanModel).join(ProjectModel).where(PlanModel.id == plan_id)
+    )).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Plan not found")
+
+    access = cache[key] = PlanAccess(
+        plan_id=plan_id,
+        project_id=row.id,
+        is_owner=row.owner_id == current_user.id,
+        is_shared=bool(row.is_shared)
+    )
+    return access
+
+async def require_comment_access(request: HTTPConnection, db: AsyncSession, current_user: User, plan_id: int) -> PlanAccess:
+    access = await get_plan_access(request, db, current_user, plan_id)
+    if not access.can_comment:
+        raise HTTPException(status_code=403, detail="Access denied")
+    return access
+
+async def plan_comment_access(
+    plan_id: int,
+    request: Request,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+) -> PlanAccess:
+    """Dependency for /plans/{plan_id}/... routes open to the owner and, once shared, to other users"""
+    return await require_comment_access(request, db, current_user, plan_id)
@@ -0,0 +1,294 @@
+from functools import partial
+from itertools import chain
+from typing import Dict, Iterable, List, Set
+from sqlalchemy import bindparam, event, func, inspect, select, delete, insert, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from models import (
+    Project as ProjectModel, Plan as PlanModel, Task as TaskModel,
+    PlanStats as PlanStatsModel, ProjectStats as ProjectStatsModel
+)
+from schemas import PlanWithStats
+
+async def get_task_aggregates(db: AsyncSession, plan_ids: List[int]) -> Dict[int, dict]:
+    """Sum cost/revenue and count tasks per plan in a single grouped query"""
+    if not plan_ids:
+        return {}
+
+    rows = (await db.execute(
+        select(
+            TaskModel.plan_id,
+            func.coalesce(func.sum(TaskModel.cost), 0.0),
+            func.coalesce(func.sum(TaskModel.revenue), 0.0),
+            func.count(TaskModel.id),
+            func.count(TaskModel.id).filter(TaskModel.is_completed == True),
+        )
+        .where(TaskModel.plan_id.in_(plan_ids))
+        .group_by(TaskModel.plan_id)
+    )).all()
+
+    return {
+        plan_id: {
+            "total_cost": total_cost,
+            "total_revenue": total_revenue,
+            "task_count": task_count,
+            "completed_task_count": completed_task_count,
+        }
+        for plan_id, total_cost, total_revenue, task_count, completed_task_count in rows
+    }
+
+async def build_plans_with_stats(db: AsyncSession, plans: List[PlanModel], include_tasks: bool = False) -> List[PlanWithStats]:
+    """Attach task aggregates to plans; tasks are copied over only with include_tasks, which needs them loaded"""
+    aggregates = await get_task_aggregates(db, [plan.id for plan in plans])
+    empty = {"total_cost": 0.0, "total_revenue": 0.0, "task_count": 0, "completed_task_count": 0}
+
+    plans_with_stats = []
+    for plan in plans:
+        plan_with_stats = PlanWithStats(
+            id=plan.id,
+            project_id=plan.project_id,
+            plan_letter=plan.plan_letter,
+            title=plan.title,
+            description=plan.description,
+            start_date=plan.start_date,
+            end_date=plan.end_date,
+            created_at=plan.created_at,
+            updated_at=plan.updated_at,
+            tasks=plan.tasks if include_tasks else [],
+            **aggregates.get(plan.id, empty)
+        )
+        plans_with_stats.append(plan_with_stats)
+
+    return plans_with_stats
+
+# Statistics rollup
+#
+# plan_stats and project_stats hold precomputed per-plan and per-project
+# totals so statistics endpoints never scan tasks. They are kept current
+# inside the same transaction as the change (see the after_flush listener
+# below): task changes add their difference to the totals, while added,
+# removed or re-dated plans have their rows recomputed. rebuild_statistics.py
+# repairs any drift.
+
+# Task and plan columns the rollup is derived from; other edits leave it alone
+TASK_STATS_COLUMNS = ("plan_id", "cost", "revenue", "is_completed")
+PLAN_STATS_COLUMNS = ("project_id", "plan_letter", "start_date", "end_date")
+
+def refresh_plan_stats(conn: Connection, plan_ids: Iterable[int]) -> Set[int]:
+    """Recompute plan_stats rows for the given plans, returning the affected project ids"""
+    plan_ids = set(plan_ids)
+    if not plan_ids:
+        return set()
+
+    # Projects the plans belonged to before this change (covers deleted and moved plans)
+    project_ids = set(conn.execute(
+        select(PlanStatsModel.project_id).where(PlanStatsModel.plan_id.in_(plan_ids))
+    ).scalars())
+
+    rows = conn.execute(
+        select(
+            PlanModel.id,
+            PlanModel.project_id,
+            PlanModel.plan_letter,
+            PlanModel.start_date,
+            PlanModel.end_date,
+            func.coalesce(func.sum(TaskModel.cost), 0.0),
+            func.coalesce(func.sum(TaskModel.revenue), 0.0),
+            func.count(TaskModel.id),
+            func.count(TaskModel.id).filter(TaskModel.is_completed == True),
+        )
+        .select_from(PlanModel)
+        .outerjoin(TaskModel, TaskModel.plan_id == PlanModel.id)
+        .where(PlanModel.id.in_(plan_ids))
+        .group_by(PlanModel.id)
+    ).all()
+
+    values = []
+    for plan_id, project_id, plan_letter, start_date, end_date, total_cost, total_revenue, task_count, completed_task_count in rows:
+        duration_days = None
+        if start_date and end_date:
+            duration_days = (end_date - start_date).days
+        values.append({
+            "plan_id": plan_id,
+            "project_id": project_id,
+            "plan_letter": plan_letter,
+            "total_cost": total_cost,
+            "total_revenue": total_revenue,
+            "task_count": task_count,
+            "completed_task_count": completed_task_count,
+            "duration_days": duration_days,
+        })
+        project_ids.add(project_id)
+
+    conn.execute(delete(PlanStatsModel).where(PlanStatsModel.plan_id.in_(plan_ids)))
+    if values:
+        conn.execute(insert(PlanStatsModel), values)
+
+    return project_ids
+
+def refresh_project_stats(conn: Connection, project_ids: Iterable[int]):
+    """Recompute project_stats rows for the given projects from plan_stats"""
+    project_ids = set(project_ids)
+    if not project_ids:
+        return
+
+    rows = conn.execute(
+        select(
+            ProjectModel.id,
+            func.count(PlanStatsModel.plan_id),
+            func.coalesce(func.sum(PlanStatsModel.total_cost), 0.0),
+            func.coalesce(func.sum(PlanStatsModel.total_revenue), 0.0),
+            func.coalesce(func.sum(PlanStatsModel.task_count), 0),
+            func.coalesce(func.sum(PlanStatsModel.completed_task_count), 0),
+        )
+        .select_from(ProjectModel)
+        .outerjoin(PlanStatsModel, PlanStatsModel.project_id == ProjectModel.id)
+        .where(ProjectModel.id.in_(project_ids))
+        .group_by(ProjectModel.id)
+    ).all()
+
+    conn.execute(delete(ProjectStatsModel).where(ProjectStatsModel.project_id.in_(project_ids)))
+    if rows:
+        conn.execute(insert(ProjectStatsModel), [
+            {
+                "project_id": project_id,
+                "plan_count": plan_count,
+                "total_cost": total_cost,
+                "total_revenue": total_revenue,
+                "task_count": task_count,
+                "completed_task_count": completed_task_count,
+            }
+            for project_id, plan_count, total_cost, total_revenue, task_count, completed_task_count in rows
+        ])
+
+def refresh_stats(conn: Connection, plan_ids: Iterable[int] = (), project_ids: Iterable[int] = ()):
+    """Recompute the rollup for changed plans and their projects"""
+    affected_projects = refresh_plan_stats(conn, plan_ids)
+    refresh_project_stats(conn, affected_projects | set(project_ids))
+
+async def refresh_session_stats(db: AsyncSession, plan_ids: Iterable[int] = (), project_ids: Iterable[int] = ()):
+    """refresh_stats on an AsyncSession's connection, for bulk statements that skip flush events"""
+    plan_ids, project_ids = set(plan_ids), set(project_ids)
+    if plan_ids or project_ids:
+        await db.run_sync(lambda session: refresh_stats(session.connection(), plan_ids, project_ids))
+
+def apply_task_deltas(conn: Connection, deltas: Dict[int, List[float]]):
+    """Add per-plan [cost, revenue, task count, completed count] changes to plan and project totals"""
+    rows = [
+        {
+            "delta_plan_id": plan_id,
+            "delta_cost": cost,
+            "delta_revenue": revenue,
+            "delta_tasks": task_count,
+            "delta_completed": completed_task_count,
+        }
+        for plan_id, (cost, revenue, task_count, completed_task_count) in deltas.items()
+        if cost or revenue or task_count or completed_task_count
+    ]
+    if not rows:
+        return
+
+    conn.execute(
+        update(PlanStatsModel)
+        .where(PlanStatsModel.plan_id == bindparam("delta_plan_id"))
+        .values(
+            total_cost=PlanStatsModel.total_cost + bindparam("delta_cost"),
+            total_revenue=PlanStatsModel.total_revenue + bindparam("delta_revenue"),
+            task_count=PlanStatsModel.task_count + bindparam("delta_tasks"),
+            completed_task_count=PlanStatsModel.completed_task_count + bindparam("delta_completed"),
+        ),
+        rows
+    )
+    plan_project = select(PlanStatsModel.project_id).where(
+        PlanStatsModel.plan_id == bindparam("delta_plan_id")
+    ).scalar_subquery()
+    conn.execute(
+        update(ProjectStatsModel)
+        .where(ProjectStatsModel.project_id == plan_project)
+        .values(
+            total_cost=ProjectStatsModel.total_cost + bindparam("delta_cost"),
+            total_revenue=ProjectStatsModel.total_revenue + bindparam("delta_revenue"),
+            task_count=ProjectStatsModel.task_count + bindparam("delta_tasks"),
+            completed_task_count=ProjectStatsModel.completed_task_count + bindparam("delta_completed"),
+        ),
+        rows
+    )
+
+def rebuild_all_stats(conn: Connection, batch_size: int = 500):
+    """Rebuild the whole rollup from plans and tasks"""
+    conn.execute(delete(PlanStatsModel))
+    conn.execute(delete(ProjectStatsModel))
+
+    plan_ids = conn.execute(select(PlanModel.id).order_by(PlanModel.id)).scalars().all()
+    for i in range(0, len(plan_ids), batch_size):
+        refresh_plan_stats(conn, plan_ids[i:i + batch_size])
+
+    project_ids = conn.execute(select(ProjectModel.id).order_by(ProjectModel.id)).scalars().all()
+    for i in range(0, len(project_ids), batch_size):
+        refresh_project_stats(conn, project_ids[i:i + batch_size])
+
+def _changed(state, columns) -> bool:
+    return any(state.attrs[column].history.has_changes() for column in columns)
+
+def _committed_value(state, column):
+    """An attribute's value as of the last flush"""
+    history = state.attrs[column].history
+    return history.deleted[0] if history.deleted else state.attrs[column].value
+
+@event.listens_for(Session, "after_flush")
+def _refresh_stats_after_flush(session, flush_context):
+    """Keep the rollup in step with ORM changes to plans, tasks and projects"""
+    # Plans whose rows are recomputed, which takes in their task changes too
+    plan_ids = set()
+    project_ids = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, PlanModel):
+            if obj in session.new or obj in session.deleted or _changed(inspect(obj), PLAN_STATS_COLUMNS):
+                plan_ids.add(obj.id)
+        elif isinstance(obj, ProjectModel) and obj in session.new:
+            project_ids.add(obj.id)
+
+    deltas: Dict[int, List[float]] = {}
+
+    def add(plan_id, value, sign):
+        if plan_id is None or plan_id in plan_ids:
+            return
+        totals = deltas.setdefault(plan_id, [0.0, 0.0, 0, 0])
+        contribution = (value("cost") or 0.0, value("revenue") or 0.0, 1, 1 if value("is_completed") else 0)
+        for i, amount in enumerate(contribution):
+            totals[i] += sign * amount
+
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if not isinstance(obj, TaskModel):
+            continue
+        state = inspect(obj)
+        current = partial(getattr, obj)
+        committed = partial(_committed_value, state)
+        if obj in session.new:
+            add(obj.plan_id, current, 1)
+        elif obj in session.deleted:
+            add(committed("plan_id"), committed, -1)
+        elif _changed(state, TASK_STATS_COLUMNS):
+            add(committed("plan_id"), committed, -1)
+            add(obj.plan_id, current, 1)
+
+    if deltas:
+        apply_task_deltas(session.connection(), deltas)
+    if plan_ids or project_ids:
+        refresh_stats(session.connection(), plan_ids, project_ids)
+
+def summarize_plan_stats(rows: List[PlanStatsModel]) -> dict:
+    """Derive the PlanStatistics fields from plan_stats rows"""
+    plan_costs = [(row.plan_letter, row.total_cost) for row in rows if row.total_cost > 0]
+    plan_durations = [(row.plan_letter, row.duration_days) for row in rows if row.duration_days is not None]
+
+    return {
+        "highest_cost_plan": max(plan_costs, key=lambda x: x[1])[0] if plan_costs else None,
+        "lowest_cost_plan": min(plan_costs, key=lambda x: x[1])[0] if plan_costs else None,
+        "longest_duration_plan": max(plan_durations, key=lambda x: x[1])[0] if plan_durations else None,
+        "shortest_duration_plan": min(plan_durations, key=lambda x: x[1])[0] if plan_durations else None,
+        "total_plans": len(rows),
+        "completed_tasks": sum(row.completed_task_count for row in rows),
+        "total_tasks": sum(row.task_count for row in rows),
+    }
@@ -0,0 +1,135 @@
+import logging
+import os
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional, Tuple
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from database import async_engine, engine
+
+logger = logging.getLogger(__name__)
+
+# Debug/test mode: log requests over budget and likely N+1 queries
+SQL_QUERY_DEBUG = os.getenv("SQL_QUERY_DEBUG", "false").lower() in ("1", "true", "yes")
+SQL_QUERY_BUDGET = int(os.getenv("SQL_QUERY_BUDGET", "20"))
+# The same statement this many times in one request is reported as a likely N+1
+SQL_REPEAT_THRESHOLD = int(os.getenv("SQL_REPEAT_THRESHOLD", "5"))
+
+QUERY_COUNT_HEADER = "X-Query-Count"
+
+# Expanded IN lists and multi-row VALUES differ only in their number of placeholders
+PLACEHOLDER = r"(?:\?|\$\d+(?:::[\w ]+)?|%\(\w+\)s)"
+PLACEHOLDER_LIST = re.compile(rf"\(\s*{PLACEHOLDER}(?:\s*,\s*{PLACEHOLDER})*\s*\)")
+
+def statement_shape(statement: str) -> str:
+    return PLACEHOLDER_LIST.sub("(?)", " ".join(statement.split()))
+
+class QueryLog:
+    """Statements executed during one request or test block"""
+
+    def __init__(self):
+        self.statements: List[str] = []
+        self._lock = threading.Lock()
+
+    def record(self, statement: str):
+        with self._lock:
+            self.statements.append(statement)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def repeated(self, threshold: int = SQL_REPEAT_THRESHOLD) -> List[Tuple[str, int]]:
+        """Statement shapes run at least threshold times, most frequent first"""
+        shapes = Counter(statement_shape(statement) for statement in self.statements)
+        return [(shape, count) for shape, count in shapes.most_common() if count >= threshold]
+
+    def report(self) -> str:
+        return "\n".join(f"{number}. {statement_shape(statement)}" for number, statement in enumerate(self.statements, 1))
+
+# The request being handled, set by QueryBudgetMiddleware
+current_query_log: ContextVar[Optional[QueryLog]] = ContextVar("current_query_log", default=None)
+# Open query_budget() blocks; they see statements from every thread and event loop
+_active_logs: List[QueryLog] = []
+_active_logs_lock = threading.Lock()
+
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    log = current_query_log.get()
+    if log is not None:
+        log.record(statement)
+    with _active_logs_lock:
+        active_logs = list(_active_logs)
+    for log in active_logs:
+        log.record(statement)
+
+for _engine in (async_engine.sync_engine, engine):
+    event.listen(_engine, "before_cursor_execute", _record_statement)
+
+def check_query_log(log: QueryLog, budget: int, repeat_threshold: int) -> List[str]:
+    """Problems with a request's statements; empty when within budget"""
+    problems = []
+    if log.count > budget:
+        problems.append(f"{log.count} SQL statements, budget is {budget}")
+    for shape, count in log.repeated(repeat_threshold):
+        problems.append(f"possible N+1, {count}x: {shape}")
+    return problems
+
+class QueryBudgetMiddleware:
+    """Count the statements of each request and log ones over budget or with N+1 patterns
+
+    Meant for development and test runs (SQL_QUERY_DEBUG). The count so
+    far is also sent in an X-Query-Count response header.
+    """
+
+    def __init__(self, app: ASGIApp, budget: int = SQL_QUERY_BUDGET, repeat_threshold: int = SQL_REPEAT_THRESHOLD):
+        self.app = app
+        self.budget = budget
+        self.repeat_threshold = repeat_threshold
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        log = QueryLog()
+        token = current_query_log.set(log)
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append(QUERY_COUNT_HEADER, str(log.count))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_query_log.reset(token)
+            route = scope.get("route")
+            route_path = route.path if route is not None else scope["path"]
+            for problem in check_query_log(log, self.budget, self.repeat_threshold):
+                logger.warning(f"{scope['method']} {route_path}: {problem}")
+
+@contextmanager
+def query_budget(max_statements: int, repeat_threshold: int = SQL_REPEAT_THRESHOLD) -> Iterator[QueryLog]:
+    """Fail with AssertionError if the block runs more statements than allowed or a likely N+1
+
+    For tests, around one request made with a TestClient:
+
+        with query_budget(3):
+            client.get("/plans", headers=headers)
+    """
+    log = QueryLog()
+    with _active_logs_lock:
+        _active_logs.append(log)
+    try:
+        yield log
+    finally:
+        with _active_logs_lock:
+            _active_logs.remove(log)
+
+    problems = check_query_log(log, max_statements, repeat_threshold)
+    if problems:
+        raise AssertionError("; ".join(problems) + "\n" + log.report())
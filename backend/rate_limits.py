@@ -0,0 +1,308 @@
+import itertools
+import math
+import os
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Dict, Optional, Tuple
+from fastapi import Depends, HTTPException, Request, status
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import async_engine, get_async_db
+from models import GenerationJob, RateLimitBucket, RateLimitLease, User
+from auth import get_current_active_user
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+# Rates are "<requests>/<second|minute|hour|day>"; an empty value disables the limit
+RATE_LIMITS = {
+    "login": os.getenv("RATE_LIMIT_LOGIN", "10/minute"),
+    "register": os.getenv("RATE_LIMIT_REGISTER", "5/hour"),
+    "generation": os.getenv("RATE_LIMIT_GENERATION", "20/hour"),
+}
+GENERATION_MAX_CONCURRENT_PER_USER = int(os.getenv("GENERATION_MAX_CONCURRENT_PER_USER", "1"))
+# Generation job statuses that take one of the user's generation slots
+ACTIVE_JOB_STATUSES = ("queued", "running")
+
+# Suggested wait for a client turned away by a concurrency limit
+CONCURRENCY_RETRY_AFTER_SECONDS = 10
+# A held slot outlives any generation; it only matters if a process dies holding one
+LEASE_SECONDS = 900
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+@dataclass(frozen=True)
+class RatePolicy:
+    """Token bucket allowing capacity requests per period_seconds, refilled continuously"""
+    name: str
+    capacity: int
+    period_seconds: float
+
+    @property
+    def refill_rate(self) -> float:
+        return self.capacity / self.period_seconds
+
+    @classmethod
+    def parse(cls, name: str, rate: str) -> Optional["RatePolicy"]:
+        if not rate.strip():
+            return None
+        try:
+            count, period = rate.split("/")
+            return cls(name, int(count), PERIODS[period.strip()])
+        except (KeyError, ValueError):
+            raise ValueError(f"Invalid rate limit {rate!r} for {name}, expected e.g. 10/minute")
+
+class RateLimitBackend:
+    """Where bucket and concurrency state lives
+
+    take() spends one token and returns 0, or the seconds until one is
+    available. acquire() returns a lease id while fewer than limit leases
+    are held for the key, otherwise None.
+    """
+
+    async def take(self, key: str, policy: RatePolicy) -> float:
+        raise NotImplementedError
+
+    async def acquire(self, key: str, limit: int) -> Optional[int]:
+        raise NotImplementedError
+
+    async def release(self, key: str, lease_id: int):
+        raise NotImplementedError
+
+class MemoryBackend(RateLimitBackend):
+    """Per-process state: with several API processes each enforces its own limits"""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        # key -> (tokens, updated_at, full_at)
+        self._buckets: Dict[str, Tuple[float, float, float]] = {}
+        # key -> {lease id: expires_at}
+        self._leases: Dict[str, Dict[int, float]] = {}
+        self._lease_ids = itertools.count(1)
+
+    async def take(self, key: str, policy: RatePolicy) -> float:
+        now = time.monotonic()
+        tokens, updated_at, _ = self._buckets.get(key, (policy.capacity, now, now))
+        tokens = min(policy.capacity, tokens + (now - updated_at) * policy.refill_rate)
+        retry_after = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / policy.refill_rate
+        self._buckets[key] = (tokens, now, now + (policy.capacity - tokens) / policy.refill_rate)
+        if len(self._buckets) > self.max_keys:
+            self._prune(now)
+        return retry_after
+
+    def _prune(self, now: float):
+        # A full bucket is the same as no bucket
+        for key in [key for key, (_, _, full_at) in self._buckets.items() if full_at <= now]:
+            del self._buckets[key]
+
+    async def acquire(self, key: str, limit: int) -> Optional[int]:
+        now = time.monotonic()
+        leases = {lease_id: expires_at for lease_id, expires_at in self._leases.get(key, {}).items() if expires_at > now}
+        if len(leases) >= limit:
+            self._leases[key] = leases
+            return None
+        lease_id = next(self._lease_ids)
+        leases[lease_id] = now + LEASE_SECONDS
+        self._leases[key] = leases
+        return lease_id
+
+    async def release(self, key: str, lease_id: int):
+        leases = self._leases.get(key)
+        if leases is not None:
+            leases.pop(lease_id, None)
+            if not leases:
+                del self._leases[key]
+
+class PostgresBackend(RateLimitBackend):
+    """State in the rate_limit_* tables, shared by every API process
+
+    Each call runs in its own short transaction, never the request's.
+    """
+
+    def __init__(self, prune_every: int = 1000):
+        self.prune_every = prune_every
+        self._takes = 0
+
+    async def take(self, key: str, policy: RatePolicy) -> float:
+        elapsed = func.extract("epoch", func.now() - RateLimitBucket.updated_at)
+        refilled = func.least(policy.capacity, RateLimitBucket.tokens + elapsed * policy.refill_rate)
+        stmt = postgresql.insert(RateLimitBucket).values(key=key, tokens=policy.capacity - 1, updated_at=func.now())
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[RateLimitBucket.key],
+            set_={"tokens": refilled - 1, "updated_at": func.now()},
+            where=refilled >= 1
+        ).returning(RateLimitBucket.tokens)
+
+        async with async_engine.begin() as conn:
+            spent = (await conn.execute(stmt)).first()
+            tokens = None if spent else await conn.scalar(select(refilled).where(RateLimitBucket.key == key))
+            self._takes += 1
+            if self._takes % self.prune_every == 0:
+                await self._prune(conn)
+
+        if spent or tokens is None:
+            return 0.0
+        return (1 - tokens) / policy.refill_rate
+
+    async def _prune(self, conn):
+        # Buckets untouched for longer than the longest period are full again
+        idle = timedelta(seconds=max(PERIODS.values()))
+        await conn.execute(delete(RateLimitBucket).where(RateLimitBucket.updated_at < func.now() - idle))
+        await conn.execute(delete(RateLimitLease).where(RateLimitLease.expires_at < func.now()))
+
+    async def acquire(self, key: str, limit: int) -> Optional[int]:
+        async with async_engine.begin() as conn:
+            # Serialize acquirers of the same key until this transaction ends
+            await conn.execute(select(func.pg_advisory_xact_lock(func.hashtext(key))))
+            held = await conn.scalar(select(func.count()).select_from(RateLimitLease).where(
+                RateLimitLease.key == key,
+                RateLimitLease.expires_at > func.now()
+            ))
+            if held >= limit:
+                return None
+            return await conn.scalar(insert(RateLimitLease).values(
+                key=key, expires_at=func.now() + timedelta(seconds=LEASE_SECONDS)
+            ).returning(RateLimitLease.id))
+
+    async def release(self, key: str, lease_id: int):
+        async with async_engine.begin() as conn:
+            await conn.execute(delete(RateLimitLease).where(RateLimitLease.id == lease_id))
+
+def create_backend(name: str = RATE_LIMIT_BACKEND) -> RateLimitBackend:
+    if name == "memory":
+        return MemoryBackend()
+    if name == "postgres":
+        return PostgresBackend()
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND {name!r}, expected memory or postgres")
+
+def too_many_requests(detail: str, retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+class RateLimiter:
+    """Applies the configured policies and keeps allowed/limited counters"""
+
+    def __init__(self, backend: RateLimitBackend, rates: Dict[str, str] = RATE_LIMITS, enabled: bool = RATE_LIMIT_ENABLED):
+        self.backend = backend
+        self.enabled = enabled
+        self.policies = {name: RatePolicy.parse(name, rate) for name, rate in rates.items()}
+        self.allowed: Dict[str, int] = {name: 0 for name in rates}
+        self.limited: Dict[str, int] = {name: 0 for name in rates}
+        self.concurrency_limited = 0
+
+    async def check(self, policy_name: str, key: str):
+        """Spend one request of key's bucket or raise 429"""
+        policy = self.policies[policy_name]
+        if not self.enabled or policy is None:
+            return
+        retry_after = await self.backend.take(f"{policy_name}:{key}", policy)
+        if retry_after > 0:
+            self.limited[policy_name] += 1
+            raise too_many_requests("Rate limit exceeded, try again later", retry_after)
+        self.allowed[policy_name] += 1
+
+    async def acquire(self, key: str, limit: int, taken: int = 0) -> Optional[int]:
+        """Take one of limit concurrent slots of key, taken of which are held elsewhere, or raise 429
+
+        Returns None when limits are off.
+        """
+        if not self.enabled or limit <= 0:
+            return None
+        lease_id = await self.backend.acquire(key, limit - taken) if taken < limit else None
+        if lease_id is None:
+            raise self.concurrency_exceeded(limit)
+        return lease_id
+
+    def concurrency_exceeded(self, limit: int) -> HTTPException:
+        self.concurrency_limited += 1
+        return too_many_requests(
+            f"Too many generations in progress (limit {limit}), wait for one to finish",
+            CONCURRENCY_RETRY_AFTER_SECONDS
+        )
+
+    async def release(self, key: str, lease_id: Optional[int]):
+        if lease_id is not None:
+            await self.backend.release(key, lease_id)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "backend": type(self.backend).__name__,
+            "policies": {
+                name: None if policy is None else {
+                    "capacity": policy.capacity,
+                    "period_seconds": policy.period_seconds,
+                    "allowed": self.allowed[name],
+                    "limited": self.limited[name],
+                }
+                for name, policy in self.policies.items()
+            },
+            "generation_max_concurrent_per_user": GENERATION_MAX_CONCURRENT_PER_USER,
+            "concurrency_limited": self.concurrency_limited,
+        }
+
+rate_limiter = RateLimiter(create_backend())
+
+def client_ip(request: Request) -> str:
+    # Behind a reverse proxy, run uvicorn with --proxy-headers so this is the real client
+    return request.client.host if request.client else "unknown"
+
+def limit_by_ip(policy_name: str):
+    """Dependency limiting an anonymous route per client address"""
+    async def dependency(request: Request):
+        await rate_limiter.check(policy_name, f"ip:{client_ip(request)}")
+    return dependency
+
+def limit_by_user(policy_name: str):
+    """Dependency limiting a route per user; all of a user's API tokens share the limit"""
+    async def dependency(current_user: User = Depends(get_current_active_user)):
+        await rate_limiter.check(policy_name, f"user:{current_user.id}")
+    return dependency
+
+def generation_slot_key(user_id: int) -> str:
+    return f"generation:user:{user_id}"
+
+async def active_generation_jobs(db: AsyncSession, user_id: int) -> int:
+    if not rate_limiter.enabled or GENERATION_MAX_CONCURRENT_PER_USER <= 0:
+        return 0
+    return await db.scalar(select(func.count()).select_from(GenerationJob).where(
+        GenerationJob.user_id == user_id,
+        GenerationJob.status.in_(ACTIVE_JOB_STATUSES)
+    ))
+
+async def generation_slot(
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Hold one of the user's GENERATION_MAX_CONCURRENT_PER_USER generation slots
+
+    The user's queued and running jobs take slots too. The slot is released
+    when the dependency exits, which is after the response, so a streamed
+    generation keeps it until the stream ends.
+    """
+    key = generation_slot_key(current_user.id)
+    taken = await active_generation_jobs(db, current_user.id)
+    lease_id = await rate_limiter.acquire(key, GENERATION_MAX_CONCURRENT_PER_USER, taken=taken)
+    try:
+        yield
+    finally:
+        await rate_limiter.release(key, lease_id)
+
+async def check_generation_slot(db: AsyncSession, user_id: int):
+    """Raise 429 unless the user has a generation slot free for one more queued job
+
+    Jobs hold no lease, so a free slot is one that is neither held by a
+    synchronous generation nor taken by the user's queued and running jobs.
+    """
+    key = generation_slot_key(user_id)
+    taken = await active_generation_jobs(db, user_id)
+    lease_id = await rate_limiter.acquire(key, GENERATION_MAX_CONCURRENT_PER_USER, taken=taken)
+    await rate_limiter.release(key, lease_id)
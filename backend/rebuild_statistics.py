@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Script to rebuild the plan_stats/project_stats rollup from plans and tasks.
+Use it to backfill existing data or to repair drift.
+Run `alembic upgrade head` first to create the tables.
+Usage: python rebuild_statistics.py
+"""
+
+from sqlalchemy import func, select
+from database import engine
+from models import PlanStats, ProjectStats
+from plan_stats import rebuild_all_stats
+
+def rebuild_statistics():
+    try:
+        with engine.begin() as conn:
+            rebuild_all_stats(conn)
+            plan_count = conn.execute(select(func.count()).select_from(PlanStats)).scalar()
+            project_count = conn.execute(select(func.count()).select_from(ProjectStats)).scalar()
+
+        print("✅ Statistics rollup rebuilt:")
+        print(f"  Plans: {plan_count}")
+        print(f"  Projects: {project_count}")
+    except Exception as e:
+        print(f"❌ Error rebuilding statistics: {e}")
+        raise
+
+if __name__ == "__main__":
+    rebuild_statistics()
@@ -0,0 +1,63 @@
+from fastapi import APIRouter, Depends
+from starlette.concurrency import run_in_threadpool
+from database import async_engine, engine, pool_status
+from models import User
+from auth import get_current_admin_user
+from generation_cache import generation_cache
+from generation_jobs import generation_jobs
+from identity_cache import identity_cache
+from events import event_broker
+from password_hashing import password_hasher
+from rate_limits import rate_limiter
+from shared_plan_cache import shared_plan_cache
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+@router.get("/identity-cache")
+async def get_identity_cache_stats(current_user: User = Depends(get_current_admin_user)):
+    """Get hit/miss counters for the authenticated identity cache"""
+    return identity_cache.stats()
+
+@router.get("/pool")
+async def get_pool_stats(current_user: User = Depends(get_current_admin_user)):
+    """Get live connection pool statistics for the API and script engines"""
+    return {
+        "api": pool_status(async_engine.pool),
+        "sync": pool_status(engine.pool),
+    }
+
+@router.get("/generation-jobs")
+async def get_generation_job_stats(current_user: User = Depends(get_current_admin_user)):
+    """Get worker and queue counts for background plan generation"""
+    return generation_jobs.stats()
+
+@router.get("/generation-cache")
+async def get_generation_cache_stats(current_user: User = Depends(get_current_admin_user)):
+    """Get hit/miss counters for the LLM generation cache"""
+    return generation_cache.stats()
+
+@router.delete("/generation-cache")
+async def clear_generation_cache(current_user: User = Depends(get_current_admin_user)):
+    """Drop every cached generation, in memory and on disk"""
+    await run_in_threadpool(generation_cache.clear)
+    return {"message": "Generation cache cleared"}
+
+@router.get("/shared-plan-cache")
+async def get_shared_plan_cache_stats(current_user: User = Depends(get_current_admin_user)):
+    """Get hit/miss counters for the public shared-plan snapshot cache"""
+    return shared_plan_cache.stats()
+
+@router.get("/events")
+async def get_event_stats(current_user: User = Depends(get_current_admin_user)):
+    """Get the event broker in use and live subscription counts"""
+    return event_broker.stats()
+
+@router.get("/password-hashing")
+async def get_password_hashing_stats(current_user: User = Depends(get_current_admin_user)):
+    """Get queue, wait and hash time counters for the password hashing processes"""
+    return password_hasher.stats()
+
+@router.get("/rate-limits")
+async def get_rate_limit_stats(current_user: User = Depends(get_current_admin_user)):
+    """Get the configured rate limits with allowed/limited counters of this process"""
+    return rate_limiter.stats()
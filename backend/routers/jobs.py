@@ -0,0 +1,64 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from database import get_async_db
+from models import GenerationJob as GenerationJobModel, User
+from schemas import GenerationJob
+from auth import get_current_active_user
+from generation_jobs import generation_jobs, get_generation_plan_z
+from rate_limits import limit_by_user
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+async def get_user_job(job_id: int, current_user: User, db: AsyncSession) -> GenerationJobModel:
+    job = await db.scalar(select(GenerationJobModel).where(
+        GenerationJobModel.id == job_id,
+        GenerationJobModel.user_id == current_user.id
+    ))
+
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+
+    return job
+
+@router.post(
+    "/generate-from-z",
+    response_model=GenerationJob,
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(limit_by_user("generation"))]
+)
+async def submit_generation_job(
+    project_id: Optional[int] = None,
+    use_cache: bool = True,
+    gaps_only: bool = False,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Queue generation of plans B-Y from Plan Z and return the job immediately"""
+    plan_z = await get_generation_plan_z(db, current_user, project_id)
+    return await generation_jobs.submit(
+        db, current_user, plan_z.project_id, use_cache=use_cache, gaps_only=gaps_only
+    )
+
+@router.get("/{job_id}", response_model=GenerationJob)
+async def get_generation_job(
+    job_id: int,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get the status, progress and generated plan ids of a job"""
+    return await get_user_job(job_id, current_user, db)
+
+@router.post("/{job_id}/cancel", response_model=GenerationJob)
+async def cancel_generation_job(
+    job_id: int,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Cancel a queued or running job; plans saved before cancellation are kept"""
+    job = await get_user_job(job_id, current_user, db)
+    return await generation_jobs.cancel(db, job)
@@ -1,67 +1,75 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 from typing import List
-from database import get_db
-from models import Project as ProjectModel, Plan as PlanModel, User
+from database import get_async_db
+from models import Project as ProjectModel, Plan as PlanModel, Task as TaskModel, User
 from schemas import Plan, PlanCreate, PlanUpdate, PlanWithStats
 from auth import get_current_user
+from plan_stats import build_plans_with_stats
+from etags import fetch_versions, make_etag, not_modified
+from fieldsets import FieldSelection, plan_fields, plan_with_stats_fields
 
 router = APIRouter(prefix="/projects", tags=["plans"])
 
 @router.get("/{project_id}/plans", response_model=List[PlanWithStats])
-def get_project_plans(
+async def get_project_plans(
     project_id: int,
+    request: Request,
+    response: Response,
+    selection: FieldSelection = Depends(plan_with_stats_fields),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all plans for a specific project"""
-    # Check if user owns the project
-    project = db.query(ProjectModel).filter(
-        ProjectModel.id == project_id,
-        ProjectModel.owner_id == current_user.id
-    ).first()
-    
-    if not project:
+    # Ownership check and version of the plans and their tasks in one query
+    project_version, plans_version, tasks_version = await fetch_versions(
+        db,
+        select(ProjectModel.id, ProjectModel.updated_at, ProjectModel.version).where(
+            ProjectModel.id == project_id,
+            ProjectModel.owner_id == current_user.id
+        ),
+        select(PlanModel.id, PlanModel.updated_at, PlanModel.version).where(PlanModel.project_id == project_id),
+        select(TaskModel.id, TaskModel.updated_at, TaskModel.version).join(PlanModel).where(PlanModel.project_id == project_id)
+    )
+    
+    if not project_version[0]:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Project not found"
         )
     
-    plans = db.query(PlanModel).filter(
-        PlanModel.project_id == project_id
-    ).order_by(PlanModel.plan_letter).all()
-    
-    plans_with_stats = []
-    for plan in plans:
-        total_cost = sum(task.cost for task in plan.tasks)
-        total_revenue = sum(task.revenue for task in plan.tasks)
-        task_count = len(plan.tasks)
-        completed_task_count = sum(1 for task in plan.tasks if task.is_completed)
-        
-        plan_with_stats = PlanWithStats(
-            **plan.__dict__,
-            total_cost=total_cost,
-            total_revenue=total_revenue,
-            task_count=task_count,
-            completed_task_count=completed_task_count
-        )
-        plans_with_stats.append(plan_with_stats)
+    cached = not_modified(request, response, make_etag(plans_version, tasks_version, selection.tag))
+    if cached:
+        return cached
+    
+    plans = (await db.scalars(
+        select(PlanModel).options(selection.loader(PlanModel.tasks)).where(
+            PlanModel.project_id == project_id
+        ).order_by(PlanModel.plan_letter)
+    )).all()
     
-    return plans_with_stats
+    plans_with_stats = await build_plans_with_stats(db, plans, include_tasks=selection.includes("tasks"))
+    return selection.render(plans_with_stats, response)
 
 @router.post("/{project_id}/plans", response_model=Plan)
-def create_plan(
+async def create_plan(
     project_id: int,
     plan: PlanCreate,
+    response: Response,
+    selection: FieldSelection = Depends(plan_fields),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new plan within a project"""
     # Check if user owns the project
-    project = db.query(ProjectModel).filter(
+    project = await db.scalar(select(ProjectModel).where(
         ProjectModel.id == project_id,
         ProjectModel.owner_id == current_user.id
-    ).first()
+    ))
     
     if not project:
         raise HTTPException(
@@ -69,18 +77,6 @@ def create_plan(
             detail="Project not found"
         )
     
-    # Check if plan letter already exists in this project
-    existing_plan = db.query(PlanModel).filter(
-        PlanModel.project_id == project_id,
-        PlanModel.plan_letter == plan.plan_letter
-    ).first()
-    
-    if existing_plan:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Plan with this letter already exists in this project"
-        )
-    
     # Validate plan letter
     if plan.plan_letter not in "ABCDEFGHIJKLMNOPQRSTUVWXYZ":
         raise HTTPException(
@@ -94,34 +90,65 @@ def create_plan(
     
     db_plan = PlanModel(**plan_data)
     db.add(db_plan)
-    db.commit()
-    db.refresh(db_plan)
-    return db_plan
+    try:
+        await db.commit()
+    except IntegrityError:
+        # uq_plans_project_id_plan_letter
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Plan with this letter already exists in this project"
+        )
+    await db.refresh(db_plan)
+    # A new plan has no tasks yet
+    set_committed_value(db_plan, "tasks", [])
+    return selection.render(db_plan, response)
 
 @router.get("/{project_id}/plans/{plan_id}", response_model=Plan)
-def get_plan(
+async def get_plan(
     project_id: int,
     plan_id: int,
+    request: Request,
+    response: Response,
+    selection: FieldSelection = Depends(plan_fields),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get a specific plan"""
-    # Check if user owns the project
-    project = db.query(ProjectModel).filter(
-        ProjectModel.id == project_id,
-        ProjectModel.owner_id == current_user.id
-    ).first()
-    
-    if not project:
+    # Ownership check and version of the plan and its tasks in one query
+    project_version, plan_version, tasks_version = await fetch_versions(
+        db,
+        select(ProjectModel.id, ProjectModel.updated_at, ProjectModel.version).where(
+            ProjectModel.id == project_id,
+            ProjectModel.owner_id == current_user.id
+        ),
+        select(PlanModel.id, PlanModel.updated_at, PlanModel.version).where(
+            PlanModel.id == plan_id,
+            PlanModel.project_id == project_id
+        ),
+        select(TaskModel.id, TaskModel.updated_at, TaskModel.version).where(TaskModel.plan_id == plan_id)
+    )
+    
+    if not project_version[0]:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Project not found"
         )
     
-    plan = db.query(PlanModel).filter(
+    if not plan_version[0]:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Plan not found"
+        )
+    
+    cached = not_modified(request, response, make_etag(plan_version, tasks_version, selection.tag))
+    if cached:
+        return cached
+    
+    plan = await db.scalar(select(PlanModel).options(selection.loader(PlanModel.tasks)).where(
         PlanModel.id == plan_id,
         PlanModel.project_id == project_id
-    ).first()
+    ))
     
     if not plan:
         raise HTTPException(
@@ -129,22 +156,24 @@ def get_plan(
             detail="Plan not found"
         )
     
-    return plan
+    return selection.render(plan, response)
 
 @router.put("/{project_id}/plans/{plan_id}", response_model=Plan)
-def update_plan(
+async def update_plan(
     project_id: int,
     plan_id: int,
     plan_update: PlanUpdate,
+    response: Response,
+    selection: FieldSelection = Depends(plan_fields),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update a plan"""
     # Check if user owns the project
-    project = db.query(ProjectModel).filter(
+    project = await db.scalar(select(ProjectModel).where(
         ProjectModel.id == project_id,
         ProjectModel.owner_id == current_user.id
-    ).first()
+    ))
     
     if not project:
         raise HTTPException(
@@ -152,10 +181,10 @@ def update_plan(
             detail="Project not found"
         )
     
-    plan = db.query(PlanModel).filter(
+    plan = await db.scalar(select(PlanModel).options(selection.loader(PlanModel.tasks)).where(
         PlanModel.id == plan_id,
         PlanModel.project_id == project_id
-    ).first()
+    ))
     
     if not plan:
         raise HTTPException(
@@ -175,23 +204,23 @@ def update_plan(
     for key, value in update_data.items():
         setattr(plan, key, value)
     
-    db.commit()
-    db.refresh(plan)
-    return plan
+    await db.commit()
+    await db.refresh(plan)
+    return selection.render(plan, response)
 
 @router.delete("/{project_id}/plans/{plan_id}")
-def delete_plan(
+async def delete_plan(
     project_id: int,
     plan_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete a plan"""
     # Check if user owns the project
-    project = db.query(ProjectModel).filter(
+    project = await db.scalar(select(ProjectModel).where(
         ProjectModel.id == project_id,
         ProjectModel.owner_id == current_user.id
-    ).first()
+    ))
     
     if not project:
         raise HTTPException(
@@ -199,10 +228,10 @@ def delete_plan(
             detail="Project not found"
         )
     
-    plan = db.query(PlanModel).filter(
+    plan = await db.scalar(select(PlanModel).options(selectinload(PlanModel.tasks)).where(
         PlanModel.id == plan_id,
         PlanModel.project_id == project_id
-    ).first()
+    ))
     
     if not plan:
         raise HTTPException(
@@ -217,7 +246,7 @@ def delete_plan(
             detail="Plan A cannot be deleted as it serves as your starting point"
         )
     
-    db.delete(plan)
-    db.commit()
+    await db.delete(plan)
+    await db.commit()
     
     return {"message": f"Plan {plan.plan_letter} deleted successfully"}
\ No newline at end of file
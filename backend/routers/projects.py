@@ -1,33 +1,56 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-from database import get_db
-from models import Project as ProjectModel, Plan as PlanModel, User
-from schemas import Project, ProjectCreate, ProjectUpdate
+from database import get_async_db
+from models import Project as ProjectModel, Plan as PlanModel, User, PlanStats as PlanStatsModel, ProjectStats as ProjectStatsModel
+from schemas import Project, ProjectCreate, ProjectUpdate, ProjectStatistics
 from auth import get_current_user
+from pagination import PageParams, keyset_page, finish_page
+from etags import fetch_versions, make_etag, not_modified
+from fieldsets import FieldSelection, project_fields
+from plan_stats import summarize_plan_stats
 
 router = APIRouter(prefix="/projects", tags=["projects"])
 
 @router.get("/", response_model=List[Project])
-def get_projects(
+async def get_projects(
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(),
+    selection: FieldSelection = Depends(project_fields),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get all projects for the current user"""
-    projects = db.query(ProjectModel).filter(ProjectModel.owner_id == current_user.id).all()
-    return projects
+    """Get the current user's projects, oldest first; further pages via the X-Next-Cursor header"""
+    etag = make_etag(*await fetch_versions(db, keyset_page(
+        select(ProjectModel.id, ProjectModel.updated_at, ProjectModel.version).where(ProjectModel.owner_id == current_user.id),
+        ProjectModel.created_at, ProjectModel.id, page
+    )), selection.tag)
+    cached = not_modified(request, response, etag)
+    if cached:
+        return cached
+
+    projects = (await db.scalars(keyset_page(
+        select(ProjectModel).where(ProjectModel.owner_id == current_user.id),
+        ProjectModel.created_at, ProjectModel.id, page
+    ))).all()
+    return selection.render(finish_page(projects, page, response), response)
 
 @router.get("/{project_id}", response_model=Project)
-def get_project(
+async def get_project(
     project_id: int,
+    request: Request,
+    response: Response,
+    selection: FieldSelection = Depends(project_fields),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get a specific project with its plans"""
-    project = db.query(ProjectModel).filter(
+    """Get a specific project"""
+    project = await db.scalar(select(ProjectModel).where(
         ProjectModel.id == project_id,
         ProjectModel.owner_id == current_user.id
-    ).first()
+    ))
     
     if not project:
         raise HTTPException(
@@ -35,13 +58,54 @@ def get_project(
             detail="Project not found"
         )
     
-    return project
+    # One row is as cheap to load as to aggregate; only the body is saved
+    cached = not_modified(request, response, make_etag((project.id, project.updated_at, project.version), selection.tag))
+    if cached:
+        return cached
+    
+    return selection.render(project, response)
+
+@router.get("/{project_id}/statistics", response_model=ProjectStatistics)
+async def get_project_statistics(
+    project_id: int,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get precomputed statistics for a project"""
+    row = (await db.execute(
+        select(ProjectModel.id, ProjectStatsModel).outerjoin(
+            ProjectStatsModel, ProjectStatsModel.project_id == ProjectModel.id
+        ).where(
+            ProjectModel.id == project_id,
+            ProjectModel.owner_id == current_user.id
+        )
+    )).first()
+    
+    if not row:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found"
+        )
+    
+    project_stats = row[1]
+    plan_stats = (await db.scalars(
+        select(PlanStatsModel).where(PlanStatsModel.project_id == project_id)
+    )).all()
+    
+    return ProjectStatistics(
+        project_id=project_id,
+        total_cost=project_stats.total_cost if project_stats else 0.0,
+        total_revenue=project_stats.total_revenue if project_stats else 0.0,
+        **summarize_plan_stats(plan_stats)
+    )
 
 @router.post("/", response_model=Project)
-def create_project(
+async def create_project(
     project: ProjectCreate,
+    response: Response,
+    selection: FieldSelection = Depends(project_fields),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new project"""
     
@@ -52,23 +116,25 @@ def create_project(
         owner_id=current_user.id
     )
     db.add(db_project)
-    db.commit()
-    db.refresh(db_project)
+    await db.commit()
+    await db.refresh(db_project)
     
-    return db_project
+    return selection.render(db_project, response)
 
 @router.put("/{project_id}", response_model=Project)
-def update_project(
+async def update_project(
     project_id: int,
     project_update: ProjectUpdate,
+    response: Response,
+    selection: FieldSelection = Depends(project_fields),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update a project"""
-    db_project = db.query(ProjectModel).filter(
+    db_project = await db.scalar(select(ProjectModel).where(
         ProjectModel.id == project_id,
         ProjectModel.owner_id == current_user.id
-    ).first()
+    ))
     
     if not db_project:
         raise HTTPException(
@@ -81,21 +147,21 @@ def update_project(
     for key, value in update_data.items():
         setattr(db_project, key, value)
     
-    db.commit()
-    db.refresh(db_project)
-    return db_project
+    await db.commit()
+    await db.refresh(db_project)
+    return selection.render(db_project, response)
 
 @router.delete("/{project_id}")
-def delete_project(
+async def delete_project(
     project_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete a project and all its plans"""
-    db_project = db.query(ProjectModel).filter(
+    db_project = await db.scalar(select(ProjectModel).where(
         ProjectModel.id == project_id,
         ProjectModel.owner_id == current_user.id
-    ).first()
+    ))
     
     if not db_project:
         raise HTTPException(
@@ -103,7 +169,7 @@ def delete_project(
             detail="Project not found"
         )
     
-    db.delete(db_project)
-    db.commit()
+    await db.delete(db_project)
+    await db.commit()
     
-    return {"message": f"Project '{db_project.title}' deleted successfully"}
\ No newline at end of file
+    return {"message": f"Project '{db_project.title}' deleted successfully"}
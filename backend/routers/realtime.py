@@ -0,0 +1,100 @@
+import asyncio
+from typing import Awaitable, Callable
+from fastapi import APIRouter, HTTPException, Query, WebSocket, status
+from fastapi.security import HTTPAuthorizationCredentials
+from sqlalchemy import select
+from database import AsyncSessionLocal
+from models import Project as ProjectModel
+from auth import get_current_user, get_current_active_user
+from plan_access import require_comment_access
+from events import event_hub, Subscription, EVENT_ACCESS_RECHECK_SECONDS, EVENT_HEARTBEAT_SECONDS, EVENT_SEND_TIMEOUT_SECONDS
+
+router = APIRouter(prefix="/ws", tags=["realtime"])
+
+# Browsers cannot set headers on WebSocket requests, so the bearer token comes as ?token=
+TOKEN_QUERY = Query(..., description="JWT or API token")
+
+async def authenticate(db, token: str):
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    return await get_current_active_user(await get_current_user(credentials, db))
+
+async def send_events(websocket: WebSocket, subscription: Subscription):
+    while True:
+        # Idle connections get a ping so proxies keep them open
+        event = await subscription.get(EVENT_HEARTBEAT_SECONDS) or {"type": "ping"}
+        await asyncio.wait_for(websocket.send_json(event), EVENT_SEND_TIMEOUT_SECONDS)
+
+async def wait_for_disconnect(websocket: WebSocket):
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+async def recheck_access(check_access: Callable[[], Awaitable[int]]):
+    """Return once check_access fails, e.g. after the token was revoked or the plan unshared"""
+    while True:
+        await asyncio.sleep(EVENT_ACCESS_RECHECK_SECONDS)
+        try:
+            await check_access()
+        except HTTPException:
+            return
+
+async def stream_events(websocket: WebSocket, subscription: Subscription, check_access: Callable[[], Awaitable[int]]):
+    """Forward a subscription's events until the client leaves, stops reading or loses access"""
+    await websocket.accept()
+    sender = asyncio.create_task(send_events(websocket, subscription))
+    receiver = asyncio.create_task(wait_for_disconnect(websocket))
+    checker = asyncio.create_task(recheck_access(check_access))
+    try:
+        done, _ = await asyncio.wait({sender, receiver, checker}, return_when=asyncio.FIRST_COMPLETED)
+        if sender in done and isinstance(sender.exception(), asyncio.TimeoutError):
+            # Blocked on a client that stopped reading
+            await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        elif checker in done:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+    finally:
+        sender.cancel()
+        receiver.cancel()
+        checker.cancel()
+        await asyncio.gather(sender, receiver, checker, return_exceptions=True)
+        event_hub.unsubscribe(subscription)
+
+@router.websocket("/plans/{plan_id}")
+async def plan_events(websocket: WebSocket, plan_id: int, token: str = TOKEN_QUERY):
+    """Live events of one plan, for its owner and, once shared, other users"""
+    async def check_access() -> int:
+        # Re-checks must not be answered from the access cached on the connection
+        websocket.state.plan_access = {}
+        # A short session: the socket may stay open for hours
+        async with AsyncSessionLocal() as db:
+            current_user = await authenticate(db, token)
+            access = await require_comment_access(websocket, db, current_user, plan_id)
+        return access.project_id
+
+    try:
+        project_id = await check_access()
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await stream_events(websocket, event_hub.subscribe(project_id, plan_id), check_access)
+
+@router.websocket("/projects/{project_id}")
+async def project_events(websocket: WebSocket, project_id: int, token: str = TOKEN_QUERY):
+    """Live events of every plan in a project, for its owner"""
+    async def check_access() -> int:
+        async with AsyncSessionLocal() as db:
+            current_user = await authenticate(db, token)
+            project = await db.scalar(select(ProjectModel.id).where(
+                ProjectModel.id == project_id,
+                ProjectModel.owner_id == current_user.id
+            ))
+        if not project:
+            raise HTTPException(status_code=403, detail="Access denied")
+        return project
+
+    try:
+        await check_access()
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await stream_events(websocket, event_hub.subscribe(project_id), check_access)
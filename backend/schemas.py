@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import datetime
 
 # User schemas
@@ -53,6 +53,28 @@ class Task(TaskBase):
     class Config:
         from_attributes = True
 
+class TaskBatchOperation(BaseModel):
+    """One step of a batch: create (task), update (task_id, changes), delete (task_id) or reorder (task_ids)"""
+    op: Literal["create", "update", "delete", "reorder"]
+    task_id: Optional[int] = None
+    task: Optional[TaskCreate] = None
+    changes: Optional[TaskUpdate] = None
+    task_ids: Optional[List[int]] = None
+
+class TaskBatchRequest(BaseModel):
+    operations: List[TaskBatchOperation]
+
+class TaskBatchResult(BaseModel):
+    index: int
+    op: str
+    ok: bool
+    task_id: Optional[int] = None
+    task: Optional[Task] = None
+    error: Optional[str] = None
+
+class TaskBatchResponse(BaseModel):
+    results: List[TaskBatchResult]
+
 # Project schemas
 class ProjectBase(BaseModel):
     title: str
@@ -110,6 +132,25 @@ class PlanWithStats(Plan):
     task_count: int
     completed_task_count: int
 
+# Generation job schemas
+class GenerationJob(BaseModel):
+    id: int
+    project_id: int
+    status: str
+    progress: int
+    total: int
+    plan_ids: List[int] = []
+    error: Optional[str] = None
+    cancel_requested: bool
+    use_cache: bool
+    gaps_only: bool
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
 # Comment schemas
 class CommentBase(BaseModel):
     content: str
@@ -180,6 +221,11 @@ class PlanStatistics(BaseModel):
     completed_tasks: int
     total_tasks: int
 
+class ProjectStatistics(PlanStatistics):
+    project_id: int
+    total_cost: float = 0.0
+    total_revenue: float = 0.0
+
 # LLM schemas
 class LLMGenerationRequest(BaseModel):
     plan_z_content: str
@@ -0,0 +1,170 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from itertools import chain
+from typing import Iterable, Optional
+from sqlalchemy import event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from models import Plan, SharedLink, Task
+
+SHARED_PLAN_CACHE_TTL_SECONDS = float(os.getenv("SHARED_PLAN_CACHE_TTL_SECONDS", "300"))
+SHARED_PLAN_CACHE_MAX_ENTRIES = int(os.getenv("SHARED_PLAN_CACHE_MAX_ENTRIES", "1000"))
+# How long a reverse proxy may serve a shared plan without asking again; browsers always revalidate
+SHARED_PLAN_PROXY_MAX_AGE_SECONDS = int(os.getenv("SHARED_PLAN_PROXY_MAX_AGE_SECONDS", "30"))
+
+def utcnow_like(value: datetime) -> datetime:
+    """Current UTC time, aware or naive to match value (SQLite returns naive datetimes)"""
+    now = datetime.now(timezone.utc)
+    return now if value.tzinfo is not None else now.replace(tzinfo=None)
+
+@dataclass(frozen=True)
+class SharedPlanSnapshot:
+    """Rendered response body of a shared plan, with what is needed to serve it without the database"""
+    plan_id: int
+    body: bytes
+    etag: str
+    expires_at: Optional[datetime]
+
+    @classmethod
+    def build(cls, shared_link: SharedLink, body: bytes) -> "SharedPlanSnapshot":
+        return cls(
+            plan_id=shared_link.plan_id,
+            body=body,
+            etag=f'W/"{hashlib.sha1(body).hexdigest()}"',
+            expires_at=shared_link.expires_at,
+        )
+
+    def expired(self) -> bool:
+        return self.expires_at is not None and self.expires_at < utcnow_like(self.expires_at)
+
+    def cache_control(self) -> str:
+        max_age = SHARED_PLAN_PROXY_MAX_AGE_SECONDS
+        if self.expires_at is not None:
+            # Proxies must not keep serving the plan after the link expires
+            remaining = (self.expires_at - utcnow_like(self.expires_at)).total_seconds()
+            max_age = max(0, min(max_age, int(remaining)))
+        return f"public, max-age=0, s-maxage={max_age}"
+
+class SharedPlanCache:
+    """In-process TTL/LRU cache of shared-plan snapshots keyed by share token
+
+    Entries are dropped when their plan, its tasks or the link change (see
+    the session listeners below); the TTL bounds staleness from changes
+    made by other processes.
+    """
+
+    def __init__(self, ttl_seconds: float = SHARED_PLAN_CACHE_TTL_SECONDS, max_entries: int = SHARED_PLAN_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped on every invalidation so a snapshot read before it is not stored after it
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    def get(self, share_token: str) -> Optional[SharedPlanSnapshot]:
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(share_token)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[share_token]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(share_token)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, share_token: str, snapshot: SharedPlanSnapshot, generation: int):
+        """Store a snapshot read while the cache was at generation, unless something changed since"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[share_token] = (time.monotonic() + self.ttl_seconds, snapshot)
+            self._entries.move_to_end(share_token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, plan_ids: Iterable[int] = (), share_tokens: Iterable[str] = ()):
+        plan_ids, share_tokens = set(plan_ids), set(share_tokens)
+        with self._lock:
+            self.generation += 1
+            keys = [
+                key for key, (_, snapshot) in self._entries.items()
+                if key in share_tokens or snapshot.plan_id in plan_ids
+            ]
+            for key in keys:
+                del self._entries[key]
+            self.invalidations += len(keys)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": size,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+shared_plan_cache = SharedPlanCache()
+
+def mark_plans_changed(db: AsyncSession, plan_ids: Iterable[int]):
+    """Invalidate shared plans on commit, for bulk statements that skip flush events"""
+    db.info.setdefault("changed_shared_plan_ids", set()).update(plan_ids)
+
+# Invalidate snapshots once changes to plans, tasks and links are committed
+@event.listens_for(Session, "after_flush")
+def _collect_changed_shared_plans(session, flush_context):
+    plan_ids = session.info.setdefault("changed_shared_plan_ids", set())
+    share_tokens = session.info.setdefault("changed_share_tokens", set())
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Task):
+            plan_ids.add(obj.plan_id)
+            plan_ids.update(inspect(obj).attrs.plan_id.history.deleted)
+        elif isinstance(obj, Plan):
+            plan_ids.add(obj.id)
+        elif isinstance(obj, SharedLink) and obj not in session.new:
+            share_tokens.add(obj.share_token)
+            share_tokens.update(inspect(obj).attrs.share_token.history.deleted)
+    plan_ids.discard(None)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_shared_plans(session):
+    plan_ids = session.info.pop("changed_shared_plan_ids", set())
+    share_tokens = session.info.pop("changed_share_tokens", set())
+    if plan_ids or share_tokens:
+        shared_plan_cache.invalidate(plan_ids, share_tokens)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_shared_plans(session):
+    session.info.pop("changed_shared_plan_ids", None)
+    session.info.pop("changed_share_tokens", None)
@@ -0,0 +1,77 @@
+import os
+import tempfile
+
+# The app reads its configuration at import time: a throwaway SQLite
+# database, cheap in-process password hashing, no rate limits and an
+# unreachable Ollama so generation takes the fallback path
+_database_dir = tempfile.mkdtemp(prefix="azplan-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_database_dir, 'test.db')}"
+os.environ["PASSWORD_HASH_WORKERS"] = "0"
+os.environ["BCRYPT_ROUNDS"] = "4"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["OLLAMA_BASE_URL"] = "http://127.0.0.1:1"
+os.environ["OLLAMA_RETRY_ROUNDS"] = "0"
+
+import pytest
+from fastapi.testclient import TestClient
+import main
+import models
+from auth import create_access_token, get_password_hash
+from database import SessionLocal, engine
+from generation_cache import generation_cache
+from identity_cache import identity_cache
+from shared_plan_cache import shared_plan_cache
+
+models.Base.metadata.create_all(engine)
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(main.app) as client:
+        yield client
+
+@pytest.fixture(autouse=True)
+def clean_database():
+    """Every test starts from empty tables and caches"""
+    with engine.begin() as conn:
+        for table in reversed(models.Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+    identity_cache.clear()
+    shared_plan_cache.clear()
+    generation_cache.clear()
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    yield session
+    session.close()
+
+@pytest.fixture
+def user(db):
+    user = models.User(username="alice", email="alice@example.com", hashed_password=get_password_hash("secret"))
+    db.add(user)
+    db.commit()
+    return user
+
+@pytest.fixture
+def auth_headers(user):
+    return {"Authorization": f"Bearer {create_access_token({'sub': user.username})}"}
+
+@pytest.fixture
+def make_project(db, user):
+    """Create a project of the user with plans A, B, ... of n_tasks tasks each"""
+    def make_project(n_plans: int = 3, n_tasks: int = 4) -> models.Project:
+        project = models.Project(title="Project", owner_id=user.id)
+        db.add(project)
+        db.flush()
+        for letter in "ABCDEFGHIJKLMNOPQRSTUVWXYZ"[:n_plans]:
+            plan = models.Plan(project_id=project.id, plan_letter=letter, title=f"Plan {letter}")
+            db.add(plan)
+            db.flush()
+            for number in range(n_tasks):
+                db.add(models.Task(
+                    plan_id=plan.id, title=f"Task {number}", cost=10, revenue=15,
+                    is_completed=number % 2 == 0
+                ))
+        db.commit()
+        return project
+    return make_project
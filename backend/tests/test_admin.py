@@ -0,0 +1,19 @@
+from auth import create_access_token
+
+def test_self_registered_admin_username_is_not_admin(client):
+    response = client.post("/auth/register", json={
+        "username": "admin", "email": "admin@example.com", "password": "secret"
+    })
+    assert response.status_code == 200
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'admin'})}"}
+
+    assert client.get("/admin/identity-cache", headers=headers).status_code == 403
+
+def test_admin_flag_grants_admin_access(client, db, user, auth_headers):
+    assert client.get("/admin/identity-cache", headers=auth_headers).status_code == 403
+
+    # Committing the change drops the cached identity, so it applies at once
+    user.is_admin = True
+    db.commit()
+
+    assert client.get("/admin/identity-cache", headers=auth_headers).status_code == 200
@@ -0,0 +1,47 @@
+from sqlalchemy import text
+from database import engine
+
+def pin_updated_at():
+    """Make every row look last updated at the same instant, as edits within one second do on SQLite"""
+    with engine.begin() as conn:
+        for table in ("projects", "plans", "tasks"):
+            conn.execute(text(f"UPDATE {table} SET updated_at = '2026-01-01 00:00:00'"))
+
+def etag(client, url, headers) -> str:
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    return response.headers["ETag"]
+
+def test_unchanged_responses_are_not_modified(client, auth_headers, make_project):
+    plan = make_project(n_plans=1, n_tasks=2).plans[0]
+    url = f"/plans/{plan.id}/tasks"
+
+    tag = etag(client, url, auth_headers)
+
+    assert client.get(url, headers={**auth_headers, "If-None-Match": tag}).status_code == 304
+
+def test_edits_within_one_second_change_the_etag(client, auth_headers, make_project):
+    project = make_project(n_plans=2, n_tasks=2)
+    plan = project.plans[1]
+    task_id = plan.tasks[0].id
+    urls = [f"/plans/{plan.id}/tasks", f"/projects/{project.id}/plans/{plan.id}?include=tasks", f"/projects/{project.id}"]
+    pin_updated_at()
+    tags = [etag(client, url, auth_headers) for url in urls]
+
+    edits = [
+        lambda: client.put(f"/tasks/{task_id}", json={"title": "Renamed"}, headers=auth_headers),
+        lambda: client.post(f"/plans/{plan.id}/tasks/batch", json={"operations": [
+            {"op": "update", "task_id": task_id, "changes": {"title": "Renamed again"}}
+        ]}, headers=auth_headers),
+        lambda: client.put(f"/projects/{project.id}/plans/{plan.id}", json={"title": "Plan B2"}, headers=auth_headers),
+        lambda: client.put(f"/projects/{project.id}", json={"title": "Renamed project"}, headers=auth_headers),
+    ]
+    changed = [[0, 1], [0, 1], [1], [2]]
+    for edit, changed_urls in zip(edits, changed):
+        assert edit().status_code == 200
+        pin_updated_at()
+
+        new_tags = [etag(client, url, auth_headers) for url in urls]
+        for index in changed_urls:
+            assert new_tags[index] != tags[index], urls[index]
+        tags = new_tags
@@ -0,0 +1,70 @@
+from query_budget import query_budget
+
+def test_plans_leave_out_tasks_unless_included(client, auth_headers, make_project):
+    project = make_project(n_plans=1, n_tasks=3)
+    plan = project.plans[0]
+    url = f"/projects/{project.id}/plans/{plan.id}"
+
+    with query_budget(10) as log:
+        response = client.get(url, headers=auth_headers)
+    assert "tasks" not in response.json()
+    # The relationship is not loaded either; only the ETag query looks at tasks
+    assert sum("FROM tasks" in statement for statement in log.statements) == 1
+
+    response = client.get(url, params={"include": "tasks"}, headers=auth_headers)
+    assert [task["title"] for task in response.json()["tasks"]] == ["Task 0", "Task 1", "Task 2"]
+
+def test_fields_trim_the_response(client, auth_headers, make_project):
+    project = make_project(n_plans=2, n_tasks=1)
+
+    response = client.get(f"/projects/{project.id}/plans", params={"fields": "plan_letter,task_count"}, headers=auth_headers)
+
+    assert response.json() == [
+        {"id": plan["id"], "plan_letter": letter, "task_count": 1}
+        for plan, letter in zip(response.json(), "AB")
+    ]
+
+def test_fields_naming_a_relation_include_it(client, auth_headers, make_project):
+    project = make_project(n_plans=1, n_tasks=2)
+
+    response = client.get(f"/projects/{project.id}/plans", params={"fields": "title,tasks"}, headers=auth_headers)
+
+    plan, = response.json()
+    assert set(plan) == {"id", "title", "tasks"}
+    assert len(plan["tasks"]) == 2
+
+def test_representations_have_their_own_etags(client, auth_headers, make_project):
+    project = make_project(n_plans=1, n_tasks=1)
+    url = f"/projects/{project.id}/plans"
+
+    full = client.get(url, headers=auth_headers)
+    trimmed = client.get(url, params={"fields": "title"}, headers=auth_headers)
+    assert full.headers["ETag"] != trimmed.headers["ETag"]
+
+    cached = client.get(url, params={"fields": "title"}, headers={**auth_headers, "If-None-Match": trimmed.headers["ETag"]})
+    assert cached.status_code == 304
+
+def test_unknown_fields_are_rejected(client, auth_headers, make_project):
+    project = make_project(n_plans=1, n_tasks=0)
+
+    response = client.get(f"/projects/{project.id}/plans", params={"fields": "title,secret"}, headers=auth_headers)
+    assert response.status_code == 400
+
+    response = client.get(f"/projects/{project.id}/plans", params={"include": "comments"}, headers=auth_headers)
+    assert response.status_code == 400
+
+def test_project_writes_take_fields(client, auth_headers):
+    response = client.post(
+        "/projects/", params={"fields": "title"}, json={"title": "Bakery"}, headers=auth_headers
+    )
+    project = response.json()
+    assert project == {"id": project["id"], "title": "Bakery"}
+
+    response = client.put(
+        f"/projects/{project['id']}", params={"fields": "description"},
+        json={"description": "Bread"}, headers=auth_headers
+    )
+    assert response.json() == {"id": project["id"], "description": "Bread"}
+
+    response = client.put(f"/projects/{project['id']}", params={"fields": "secret"}, json={}, headers=auth_headers)
+    assert response.status_code == 400
@@ -0,0 +1,264 @@
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta, timezone
+import pytest
+import models
+from database import async_engine
+from generation_cache import generation_cache
+from generation_jobs import GenerationJobQueue, upsert_insert
+from rate_limits import MemoryBackend, generation_slot_key, rate_limiter
+from schemas import PlanCreate
+import ollama_service as ollama_service_module
+from ollama_service import ollama_service
+from query_budget import query_budget
+
+def sse_events(body: str) -> list:
+    events = []
+    for block in body.strip().split("\n\n"):
+        event, data = block.split("\n", 1)
+        events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+def add_plan_z(db, project):
+    db.add(models.Plan(project_id=project.id, plan_letter="Z", title="Plan Z", description="Run a bakery"))
+    db.commit()
+
+def test_stream_releases_the_request_connection(client, db, auth_headers, make_project, monkeypatch):
+    project = make_project(n_plans=1, n_tasks=0)
+    add_plan_z(db, project)
+    stream_plans = ollama_service.stream_plans
+    checked_out = []
+
+    async def observed_stream_plans(*args, **kwargs):
+        checked_out.append(async_engine.pool.checkedout())
+        async for plan in stream_plans(*args, **kwargs):
+            yield plan
+
+    monkeypatch.setattr(ollama_service, "stream_plans", observed_stream_plans)
+    response = client.post(
+        "/plans/generate-from-z/stream", params={"project_id": project.id, "use_cache": False}, headers=auth_headers
+    )
+
+    assert response.status_code == 200
+    # Nothing is checked out while the stream waits on the model
+    assert checked_out == [0]
+    events = sse_events(response.text)
+    assert events[-1] == ("done", {"generated": 24, "missing": []})
+    assert [data["plan_letter"] for event, data in events if event == "plan"] == list("BCDEFGHIJKLMNOPQRSTUVWXY")
+
+def test_stream_without_plan_z_is_404(client, auth_headers, make_project):
+    project = make_project(n_plans=1, n_tasks=0)
+
+    response = client.post("/plans/generate-from-z/stream", params={"project_id": project.id}, headers=auth_headers)
+
+    assert response.status_code == 404
+
+def wait_for_job(client, job_id, headers, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        job = client.get(f"/jobs/{job_id}", headers=headers).json()
+        if job["status"] not in ("queued", "running") or time.monotonic() > deadline:
+            return job
+        time.sleep(0.02)
+
+def test_fallback_plans_are_saved_in_one_batch(client, db, auth_headers, make_project):
+    project = make_project(n_plans=1, n_tasks=2)
+    add_plan_z(db, project)
+    project_id = project.id
+
+    # Placeholders are known up front: one upsert and one rollup refresh for all 24
+    with query_budget(12):
+        response = client.post(
+            "/plans/generate-from-z/stream", params={"project_id": project_id, "use_cache": False}, headers=auth_headers
+        )
+
+    assert sse_events(response.text)[-1] == ("done", {"generated": 24, "missing": []})
+    statistics = client.get("/statistics", headers=auth_headers).json()
+    assert statistics["total_plans"] == 26
+    assert statistics["total_tasks"] == 2
+
+def test_generation_job_saves_plans_and_statistics(client, db, auth_headers, make_project):
+    project = make_project(n_plans=1, n_tasks=0)
+    add_plan_z(db, project)
+
+    response = client.post(
+        "/jobs/generate-from-z", params={"project_id": project.id, "use_cache": False}, headers=auth_headers
+    )
+    assert response.status_code == 202
+    job = wait_for_job(client, response.json()["id"], auth_headers)
+
+    assert job["status"] == "succeeded"
+    assert job["progress"] == 24
+    assert len(job["plan_ids"]) == 24
+    assert client.get("/statistics", headers=auth_headers).json()["total_plans"] == 26
+
+def test_databases_without_upsert_are_rejected():
+    with pytest.raises(RuntimeError, match="ON CONFLICT"):
+        upsert_insert("mssql")
+
+def add_job(db, user, project, **values) -> models.GenerationJob:
+    job = models.GenerationJob(user_id=user.id, project_id=project.id, **values)
+    db.add(job)
+    db.commit()
+    return job
+
+def job_row(db, job_id) -> models.GenerationJob:
+    db.expire_all()
+    return db.get(models.GenerationJob, job_id)
+
+def test_a_queued_job_is_claimed_once(client, db, user, make_project):
+    project = make_project(n_plans=1, n_tasks=0)
+    add_plan_z(db, project)
+    job = add_job(db, user, project, use_cache=False)
+    queue = GenerationJobQueue(workers=0)
+
+    async def run_twice():
+        await asyncio.gather(queue._run_job(job.id), queue._run_job(job.id))
+
+    client.portal.call(run_twice)
+
+    job = job_row(db, job.id)
+    assert job.status == "succeeded"
+    assert job.attempts == 1
+    assert len(job.plan_ids) == 24
+
+def test_start_requeues_only_stale_running_jobs(client, db, user, make_project):
+    project = make_project(n_plans=1, n_tasks=0)
+    long_ago = datetime.now(timezone.utc) - timedelta(hours=1)
+    stale = add_job(db, user, project, status="running", updated_at=long_ago)
+    active = add_job(db, user, project, status="running")
+    queued = add_job(db, user, project)
+    queue = GenerationJobQueue(workers=0, stale_after=600)
+
+    client.portal.call(queue.start)
+    try:
+        assert job_row(db, stale.id).status == "queued"
+        assert job_row(db, active.id).status == "running"
+        assert queue.stats()["queued"] == 2
+        assert sorted(queue._queue.get_nowait() for _ in range(2)) == sorted([stale.id, queued.id])
+    finally:
+        client.portal.call(queue.stop)
+
+def test_cancelling_a_queued_job_stops_it_outright(client, db, user, auth_headers, make_project):
+    project = make_project(n_plans=1, n_tasks=0)
+    job = add_job(db, user, project)
+
+    response = client.post(f"/jobs/{job.id}/cancel", headers=auth_headers)
+
+    assert response.json()["status"] == "cancelled"
+    # A worker picking it up later leaves it alone
+    client.portal.call(GenerationJobQueue(workers=0)._run_job, job.id)
+    assert job_row(db, job.id).attempts == 0
+    assert client.post(f"/jobs/{job.id}/cancel", headers=auth_headers).status_code == 409
+
+def test_cancelling_a_running_job_stops_it_after_the_current_plans(client, db, user, auth_headers, make_project):
+    project = make_project(n_plans=1, n_tasks=0)
+    add_plan_z(db, project)
+    job = add_job(db, user, project, status="running", use_cache=False)
+
+    response = client.post(f"/jobs/{job.id}/cancel", headers=auth_headers)
+    assert response.json()["status"] == "running"
+    assert response.json()["cancel_requested"] is True
+
+    # The worker sees the flag once its first batch of plans is saved
+    job.status = "queued"
+    db.commit()
+    client.portal.call(GenerationJobQueue(workers=0)._run_job, job.id)
+    job = job_row(db, job.id)
+    assert job.status == "cancelled"
+    assert job.progress == 24
+
+def test_jobs_and_synchronous_generations_share_the_concurrency_limit(
+    client, db, user, auth_headers, make_project, monkeypatch
+):
+    monkeypatch.setattr(rate_limiter, "enabled", True)
+    monkeypatch.setattr(rate_limiter, "backend", MemoryBackend())
+    project = make_project(n_plans=1, n_tasks=0)
+    add_plan_z(db, project)
+    params = {"project_id": project.id, "use_cache": False}
+
+    # A queued job takes the user's only slot
+    job = add_job(db, user, project)
+    assert client.post("/plans/generate-from-z", params=params, headers=auth_headers).status_code == 429
+    job.status = "succeeded"
+    db.commit()
+
+    # So does a synchronous generation in progress
+    lease_id = client.portal.call(rate_limiter.acquire, generation_slot_key(user.id), 1)
+    response = client.post("/jobs/generate-from-z", params=params, headers=auth_headers)
+    assert response.status_code == 429
+    assert "Retry-After" in response.headers
+    client.portal.call(rate_limiter.release, generation_slot_key(user.id), lease_id)
+
+def test_repeated_generation_is_served_from_cache(client, db, auth_headers, make_project, monkeypatch):
+    project = make_project(n_plans=1, n_tasks=0)
+    add_plan_z(db, project)
+    prompted = []
+
+    async def generate_round(prompt, letters, plans):
+        prompted.append(letters)
+        plans.update((letter, PlanCreate(plan_letter=letter, title=f"Generated {letter}")) for letter in letters)
+        return True
+
+    monkeypatch.setattr(ollama_service, "_generate_round", generate_round)
+    params = {"project_id": project.id}
+    hits = generation_cache.hits
+
+    first = client.post("/plans/generate-from-z", params=params, headers=auth_headers)
+    # The plans saved by the first run are part of the project now, yet the key is the same
+    second = client.post("/plans/generate-from-z", params=params, headers=auth_headers)
+
+    assert first.status_code == second.status_code == 200
+    assert [plan["title"] for plan in second.json()] == [plan["title"] for plan in first.json()]
+    assert prompted == ["BCDEFGHIJKLMNOPQRSTUVWXY"]
+    assert generation_cache.hits == hits + 1
+
+class PartialModel:
+    """Stand-in for Ollama that answers each round with only the first `per_round` requested letters"""
+
+    def __init__(self, per_round: int):
+        self.per_round = per_round
+        self.rounds = []
+
+    def answer(self, prompt: str, letters: str) -> list:
+        self.rounds.append((prompt, letters))
+        return [PlanCreate(plan_letter=letter, title=f"Generated {letter}") for letter in letters[:self.per_round]]
+
+    async def generate_round(self, prompt, letters, plans):
+        plans.update((plan.plan_letter, plan) for plan in self.answer(prompt, letters))
+        return True
+
+    async def stream_round(self, prompt, letters, plans):
+        for plan in self.answer(prompt, letters):
+            plans[plan.plan_letter] = plan
+            yield plan
+
+def test_missing_letters_are_requested_again(monkeypatch):
+    monkeypatch.setattr(ollama_service_module, "OLLAMA_RETRY_ROUNDS", 2)
+    model = PartialModel(per_round=10)
+    monkeypatch.setattr(ollama_service, "_generate_round", model.generate_round)
+
+    plans = asyncio.run(ollama_service.generate_plans("Run a bakery", use_cache=False))
+
+    assert [letters for _, letters in model.rounds] == [
+        "BCDEFGHIJKLMNOPQRSTUVWXY", "LMNOPQRSTUVWXY", "VWXY"
+    ]
+    # Re-prompts show the model what it already produced
+    assert "Plan B: Generated B" in model.rounds[1][0]
+    assert [plan.title for plan in plans] == [f"Generated {letter}" for letter in "BCDEFGHIJKLMNOPQRSTUVWXY"]
+
+def test_letters_still_missing_after_the_last_round_get_placeholders(monkeypatch):
+    monkeypatch.setattr(ollama_service_module, "OLLAMA_RETRY_ROUNDS", 1)
+    model = PartialModel(per_round=10)
+    monkeypatch.setattr(ollama_service, "_stream_round", model.stream_round)
+
+    async def collect():
+        return [batch async for batch in ollama_service.stream_plans("Run a bakery", use_cache=False)]
+
+    batches = asyncio.run(collect())
+
+    assert len(model.rounds) == 2
+    assert [len(batch) for batch in batches] == [1] * 20 + [4]
+    assert [plan.plan_letter for plan in batches[-1]] == list("VWXY")
+    assert all("placeholder" in plan.description for plan in batches[-1])
@@ -0,0 +1,40 @@
+from identity_cache import identity_cache
+from query_budget import query_budget
+
+def test_repeated_requests_reuse_the_cached_identity(client, auth_headers):
+    client.get("/auth/me", headers=auth_headers)
+
+    with query_budget(5) as log:
+        response = client.get("/auth/me", headers=auth_headers)
+
+    assert response.json()["username"] == "alice"
+    assert not any("FROM users" in statement for statement in log.statements)
+    assert identity_cache.stats()["size"] == 1
+
+def test_committed_user_changes_drop_cached_identities(client, db, user, auth_headers):
+    assert client.get("/auth/me", headers=auth_headers).status_code == 200
+
+    user.is_active = False
+    db.commit()
+
+    assert identity_cache.stats()["size"] == 0
+    assert client.get("/auth/me", headers=auth_headers).status_code == 401
+
+def test_uncommitted_user_changes_keep_cached_identities(client, db, user, auth_headers):
+    client.get("/auth/me", headers=auth_headers)
+
+    user.is_active = False
+    db.flush()
+    db.rollback()
+
+    assert identity_cache.stats()["size"] == 1
+    assert client.get("/auth/me", headers=auth_headers).status_code == 200
+
+def test_deleted_api_token_stops_authenticating(client, auth_headers):
+    created = client.post("/api-tokens", json={"name": "CLI"}, headers=auth_headers).json()
+    token_headers = {"Authorization": f"Bearer {created['token']}"}
+    assert client.get("/auth/me", headers=token_headers).status_code == 200
+
+    assert client.delete(f"/api-tokens/{created['id']}", headers=auth_headers).status_code == 200
+
+    assert client.get("/auth/me", headers=token_headers).status_code == 401
@@ -0,0 +1,40 @@
+from prometheus_client.parser import text_string_to_metric_families
+
+def scrape(client) -> dict:
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    return {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for family in text_string_to_metric_families(response.text)
+        for sample in family.samples
+    }
+
+def sample(samples: dict, name: str, **labels) -> float:
+    return samples.get((name, tuple(sorted(labels.items()))), 0.0)
+
+def test_requests_are_counted_by_route_template(client, auth_headers, make_project):
+    plan = make_project(n_plans=1, n_tasks=2).plans[0]
+    route = {"method": "GET", "route": "/plans/{plan_id}/tasks"}
+    before = scrape(client)
+
+    for _ in range(3):
+        client.get(f"/plans/{plan.id}/tasks", headers=auth_headers)
+    client.get("/no-such-page")
+    after = scrape(client)
+
+    def increase(name: str, **labels) -> float:
+        return sample(after, name, **labels) - sample(before, name, **labels)
+
+    assert increase("http_requests_total", status="200", **route) == 3
+    assert increase("http_request_duration_seconds_count", **route) == 3
+    assert increase("http_request_db_statements_sum", **route) >= 3
+    assert increase("http_requests_total", method="GET", route="unmatched", status="404") == 1
+
+def test_pool_and_threadpool_gauges_are_exported(client):
+    samples = scrape(client)
+    names = {name for name, _ in samples}
+
+    for name in ("db_pool_checked_out", "db_pool_idle", "db_pool_overflow", "db_statements_total"):
+        assert (name, (("engine", "api"),)) in samples, name
+    assert {"threadpool_threads", "threadpool_threads_busy", "threadpool_tasks_waiting"} <= names
@@ -0,0 +1,40 @@
+import models
+from pagination import NEXT_CURSOR_HEADER
+
+def walk_pages(client, url, headers, limit):
+    """Follow X-Next-Cursor like the frontend's getAllPages, with a bound on the page count"""
+    pages = []
+    params = {"limit": limit}
+    for _ in range(10):
+        response = client.get(url, params=params, headers=headers)
+        assert response.status_code == 200
+        pages.append([item["id"] for item in response.json()])
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            return pages
+        params = {"limit": limit, "cursor": cursor}
+    raise AssertionError(f"pagination did not end: {pages}")
+
+def test_projects_pages_follow_the_cursor(client, db, user, auth_headers):
+    # Created within the same second, so the cursor's id breaks the tie
+    db.add_all([models.Project(title=f"Project {number}", owner_id=user.id) for number in range(5)])
+    db.commit()
+    ids = [project.id for project in db.query(models.Project).order_by(models.Project.id)]
+
+    pages = walk_pages(client, "/projects/", auth_headers, limit=2)
+
+    assert pages == [ids[0:2], ids[2:4], ids[4:5]]
+
+def test_comments_pages_follow_the_cursor_newest_first(client, db, user, auth_headers, make_project):
+    plan = make_project(n_plans=1, n_tasks=0).plans[0]
+    db.add_all([models.Comment(plan_id=plan.id, user_id=user.id, content=f"Comment {number}") for number in range(5)])
+    db.commit()
+    ids = [comment.id for comment in db.query(models.Comment).order_by(models.Comment.id.desc())]
+
+    pages = walk_pages(client, f"/plans/{plan.id}/comments", auth_headers, limit=2)
+
+    assert pages == [ids[0:2], ids[2:4], ids[4:5]]
+
+def test_invalid_cursor_is_rejected(client, auth_headers):
+    response = client.get("/projects/", params={"cursor": "not-a-cursor"}, headers=auth_headers)
+    assert response.status_code == 400
@@ -0,0 +1,30 @@
+from passlib.hash import bcrypt
+import models
+from password_hashing import BCRYPT_ROUNDS, password_hasher
+
+def stored_hash(db, user) -> str:
+    db.expire_all()
+    return db.get(models.User, user.id).hashed_password
+
+def login(client, password: str):
+    return client.post("/auth/login", json={"username": "alice", "password": password})
+
+def test_login_upgrades_hashes_with_another_cost(client, db, user):
+    user.hashed_password = bcrypt.using(rounds=BCRYPT_ROUNDS + 1, ident="2b").hash("secret")
+    db.commit()
+    rehashed = password_hasher.rehashed
+
+    # A wrong password never replaces the hash
+    assert login(client, "wrong").status_code == 401
+    assert stored_hash(db, user).startswith(f"$2b${BCRYPT_ROUNDS + 1:02d}$")
+
+    assert login(client, "secret").status_code == 200
+    new_hash = stored_hash(db, user)
+    assert new_hash.startswith(f"$2b${BCRYPT_ROUNDS:02d}$")
+    assert bcrypt.verify("secret", new_hash)
+    assert password_hasher.rehashed == rehashed + 1
+
+    # Current hashes are left alone
+    assert login(client, "secret").status_code == 200
+    assert stored_hash(db, user) == new_hash
+    assert password_hasher.rehashed == rehashed + 1
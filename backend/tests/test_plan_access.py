@@ -0,0 +1,52 @@
+import pytest
+import models
+from auth import create_access_token, get_password_hash
+from query_budget import query_budget
+
+@pytest.fixture
+def bob_headers(db):
+    db.add(models.User(username="bob", email="bob@example.com", hashed_password=get_password_hash("secret")))
+    db.commit()
+    return {"Authorization": f"Bearer {create_access_token({'sub': 'bob'})}"}
+
+def add_link(db, plan, user, is_active=True):
+    db.add(models.SharedLink(plan_id=plan.id, owner_id=user.id, share_token=f"link-{plan.id}", is_active=is_active))
+    db.commit()
+
+def comment(client, plan_id, headers):
+    return client.post("/comments", json={"plan_id": plan_id, "content": "Hi"}, headers=headers)
+
+def test_owner_may_comment_on_unshared_plans(client, auth_headers, make_project):
+    plan = make_project(n_plans=1, n_tasks=0).plans[0]
+
+    assert comment(client, plan.id, auth_headers).status_code == 200
+    assert len(client.get(f"/plans/{plan.id}/comments", headers=auth_headers).json()) == 1
+
+def test_others_need_an_active_share(client, db, user, bob_headers, make_project):
+    first, second = make_project(n_plans=2, n_tasks=0).plans
+    add_link(db, first, user)
+    add_link(db, second, user, is_active=False)
+
+    assert comment(client, first.id, bob_headers).status_code == 200
+    assert client.get(f"/plans/{first.id}/comments", headers=bob_headers).status_code == 200
+    assert comment(client, second.id, bob_headers).status_code == 403
+    assert client.get(f"/plans/{second.id}/comments", headers=bob_headers).status_code == 403
+
+def test_unknown_plans_are_404(client, auth_headers):
+    assert comment(client, 12345, auth_headers).status_code == 404
+    assert client.get("/plans/12345/comments", headers=auth_headers).status_code == 404
+
+def test_access_is_resolved_in_one_query(client, db, user, bob_headers, make_project):
+    plan = make_project(n_plans=1, n_tasks=0).plans[0]
+    add_link(db, plan, user)
+    url = f"/plans/{plan.id}/comments"
+    # Warm the identity cache so only the route's own queries are counted
+    client.get("/auth/me", headers=bob_headers)
+
+    with query_budget(2) as log:
+        response = client.get(url, headers=bob_headers)
+
+    assert response.status_code == 200
+    access_queries = [statement for statement in log.statements if "shared_links" in statement]
+    assert len(access_queries) == 1
+    assert "EXISTS" in access_queries[0]
@@ -0,0 +1,88 @@
+import pytest
+import models
+from identity_cache import identity_cache
+from query_budget import query_budget
+
+def get_within_budget(client, url: str, budget: int, headers=None):
+    """GET url, failing if it runs more than budget statements or an N+1 pattern"""
+    # Each request authenticates from the database, as it would with a cold cache
+    identity_cache.clear()
+    with query_budget(budget) as log:
+        response = client.get(url, headers=headers)
+    assert response.status_code == 200, response.text
+    return response, log
+
+@pytest.mark.parametrize("url, budget", [
+    ("/projects/{project_id}/plans", 4),
+    ("/projects/{project_id}/plans?include=tasks", 5),
+    ("/plans", 4),
+])
+def test_plan_listings_run_a_constant_number_of_statements(client, auth_headers, make_project, url, budget):
+    small = make_project(n_plans=2, n_tasks=1)
+    large = make_project(n_plans=26, n_tasks=30)
+
+    _, small_log = get_within_budget(client, url.format(project_id=small.id), budget, auth_headers)
+    response, large_log = get_within_budget(client, url.format(project_id=large.id), budget, auth_headers)
+
+    assert small_log.count == large_log.count
+    plans = [plan for plan in response.json() if plan["project_id"] == large.id]
+    assert len(plans) == 26
+    assert plans[0]["task_count"] == 30
+    assert plans[0]["total_cost"] == 300
+
+def test_statistics_read_the_rollup(client, auth_headers, make_project):
+    project = make_project(n_plans=26, n_tasks=10)
+
+    response, _ = get_within_budget(client, "/statistics", 2, auth_headers)
+    assert response.json()["total_tasks"] == 260
+
+    response, _ = get_within_budget(client, f"/projects/{project.id}/statistics", 3, auth_headers)
+    assert response.json()["total_cost"] == 2600
+
+def test_comment_authors_are_loaded_with_the_comments(client, db, user, auth_headers, make_project):
+    plan = make_project(n_plans=1, n_tasks=0).plans[0]
+    authors = [user] + [
+        models.User(username=f"user{number}", email=f"user{number}@example.com", hashed_password="unused")
+        for number in range(6)
+    ]
+    db.add_all(authors)
+    db.flush()
+    db.add_all([models.Comment(plan_id=plan.id, user_id=author.id, content="Hello") for author in authors])
+    db.commit()
+
+    response, _ = get_within_budget(client, f"/plans/{plan.id}/comments", 3, auth_headers)
+
+    assert {comment["user"]["username"] for comment in response.json()} == {author.username for author in authors}
+
+def test_api_token_user_is_loaded_with_the_token(client, db, user, make_project):
+    make_project(n_plans=3, n_tasks=3)
+    db.add(models.APIToken(user_id=user.id, token="api-token-secret", name="CI"))
+    db.commit()
+    headers = {"Authorization": "Bearer api-token-secret"}
+
+    # One statement authenticates; the other two are the listing's ETag and rows
+    with query_budget(3) as log:
+        response = client.get("/projects/", headers=headers)
+
+    assert response.status_code == 200
+    assert "api_tokens" in log.statements[0] and "users" in log.statements[0]
+
+def test_shared_plan_is_served_from_the_snapshot(client, auth_headers, make_project):
+    plan = make_project(n_plans=1, n_tasks=30).plans[0]
+    plan_id = plan.id
+    share_token = client.post(
+        f"/plans/{plan_id}/share", json={"plan_id": plan_id}, headers=auth_headers
+    ).json()["share_token"]
+
+    response, _ = get_within_budget(client, f"/shared/{share_token}", 3)
+    assert len(response.json()["tasks"]) == 30
+
+    get_within_budget(client, f"/shared/{share_token}", 0)
+
+def test_query_budget_reports_n_plus_one(client, db, auth_headers, make_project):
+    make_project(n_plans=1, n_tasks=0)
+
+    with pytest.raises(AssertionError, match="possible N\\+1"):
+        with query_budget(100, repeat_threshold=3):
+            for _ in range(3):
+                client.get("/projects/", headers=auth_headers)
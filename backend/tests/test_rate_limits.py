@@ -0,0 +1,75 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+import rate_limits
+from rate_limits import LEASE_SECONDS, MemoryBackend, RateLimiter, RatePolicy, rate_limiter
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limits.time, "monotonic", clock)
+    return clock
+
+def test_bucket_refills_over_time(clock):
+    backend = MemoryBackend()
+    policy = RatePolicy("login", capacity=2, period_seconds=60)
+
+    assert asyncio.run(backend.take("ip:1", policy)) == 0
+    assert asyncio.run(backend.take("ip:1", policy)) == 0
+    # Empty: one token comes back every 30 seconds
+    assert asyncio.run(backend.take("ip:1", policy)) == pytest.approx(30)
+    # Other keys have their own bucket
+    assert asyncio.run(backend.take("ip:2", policy)) == 0
+
+    clock.now += 30
+    assert asyncio.run(backend.take("ip:1", policy)) == 0
+    assert asyncio.run(backend.take("ip:1", policy)) == pytest.approx(30)
+
+def test_exceeded_rate_raises_429_with_retry_after(clock):
+    limiter = RateLimiter(MemoryBackend(), rates={"login": "1/minute"}, enabled=True)
+
+    asyncio.run(limiter.check("login", "ip:1"))
+    clock.now += 0.5
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(limiter.check("login", "ip:1"))
+    assert raised.value.status_code == 429
+    assert raised.value.headers["Retry-After"] == "60"
+    assert (limiter.allowed["login"], limiter.limited["login"]) == (1, 1)
+
+def test_leases_are_released_or_expire(clock):
+    backend = MemoryBackend()
+
+    first = asyncio.run(backend.acquire("generation:user:1", 1))
+    assert first is not None
+    assert asyncio.run(backend.acquire("generation:user:1", 1)) is None
+    assert asyncio.run(backend.acquire("generation:user:2", 1)) is not None
+
+    asyncio.run(backend.release("generation:user:1", first))
+    second = asyncio.run(backend.acquire("generation:user:1", 1))
+    assert second is not None
+
+    # A lease never released, e.g. by a dead process, frees its slot on expiry
+    clock.now += LEASE_SECONDS + 1
+    assert asyncio.run(backend.acquire("generation:user:1", 1)) is not None
+
+def test_login_is_rate_limited_per_ip(client, user, monkeypatch):
+    monkeypatch.setattr(rate_limiter, "enabled", True)
+    monkeypatch.setattr(rate_limiter, "backend", MemoryBackend())
+    monkeypatch.setitem(rate_limiter.policies, "login", RatePolicy("login", capacity=2, period_seconds=60))
+    credentials = {"username": "alice", "password": "wrong"}
+
+    assert client.post("/auth/login", json=credentials).status_code == 401
+    assert client.post("/auth/login", json=credentials).status_code == 401
+    response = client.post("/auth/login", json=credentials)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) > 0
+    # The correct password does not get past the limit either
+    response = client.post("/auth/login", json={"username": "alice", "password": "secret"})
+    assert response.status_code == 429
@@ -0,0 +1,68 @@
+import pytest
+from starlette.websockets import WebSocketDisconnect
+import models
+from auth import create_access_token, get_password_hash
+from query_budget import query_budget
+from routers import realtime
+
+@pytest.fixture
+def bob(db):
+    bob = models.User(username="bob", email="bob@example.com", hashed_password=get_password_hash("secret"))
+    db.add(bob)
+    db.commit()
+    return bob
+
+def token_of(user) -> str:
+    return create_access_token({"sub": user.username})
+
+def test_subscriber_receives_committed_changes(client, user, auth_headers, make_project):
+    project = make_project(n_plans=2, n_tasks=1)
+    plan, other_plan = project.plans
+
+    with client.websocket_connect(f"/ws/plans/{plan.id}?token={token_of(user)}") as websocket:
+        # Changes to other plans of the project are not sent to plan subscribers
+        client.post(f"/plans/{other_plan.id}/tasks", json={"title": "Elsewhere"}, headers=auth_headers)
+        client.post(f"/plans/{plan.id}/tasks", json={"title": "New"}, headers=auth_headers)
+        assert websocket.receive_json() == {"type": "tasks.changed", "project_id": project.id, "plan_id": plan.id}
+
+        comment = client.post("/comments", json={"plan_id": plan.id, "content": "Hi"}, headers=auth_headers).json()
+        assert websocket.receive_json() == {
+            "type": "comment.created", "project_id": project.id, "plan_id": plan.id, "comment_id": comment["id"]
+        }
+
+def test_unauthorized_clients_are_rejected(client, user, bob, make_project):
+    project = make_project(n_plans=1, n_tasks=0)
+    plan = project.plans[0]
+
+    for url in [
+        f"/ws/plans/{plan.id}?token={token_of(bob)}",
+        f"/ws/projects/{project.id}?token={token_of(bob)}",
+        f"/ws/plans/{plan.id}?token=not-a-token",
+    ]:
+        with pytest.raises(WebSocketDisconnect) as closed:
+            with client.websocket_connect(url):
+                pass
+        assert closed.value.code == 1008
+
+def test_client_is_closed_once_access_is_gone(client, db, user, bob, make_project, monkeypatch):
+    monkeypatch.setattr(realtime, "EVENT_ACCESS_RECHECK_SECONDS", 0.05)
+    project = make_project(n_plans=1, n_tasks=0)
+    plan = project.plans[0]
+    link = models.SharedLink(plan_id=plan.id, owner_id=user.id, share_token="shared")
+    db.add(link)
+    db.commit()
+
+    with client.websocket_connect(f"/ws/plans/{plan.id}?token={token_of(bob)}") as websocket:
+        link.is_active = False
+        db.commit()
+        with pytest.raises(WebSocketDisconnect) as closed:
+            websocket.receive_json()
+        assert closed.value.code == 1008
+
+def test_changes_without_subscribers_skip_the_project_lookup(client, user, auth_headers, make_project):
+    project = make_project(n_plans=1, n_tasks=1)
+    plan = project.plans[0]
+
+    with query_budget(10) as log:
+        client.post(f"/plans/{plan.id}/tasks", json={"title": "New"}, headers=auth_headers)
+    assert not any(statement.startswith("SELECT plans.id, plans.project_id") for statement in log.statements)
@@ -0,0 +1,65 @@
+import models
+from shared_plan_cache import shared_plan_cache
+
+def share(client, plan_id, headers) -> str:
+    return client.post(f"/plans/{plan_id}/share", json={"plan_id": plan_id}, headers=headers).json()["share_token"]
+
+def shared_titles(client, share_token) -> list:
+    return [task["title"] for task in client.get(f"/shared/{share_token}").json()["tasks"]]
+
+def test_snapshot_is_dropped_when_the_plan_or_its_tasks_change(client, auth_headers, make_project):
+    project = make_project(n_plans=2, n_tasks=1)
+    plan = project.plans[1]
+    task_id = plan.tasks[0].id
+    share_token = share(client, plan.id, auth_headers)
+    assert shared_titles(client, share_token) == ["Task 0"]
+    assert shared_plan_cache.stats()["size"] == 1
+
+    client.put(f"/tasks/{task_id}", json={"title": "Renamed"}, headers=auth_headers)
+    assert shared_plan_cache.stats()["size"] == 0
+    assert shared_titles(client, share_token) == ["Renamed"]
+
+    # Batches bypass the unit of work and invalidate explicitly
+    client.post(f"/plans/{plan.id}/tasks/batch", json={"operations": [
+        {"op": "update", "task_id": task_id, "changes": {"title": "Batched"}}
+    ]}, headers=auth_headers)
+    assert shared_titles(client, share_token) == ["Batched"]
+
+    client.put(f"/projects/{project.id}/plans/{plan.id}", json={"title": "Plan B2"}, headers=auth_headers)
+    assert client.get(f"/shared/{share_token}").json()["title"] == "Plan B2"
+
+def test_other_plans_keep_their_snapshots(client, auth_headers, make_project):
+    first, second = make_project(n_plans=2, n_tasks=1).plans
+    first_token, second_token = share(client, first.id, auth_headers), share(client, second.id, auth_headers)
+    shared_titles(client, first_token)
+    shared_titles(client, second_token)
+
+    client.put(f"/tasks/{first.tasks[0].id}", json={"title": "Renamed"}, headers=auth_headers)
+
+    assert shared_plan_cache.get(first_token) is None
+    assert shared_plan_cache.get(second_token) is not None
+
+def test_deactivated_link_stops_serving_its_snapshot(client, db, auth_headers, make_project):
+    plan = make_project(n_plans=1, n_tasks=1).plans[0]
+    share_token = share(client, plan.id, auth_headers)
+    assert client.get(f"/shared/{share_token}").status_code == 200
+
+    link = db.query(models.SharedLink).filter_by(share_token=share_token).one()
+    link.is_active = False
+    db.commit()
+
+    assert client.get(f"/shared/{share_token}").status_code == 404
+
+def test_snapshot_read_before_an_invalidation_is_not_stored(client, auth_headers, make_project):
+    plan = make_project(n_plans=1, n_tasks=1).plans[0]
+    share_token = share(client, plan.id, auth_headers)
+    assert client.get(f"/shared/{share_token}").status_code == 200
+    snapshot = shared_plan_cache.get(share_token)
+    shared_plan_cache.clear()
+
+    # A request reads the plan, then a commit invalidates it before the snapshot is stored
+    generation = shared_plan_cache.generation
+    shared_plan_cache.invalidate(plan_ids=[plan.id])
+    shared_plan_cache.set(share_token, snapshot, generation)
+
+    assert shared_plan_cache.get(share_token) is None
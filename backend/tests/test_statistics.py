@@ -0,0 +1,73 @@
+import pytest
+import models
+from database import engine
+from plan_stats import rebuild_all_stats
+from query_budget import query_budget
+
+def read_rollup(conn) -> dict:
+    plans = {
+        row.plan_id: (row.project_id, row.plan_letter, pytest.approx(row.total_cost), pytest.approx(row.total_revenue),
+                      row.task_count, row.completed_task_count, row.duration_days)
+        for row in conn.execute(models.PlanStats.__table__.select())
+    }
+    projects = {
+        row.project_id: (row.plan_count, pytest.approx(row.total_cost), pytest.approx(row.total_revenue),
+                         row.task_count, row.completed_task_count)
+        for row in conn.execute(models.ProjectStats.__table__.select())
+    }
+    return {"plans": plans, "projects": projects}
+
+def assert_rollup_matches_rebuild():
+    with engine.connect() as conn:
+        maintained = read_rollup(conn)
+        rebuild_all_stats(conn)
+        rebuilt = read_rollup(conn)
+        conn.rollback()
+    assert maintained == rebuilt
+
+def test_task_changes_keep_the_rollup_in_step(client, db, auth_headers, make_project):
+    project = make_project(n_plans=2, n_tasks=3)
+    plan_a, plan_b = sorted(project.plans, key=lambda plan: plan.plan_letter)
+    task = plan_a.tasks[0]
+
+    response = client.post(f"/plans/{plan_a.id}/tasks", json={"title": "New", "cost": 7.5, "revenue": 2}, headers=auth_headers)
+    assert response.status_code == 200
+    client.put(f"/tasks/{response.json()['id']}", json={"cost": 1.25, "is_completed": True}, headers=auth_headers)
+    client.delete(f"/tasks/{plan_a.tasks[1].id}", headers=auth_headers)
+    assert_rollup_matches_rebuild()
+
+    # Moved between plans, then edited and deleted in one flush
+    task.plan_id = plan_b.id
+    task.revenue = 100
+    db.flush()
+    db.delete(plan_b.tasks[0])
+    plan_b.tasks[1].is_completed = not plan_b.tasks[1].is_completed
+    db.commit()
+    assert_rollup_matches_rebuild()
+
+    db.delete(plan_b)
+    db.commit()
+    assert_rollup_matches_rebuild()
+
+def test_task_create_updates_the_rollup_in_place(client, auth_headers, make_project):
+    plan = make_project(n_plans=1, n_tasks=20).plans[0]
+    plan_id = plan.id
+
+    # Two UPDATEs adjust the totals; the plan's tasks are not summed again
+    with query_budget(7) as log:
+        response = client.post(f"/plans/{plan_id}/tasks", json={"title": "New", "cost": 5}, headers=auth_headers)
+
+    assert response.status_code == 200
+    assert sum("plan_stats" in statement or "project_stats" in statement for statement in log.statements) == 2
+    statistics = client.get("/statistics", headers=auth_headers).json()
+    assert statistics["total_tasks"] == 21
+
+def test_edits_outside_the_rollup_leave_it_alone(client, auth_headers, make_project):
+    task = make_project(n_plans=1, n_tasks=1).plans[0].tasks[0]
+    task_id = task.id
+
+    with query_budget(5) as log:
+        response = client.put(f"/tasks/{task_id}", json={"title": "Renamed", "description": "More detail"}, headers=auth_headers)
+
+    assert response.status_code == 200
+    assert not any("plan_stats" in statement or "project_stats" in statement for statement in log.statements)
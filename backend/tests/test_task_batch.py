@@ -0,0 +1,98 @@
+import models
+from query_budget import query_budget
+
+def batch(client, plan_id, headers, *operations):
+    return client.post(f"/plans/{plan_id}/tasks/batch", json={"operations": list(operations)}, headers=headers)
+
+def task_titles(db, plan_id) -> list:
+    db.expire_all()
+    return [task.title for task in db.query(models.Task).filter_by(plan_id=plan_id).order_by(models.Task.id)]
+
+def test_mixed_operations_are_applied_together(client, db, auth_headers, make_project):
+    plan = make_project(n_plans=1, n_tasks=3).plans[0]
+    first, second, third = sorted(task.id for task in plan.tasks)
+
+    response = batch(
+        client, plan.id, auth_headers,
+        {"op": "create", "task": {"title": "Created", "cost": 4}},
+        {"op": "update", "task_id": first, "changes": {"title": "Renamed", "is_completed": True}},
+        {"op": "delete", "task_id": second},
+        {"op": "reorder", "task_ids": [third, first]},
+    )
+
+    assert response.status_code == 200, response.text
+    results = response.json()["results"]
+    assert [result["ok"] for result in results] == [True] * 4
+    assert results[0]["task"]["title"] == "Created"
+    assert results[1]["task"]["title"] == "Renamed"
+    assert task_titles(db, plan.id) == ["Renamed", "Task 2", "Created"]
+    orders = {task.id: task.order for task in db.query(models.Task).filter_by(plan_id=plan.id)}
+    assert (orders[third], orders[first]) == (0, 1)
+    statistics = client.get(f"/projects/{plan.project_id}/statistics", headers=auth_headers).json()
+    assert statistics["total_tasks"] == 3
+
+def test_update_without_changes_returns_the_current_row(client, db, auth_headers, make_project):
+    plan = make_project(n_plans=1, n_tasks=2).plans[0]
+    first, second = sorted(task.id for task in plan.tasks)
+
+    response = batch(
+        client, plan.id, auth_headers,
+        {"op": "update", "task_id": first, "changes": {}},
+        {"op": "update", "task_id": second, "changes": {"title": "Renamed"}},
+    )
+
+    assert response.status_code == 200, response.text
+    results = response.json()["results"]
+    assert results[0]["task"]["title"] == "Task 0"
+    assert results[1]["task"]["title"] == "Renamed"
+
+def test_deleting_a_task_changed_earlier_is_rejected(client, db, auth_headers, make_project):
+    plan = make_project(n_plans=1, n_tasks=2).plans[0]
+    first, second = sorted(task.id for task in plan.tasks)
+
+    response = batch(
+        client, plan.id, auth_headers,
+        {"op": "update", "task_id": first, "changes": {"title": "Renamed"}},
+        {"op": "delete", "task_id": first},
+        {"op": "update", "task_id": second, "changes": {"title": "Also renamed"}},
+    )
+
+    assert response.status_code == 400
+    errors = response.json()["detail"]["results"]
+    assert [(error["index"], error["task_id"]) for error in errors] == [(1, first)]
+    assert task_titles(db, plan.id) == ["Task 0", "Task 1"]
+
+def test_invalid_operation_applies_nothing(client, db, auth_headers, make_project):
+    plan, other_plan = make_project(n_plans=2, n_tasks=1).plans
+    own_task, foreign_task = plan.tasks[0].id, other_plan.tasks[0].id
+
+    response = batch(
+        client, plan.id, auth_headers,
+        {"op": "create", "task": {"title": "Created"}},
+        {"op": "update", "task_id": own_task, "changes": {"title": "Renamed"}},
+        {"op": "delete", "task_id": foreign_task},
+    )
+
+    assert response.status_code == 400
+    errors = response.json()["detail"]["results"]
+    assert [error["index"] for error in errors] == [2]
+    assert "not found in this plan" in errors[0]["error"]
+    assert task_titles(db, plan.id) == ["Task 0"]
+    assert task_titles(db, other_plan.id) == ["Task 0"]
+
+def test_batch_runs_a_constant_number_of_statements(client, auth_headers, make_project):
+    plan = make_project(n_plans=1, n_tasks=40).plans[0]
+    task_ids = sorted(task.id for task in plan.tasks)
+    # One create: SQLite cannot return ordered rows from a multi-row INSERT, so
+    # SQLAlchemy inserts those one by one there; PostgreSQL sends them in one statement
+    operations = (
+        [{"op": "create", "task": {"title": "New"}}]
+        + [{"op": "update", "task_id": task_id, "changes": {"cost": 2}} for task_id in task_ids[:10]]
+        + [{"op": "delete", "task_id": task_id} for task_id in task_ids[10:20]]
+        + [{"op": "reorder", "task_ids": task_ids[20:]}]
+    )
+
+    with query_budget(15):
+        response = batch(client, plan.id, auth_headers, *operations)
+
+    assert response.status_code == 200, response.text
@@ -0,0 +1,51 @@
+from datetime import datetime
+import models
+from query_budget import query_budget
+from token_usage import TokenUsageBuffer, token_usage
+
+def add_tokens(db, user, count: int) -> list:
+    tokens = [models.APIToken(user_id=user.id, token=f"token-{number}", name=f"Token {number}") for number in range(count)]
+    db.add_all(tokens)
+    db.commit()
+    return [token.id for token in tokens]
+
+def last_used(db) -> dict:
+    db.expire_all()
+    return {token.id: token.last_used_at for token in db.query(models.APIToken)}
+
+def test_flush_writes_every_token_in_one_update(client, db, user):
+    token_ids = add_tokens(db, user, 3)
+    buffer = TokenUsageBuffer(granularity=60)
+    used_at = [datetime(2026, 10, 17, 12, minute) for minute in range(3)]
+    for token_id, when in zip(token_ids, used_at):
+        buffer.record(token_id, when)
+    # Repeated uses within the granularity window are dropped
+    buffer.record(token_ids[0], datetime(2026, 10, 17, 13, 0))
+
+    with query_budget(1) as log:
+        assert client.portal.call(buffer.flush) == 3
+
+    assert len(log.statements) == 1
+    assert log.statements[0].startswith("UPDATE api_tokens")
+    assert [value.replace(tzinfo=None) for value in last_used(db).values()] == used_at
+
+    # Nothing buffered, nothing written
+    with query_budget(0):
+        assert client.portal.call(buffer.flush) == 0
+
+def test_authenticated_requests_buffer_instead_of_writing(client, db, user, monkeypatch):
+    token_id, = add_tokens(db, user, 1)
+    monkeypatch.setattr(token_usage, "_pending", {})
+    monkeypatch.setattr(token_usage, "_last_recorded", {})
+    headers = {"Authorization": "Bearer token-0"}
+
+    with query_budget(10) as log:
+        for _ in range(3):
+            assert client.get("/auth/me", headers=headers).status_code == 200
+
+    assert not any("api_tokens" in statement and statement.startswith("UPDATE") for statement in log.statements)
+    assert list(token_usage._pending) == [token_id]
+    assert last_used(db)[token_id] is None
+
+    client.portal.call(token_usage.flush)
+    assert last_used(db)[token_id] is not None
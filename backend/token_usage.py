@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional
+from sqlalchemy import case, update
+from database import async_engine
+from models import APIToken
+
+logger = logging.getLogger(__name__)
+
+TOKEN_USAGE_FLUSH_INTERVAL_SECONDS = float(os.getenv("TOKEN_USAGE_FLUSH_INTERVAL_SECONDS", "15"))
+TOKEN_USAGE_GRANULARITY_SECONDS = float(os.getenv("TOKEN_USAGE_GRANULARITY_SECONDS", "60"))
+
+class TokenUsageBuffer:
+    """Buffers APIToken.last_used_at and writes it back in one bulk UPDATE"""
+
+    def __init__(
+        self,
+        flush_interval: float = TOKEN_USAGE_FLUSH_INTERVAL_SECONDS,
+        granularity: float = TOKEN_USAGE_GRANULARITY_SECONDS
+    ):
+        self.flush_interval = flush_interval
+        self.granularity = granularity
+        self._pending: Dict[int, datetime] = {}
+        self._last_recorded: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, token_id: int, used_at: Optional[datetime] = None):
+        """Note a token use; at most one write per token per granularity window"""
+        now = time.monotonic()
+        with self._lock:
+            last = self._last_recorded.get(token_id)
+            if last is not None and now - last < self.granularity:
+                return
+            self._last_recorded[token_id] = now
+            self._pending[token_id] = used_at or datetime.utcnow()
+
+    async def flush(self) -> int:
+        """Write all buffered timestamps in a single UPDATE, returning the row count"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            cutoff = time.monotonic() - self.granularity
+            self._last_recorded = {
+                token_id: recorded for token_id, recorded in self._last_recorded.items() if recorded > cutoff
+            }
+
+        if not pending:
+            return 0
+
+        try:
+            async with async_engine.begin() as conn:
+                await conn.execute(
+                    update(APIToken)
+                    .where(APIToken.id.in_(pending.keys()))
+                    .values(last_used_at=case(pending, value=APIToken.id))
+                )
+        except Exception as e:
+            logger.error(f"Failed to flush API token usage: {e}")
+            # Put the timestamps back unless a newer use was recorded meanwhile
+            with self._lock:
+                for token_id, used_at in pending.items():
+                    self._pending.setdefault(token_id, used_at)
+            return 0
+
+        return len(pending)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the periodic flush and write whatever is still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+token_usage = TokenUsageBuffer()
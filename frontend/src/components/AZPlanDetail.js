@@ -79,24 +79,8 @@ const AZPlanDetail = ({ plan: project, onPlanUpdate }) => {
   const loadPlansWithTasks = async () => {
     try {
       setLoading(true);
-      const plansResponse = await plansAPI.getAll(project.id);
-      const plansWithTasks = [];
-      
-      for (const plan of plansResponse.data) {
-        try {
-          const tasksResponse = await tasksAPI.getAll(plan.id);
-          plansWithTasks.push({
-            ...plan,
-            tasks: tasksResponse.data
-          });
-        } catch (error) {
-          // If no tasks found, just add empty tasks array
-          plansWithTasks.push({
-            ...plan,
-            tasks: []
-          });
-        }
-      }
+      const plansResponse = await plansAPI.getAll(project.id, { include: 'tasks' });
+      const plansWithTasks = plansResponse.data;
       
       setPlans(plansWithTasks.sort((a, b) => a.plan_letter.localeCompare(b.plan_letter)));
       setError('');
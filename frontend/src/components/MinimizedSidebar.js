@@ -26,7 +26,7 @@ import {
   ChevronLeft as ChevronLeftIcon,
   ChevronRight as ChevronRightIcon,
 } from '@mui/icons-material';
-import { statisticsAPI, commentsAPI } from '../services/api';
+import { statisticsAPI, commentsAPI, eventsAPI } from '../services/api';
 
 const MinimizedSidebar = ({ selectedPlan, onCommentAdded }) => {
   const [statistics, setStatistics] = useState(null);
@@ -47,6 +47,16 @@ const MinimizedSidebar = ({ selectedPlan, onCommentAdded }) => {
     }
   }, [selectedPlan]);
 
+  useEffect(() => {
+    if (!selectedPlan) return undefined;
+    // Reload comments when someone else comments on this plan
+    return eventsAPI.subscribeToPlan(selectedPlan.id, (event) => {
+      if (event.type === 'comment.created' || event.type === 'resync') {
+        loadComments();
+      }
+    });
+  }, [selectedPlan]);
+
   const loadStatistics = async () => {
     try {
       const response = await statisticsAPI.get();
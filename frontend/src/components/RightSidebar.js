@@ -25,7 +25,7 @@ import {
   ChevronRight as ChevronRightIcon,
 } from '@mui/icons-material';
 import { BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer } from 'recharts';
-import { statisticsAPI, commentsAPI } from '../services/api';
+import { statisticsAPI, commentsAPI, eventsAPI } from '../services/api';
 
 const RightSidebar = ({ selectedPlan, onCommentAdded }) => {
   const [statistics, setStatistics] = useState(null);
@@ -45,6 +45,16 @@ const RightSidebar = ({ selectedPlan, onCommentAdded }) => {
     }
   }, [selectedPlan]);
 
+  useEffect(() => {
+    if (!selectedPlan) return undefined;
+    // Reload comments when someone else comments on this plan
+    return eventsAPI.subscribeToPlan(selectedPlan.id, (event) => {
+      if (event.type === 'comment.created' || event.type === 'resync') {
+        loadComments();
+      }
+    });
+  }, [selectedPlan]);
+
   const loadStatistics = async () => {
     try {
       const response = await statisticsAPI.get();
@@ -36,6 +36,19 @@ api.interceptors.response.use(
   }
 );
 
+// Follow X-Next-Cursor headers of a paginated listing and return every item
+const getAllPages = async (url, params = {}) => {
+  const items = [];
+  let cursor = null;
+  let response;
+  do {
+    response = await api.get(url, { params: cursor ? { ...params, cursor } : params });
+    items.push(...response.data);
+    cursor = response.headers['x-next-cursor'];
+  } while (cursor);
+  return { ...response, data: items };
+};
+
 // Auth API
 export const authAPI = {
   register: (userData) => api.post('/auth/register', userData),
@@ -45,7 +58,7 @@ export const authAPI = {
 
 // Projects API
 export const projectsAPI = {
-  getAll: () => api.get('/projects'),
+  getAll: () => getAllPages('/projects/'),
   get: (id) => api.get(`/projects/${id}`),
   create: (projectData) => api.post('/projects', projectData),
   update: (id, projectData) => api.put(`/projects/${id}`, projectData),
@@ -53,9 +66,10 @@ export const projectsAPI = {
 };
 
 // Plans API (nested under projects)
+// Plans come without tasks; pass { include: 'tasks' } to embed them, { fields: 'id,title' } to trim them
 export const plansAPI = {
-  getAll: (projectId) => api.get(`/projects/${projectId}/plans`),
-  get: (projectId, planId) => api.get(`/projects/${projectId}/plans/${planId}`),
+  getAll: (projectId, params = {}) => api.get(`/projects/${projectId}/plans`, { params }),
+  get: (projectId, planId, params = {}) => api.get(`/projects/${projectId}/plans/${planId}`, { params }),
   create: (projectId, planData) => api.post(`/projects/${projectId}/plans`, planData),
   update: (projectId, planId, planData) => api.put(`/projects/${projectId}/plans/${planId}`, planData),
   delete: (projectId, planId) => api.delete(`/projects/${projectId}/plans/${planId}`),
@@ -68,11 +82,14 @@ export const tasksAPI = {
   create: (planId, taskData) => api.post(`/plans/${planId}/tasks`, taskData),
   update: (id, taskData) => api.put(`/tasks/${id}`, taskData),
   delete: (id) => api.delete(`/tasks/${id}`),
+  // operations: [{ op: 'create'|'update'|'delete'|'reorder', task, task_id, changes, task_ids }]
+  batch: (planId, operations) => api.post(`/plans/${planId}/tasks/batch`, { operations }),
 };
 
 // Comments API
 export const commentsAPI = {
-  getAll: (planId) => api.get(`/plans/${planId}/comments`),
+  // Newest comments first, every page
+  getAll: (planId) => getAllPages(`/plans/${planId}/comments`),
   create: (commentData) => api.post('/comments', commentData),
 };
 
@@ -94,6 +111,25 @@ export const sharingAPI = {
   getSharedPlan: (shareToken) => api.get(`/shared/${shareToken}`),
 };
 
+// Live events over WebSockets; returns a function that closes the connection
+const subscribeToEvents = (path, onEvent) => {
+  const token = localStorage.getItem('authToken');
+  const url = `${API_BASE_URL.replace(/^http/, 'ws')}/ws${path}?token=${encodeURIComponent(token || '')}`;
+  const socket = new WebSocket(url);
+  socket.onmessage = (message) => {
+    const event = JSON.parse(message.data);
+    if (event.type !== 'ping') {
+      onEvent(event);
+    }
+  };
+  return () => socket.close();
+};
+
+export const eventsAPI = {
+  subscribeToPlan: (planId, onEvent) => subscribeToEvents(`/plans/${planId}`, onEvent),
+  subscribeToProject: (projectId, onEvent) => subscribeToEvents(`/projects/${projectId}`, onEvent),
+};
+
 // Health check
 export const healthAPI = {
   check: () => api.get('/health'),